@@ -3,13 +3,15 @@
 function usage() {
     echo "usage:"
     echo
-    echo "  db.bash <create|run|stop>"
+    echo "  db.bash <create|run|replica|stop>"
     echo
     echo "where"
     echo
     echo "  create -  create empty local MySQL database using upgrade scripts"
     echo "  run     - start MySQL in a Docker container (must follow 'create')"
-    echo "  stop    - stop and remove MySQL Docker container"
+    echo "  replica - start a read replica of it in a second container, on port"
+    echo "            $REPLICA_PORT (must follow 'run')"
+    echo "  stop    - stop and remove MySQL Docker containers"
     echo
 }
 
@@ -28,6 +30,20 @@ DB_PASSWORD="password"
 ## Docker container names
 CREATE_CONTAINER_NAME="elite102-mysql-create"
 RUN_CONTAINER_NAME="elite102-mysql"
+REPLICA_CONTAINER_NAME="elite102-mysql-replica"
+
+## The replica reaches the primary by container name on this Docker network.
+NETWORK_NAME="elite102"
+REPLICA_PORT=3307
+
+## Replication identifies transactions by GTID, so that the application can
+## wait for the replica to apply its own writes.
+REPLICATION_OPTIONS="--gtid-mode=ON --enforce-gtid-consistency=ON"
+
+function ensure_network() {
+    sudo docker network inspect "$NETWORK_NAME" > /dev/null 2>&1 \
+        || sudo docker network create "$NETWORK_NAME"
+}
 
 function create() {
     ## Ensure database upgrade and data directories exist.
@@ -50,7 +66,8 @@ function create() {
         --env MYSQL_PASSWORD=$DB_PASSWORD \
         --env MYSQL_USER=$DB_USERNAME \
         --env MYSQL_DATABASE=$DB_NAME \
-        mysql:$MYSQL_VERSION
+        mysql:$MYSQL_VERSION \
+        --server-id=1 $REPLICATION_OPTIONS
 
     ## Wait until MySQL is running.
     until sudo docker exec -i "$CREATE_CONTAINER_NAME" sh -c \
@@ -92,13 +109,16 @@ function run() {
         sudo docker start "$RUN_CONTAINER_NAME"
     else
         echo "Creating MySQL Docker container $RUN_CONTAINER_NAME..."
+        ensure_network
         sudo docker run \
             --name "$RUN_CONTAINER_NAME" \
+            --network "$NETWORK_NAME" \
             --publish 3306:3306 \
             --detach \
             --volume "$DATA_DIR:/var/lib/mysql" \
             --env "MYSQL_PWD=$DB_PASSWORD" \
-            mysql:$MYSQL_VERSION
+            mysql:$MYSQL_VERSION \
+            --server-id=1 $REPLICATION_OPTIONS
         fi
 
     ## Wait until MySQL is running.
@@ -109,14 +129,63 @@ function run() {
     echo "    MySQL container is ready."
 }
 
-function stop() {
-    echo "Stopping $RUN_CONTAINER_NAME..."
-    (sudo docker stop  $RUN_CONTAINER_NAME || true)
-    echo "    Done."
+function replica() {
+    if ! sudo docker ps --format 'table {{.Names}}' | grep -x "$RUN_CONTAINER_NAME"; then
+        echo "MySQL is not running.  Run the "run" command first."
+        exit 1
+        fi
+
+    ## The replica keeps its data inside its container; it is re-created
+    ## from a copy of the primary each time.
+    (sudo docker stop  $REPLICA_CONTAINER_NAME || true)
+    (sudo docker rm -v $REPLICA_CONTAINER_NAME || true)
+
+    echo "Creating MySQL Docker container $REPLICA_CONTAINER_NAME..."
+    ensure_network
+    sudo docker run \
+        --name "$REPLICA_CONTAINER_NAME" \
+        --network "$NETWORK_NAME" \
+        --publish $REPLICA_PORT:3306 \
+        --detach \
+        --env MYSQL_ROOT_PASSWORD=$DB_PASSWORD \
+        --env "MYSQL_PWD=$DB_PASSWORD" \
+        mysql:$MYSQL_VERSION \
+        --server-id=2 $REPLICATION_OPTIONS --read-only=ON
+
+    ## Wait until MySQL is running.
+    until sudo docker exec -i $REPLICA_CONTAINER_NAME mysql -e "select 1"; do
+        sleep 1s
+        done
+
+    ## Copy the primary, including the GTIDs of everything copied, then
+    ## replicate whatever happens after that.
+    sudo docker exec -i $REPLICA_CONTAINER_NAME mysql \
+        -e "reset binary logs and gtids"
+    sudo docker exec -i $RUN_CONTAINER_NAME mysqldump \
+            --all-databases --single-transaction --set-gtid-purged=ON \
+        | sudo docker exec -i $REPLICA_CONTAINER_NAME mysql
+    sudo docker exec -i $REPLICA_CONTAINER_NAME mysql -e "
+        change replication source to
+            source_host = '$RUN_CONTAINER_NAME',
+            source_user = 'root',
+            source_password = '$DB_PASSWORD',
+            source_auto_position = 1,
+            get_source_public_key = 1;
+        start replica;"
+
+    echo "    MySQL replica is ready on port $REPLICA_PORT."
+}
 
-    echo "Removing $RUN_CONTAINER_NAME..."
-    (sudo docker rm -v $RUN_CONTAINER_NAME || true)
-    echo "    Done."
+function stop() {
+    for container in $REPLICA_CONTAINER_NAME $RUN_CONTAINER_NAME; do
+        echo "Stopping $container..."
+        (sudo docker stop  $container || true)
+        echo "    Done."
+
+        echo "Removing $container..."
+        (sudo docker rm -v $container || true)
+        echo "    Done."
+        done
 }
 
 if [ "$#" -ne 1 ]; then
@@ -127,6 +196,7 @@ if [ "$#" -ne 1 ]; then
 case "$1" in
     "create" ) create  ;;
     "run"    ) run     ;;
+    "replica") replica ;;
     "stop"   ) stop    ;;
     *        ) usage; exit 1
     esac
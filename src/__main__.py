@@ -1,21 +1,169 @@
-import datetime
+'''
+Code2College Bank
+
+With no command, opens the teller GUI.  Any other command runs once without
+a window (and without importing tkinter), e.g.
+
+    python src balance 12
+    python src deposit 12 '$10.00'
+    python src repl
+'''
+import argparse
+import sys
 
 import domain
-import database
-import gui
+from domain import SystemClock
 
+def run_gui(outbox_path: str | None = None):
+    ## imported here so that headless commands never pay for tkinter
+    import gui
+    import database
+    from events import EventBus
+    from outbox import Outbox, Replayer
 
-class SystemClock(domain.Clock):
-    def utcnow(self):
-        return datetime.datetime.now(datetime.timezone.utc)
+    ## The connection is opened on the GUI's worker thread, so the window
+    ## appears immediately; Bank calls made meanwhile wait behind it.
+    db = database.BankMySqlDatabase()
+    events = EventBus()
+    bank = domain.Bank(db, SystemClock(), events)
 
-def main():
-    clock = SystemClock()
-    with database.BankMySqlDatabase() as db:
-        bank = domain.Bank(db, clock)
-        ui = gui.Application(bank)
+    ## Deposits and withdrawals the outbox accepted while the database did not
+    ## answer are applied by the replayer, on a connection of its own.
+    outbox = None
+    replayer = None
+    if outbox_path:
+        outbox = Outbox(outbox_path, SystemClock())
 
+    ui = gui.Application(bank, warm_up=db.__enter__, events=events, outbox=outbox)
+    if outbox:
+        replayer = Replayer(
+            outbox,
+            database.BankMySqlDatabase,
+            SystemClock(),
+            events,
+            on_refused=ui.on_refused)
+    try:
+        ## returns only once the GUI's worker has finished with the connection
         ui.run()
+    finally:
+        if replayer:
+            replayer.close()
+        if outbox:
+            outbox.close()
+        db.__exit__(None, None, None)
+
+def run_headless(command):
+    import database
+
+    try:
+        with database.BankMySqlDatabase() as db:
+            output = command(domain.Bank(db, SystemClock()))
+    except ValueError as exc:
+        print(f'ERROR {exc}', file=sys.stderr)
+        return 1
+    except Exception as exc:
+        ## e.g. the database cannot be reached; a traceback would not help
+        print(f'ERROR {type(exc).__name__}: {exc}', file=sys.stderr)
+        return 2
+    if output:
+        print(output)
+    return 0
+
+def repl(bank: domain.Bank) -> str:
+    import code
+
+    code.interact(
+        banner='bank: domain.Bank, USD: domain.USD',
+        local={'bank': bank, 'USD': domain.USD, 'domain': domain},
+        exitmsg='')
+    return ''
+
+def health(bank: domain.Bank) -> str:
+    bank.list_accounts(limit=1)
+    return 'ok'
+
+def balance(bank: domain.Bank, account_id: domain.AccountId) -> str:
+    account = bank.load(account_id)
+    if account is None:
+        raise ValueError(f'no account {account_id}')
+    open_or_closed = 'open' if account.is_open else 'closed'
+    return f'{open_or_closed} account {account_id} balance is {account.balance}'
+
+def open_account(bank: domain.Bank, full_name: str) -> str:
+    return f'opened account ID {bank.open_account(full_name).id}'
+
+def rename(bank: domain.Bank, account_id: domain.AccountId, full_name: str) -> str:
+    change = bank.alter_name(account_id, full_name)
+    return (
+        f'Account holder name for {account_id} '
+        f'changed to {change.after.full_name}.')
+
+def close(bank: domain.Bank, account_id: domain.AccountId) -> str:
+    change = bank.close_account(account_id)
+    return f'Account {account_id} closed at {change.after.closed_at}'
+
+def deposit(bank: domain.Bank, account_id: domain.AccountId, amount: domain.USD) -> str:
+    change = bank.deposit(account_id, amount)
+    return (
+        f'Account {account_id} balance was {change.before.balance}; '
+        f'is now {change.after.balance}.')
+
+def withdraw(bank: domain.Bank, account_id: domain.AccountId, amount: domain.USD) -> str:
+    change = bank.withdraw(account_id, amount)
+    return (
+        f'Account {account_id} balance was {change.before.balance}; '
+        f'is now {change.after.balance}.')
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog='python src',
+        description='Code2College Bank; opens the GUI when no command is given')
+    parser.add_argument(
+        '--outbox',
+        metavar='PATH',
+        help='GUI deposits and withdrawals are accepted into this file at '
+            'once and applied to the database in the background')
+    commands = parser.add_subparsers(dest='command')
+
+    commands.add_parser('gui', help='open the teller GUI (the default)')
+    commands.add_parser('repl', help='interactive Python prompt with a `bank`')
+    commands.add_parser('health', help='check that the database answers')
+
+    def command(name, help_text, *arguments):
+        sub = commands.add_parser(name, help=help_text)
+        for (arg, arg_type) in arguments:
+            sub.add_argument(arg, type=arg_type)
+
+    command('balance', 'show an account balance', ('account_id', int))
+    command('open', 'open an account', ('full_name', str))
+    command('rename', 'alter the account holder name',
+        ('account_id', int), ('full_name', str))
+    command('close', 'close an account', ('account_id', int))
+    command('deposit', 'deposit into an account',
+        ('account_id', int), ('amount', domain.USD.parse))
+    command('withdraw', 'withdraw from an account',
+        ('account_id', int), ('amount', domain.USD.parse))
+
+    return parser.parse_args(argv)
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    if args.command in (None, 'gui'):
+        run_gui(args.outbox)
+        return 0
+
+    commands = {
+        'repl':     repl,
+        'health':   health,
+        'balance':  lambda bank: balance(bank, args.account_id),
+        'open':     lambda bank: open_account(bank, args.full_name),
+        'rename':   lambda bank: rename(bank, args.account_id, args.full_name),
+        'close':    lambda bank: close(bank, args.account_id),
+        'deposit':  lambda bank: deposit(bank, args.account_id, args.amount),
+        'withdraw': lambda bank: withdraw(bank, args.account_id, args.amount),
+        }
+    return run_headless(commands[args.command])
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,336 @@
+'''
+Admission control: limits how many Bank calls run at once, and decides
+which waiting call runs next.
+
+    controller = AdmissionController(limit=8, target_latency=timedelta(milliseconds=50))
+    bank = AdmittedBank(Bank(db, clock), controller)
+    bank.deposit(12, USD(1_00), timeout=timedelta(seconds=2))
+
+Calls beyond the limit wait in a queue for each priority, in arrival order.
+The queues take turns in proportion to their weights, by default four reads
+for every two single-account writes and one batch, so that a stream of
+reads delays writes and batches but never starves them.  A call is
+rejected with AdmissionRejected, rather than left waiting, when the queue is
+full, or when its timeout will (or did) pass before it could run.
+
+Given a `target_latency`, the limit adapts to how long calls take: it grows
+by about one for each `limit` calls that finish within the target, and
+shrinks by a fraction whenever one does not (additive increase,
+multiplicative decrease).
+'''
+from collections import deque
+from datetime import timedelta
+from threading import Condition
+from time import monotonic
+from typing import Any, Callable
+
+from domain import USD, Account, AccountChange, AccountId, Bank, T
+
+## priorities
+READ = 0
+WRITE = 1
+BATCH = 2
+
+## turns each priority's queue takes per round
+DEFAULT_WEIGHTS = {READ: 4, WRITE: 2, BATCH: 1}
+
+DEFAULT_LIMIT = 8
+DEFAULT_MAX_QUEUE = 100
+
+## how much of the limit is kept when a call is slower than the target
+_DECREASE_FACTOR = 0.9
+
+## weight of the newest latency in the moving average
+_LATENCY_WEIGHT = 0.2
+
+class AdmissionRejected(Exception):
+    '''the call was not run'''
+    def __init__(self, reason: str):
+        super().__init__(f'rejected: {reason}')
+        self.reason = reason
+
+class AdmissionMetrics:
+    '''a snapshot of an AdmissionController'''
+    def __init__(
+            self,
+            limit: int,
+            in_flight: int,
+            queue_depth: dict[int, int],
+            admitted: int,
+            rejected_queue_full: int,
+            rejected_deadline: int,
+            mean_latency: timedelta | None):
+        self.limit = limit
+        self.in_flight = in_flight
+        ## waiting calls, by priority
+        self.queue_depth = queue_depth
+        self.admitted = admitted
+        self.rejected_queue_full = rejected_queue_full
+        self.rejected_deadline = rejected_deadline
+        self.mean_latency = mean_latency
+
+    @property
+    def rejected(self) -> int:
+        return self.rejected_queue_full + self.rejected_deadline
+
+    def __repr__(self):
+        return (
+            f'AdmissionMetrics(limit={self.limit}, '
+            f'in_flight={self.in_flight}, '
+            f'queue_depth={self.queue_depth}, '
+            f'admitted={self.admitted}, '
+            f'rejected_queue_full={self.rejected_queue_full}, '
+            f'rejected_deadline={self.rejected_deadline}, '
+            f'mean_latency={self.mean_latency})')
+
+class AdmissionController:
+    def __init__(
+            self,
+            limit: int = DEFAULT_LIMIT,
+            max_queue: int = DEFAULT_MAX_QUEUE,
+            target_latency: timedelta | None = None,
+            min_limit: int = 1,
+            max_limit: int | None = None,
+            weights: dict[int, int] | None = None):
+        '''
+        At most `limit` calls run at once, and `max_queue` wait.  With a
+        `target_latency`, the limit adapts between `min_limit` and
+        `max_limit` (by default, four times `limit`).  `weights` gives the
+        turns each priority takes, when several are waiting.
+        '''
+        weights = weights or DEFAULT_WEIGHTS
+        if limit <= 0 or max_queue < 0 or min_limit <= 0:
+            raise ValueError(
+                'limit and min_limit must be positive, max_queue not negative')
+        if any(weight <= 0 for weight in weights.values()):
+            raise ValueError(f'weights must be positive (they were {weights})')
+
+        self._limit = float(limit)
+        self._max_queue = max_queue
+        self._target = target_latency.total_seconds() if target_latency else None
+        self._min_limit = min_limit
+        self._max_limit = max_limit or 4 * limit
+
+        self._condition = Condition()
+        self._in_flight = 0
+        self._weights = dict(weights)
+        ## a token for each waiting call, by priority, in arrival order
+        self._queues: dict[int, deque[object]] = {p: deque() for p in weights}
+        ## each priority's accumulated claim to the next turn
+        self._credit = {p: 0 for p in weights}
+        ## the waiting call that runs next, once chosen
+        self._next: object | None = None
+        self._mean_latency: float | None = None
+
+        self._admitted = 0
+        self._rejected_queue_full = 0
+        self._rejected_deadline = 0
+
+    @property
+    def limit(self) -> int:
+        return max(self._min_limit, int(self._limit))
+
+    def metrics(self) -> AdmissionMetrics:
+        with self._condition:
+            depth = {p: len(q) for (p, q) in self._queues.items() if q}
+            return AdmissionMetrics(
+                self.limit,
+                self._in_flight,
+                depth,
+                self._admitted,
+                self._rejected_queue_full,
+                self._rejected_deadline,
+                None if self._mean_latency is None
+                    else timedelta(seconds=self._mean_latency))
+
+    def call(
+            self,
+            work: Callable[[], T],
+            priority: int = WRITE,
+            timeout: timedelta | None = None) -> T:
+        '''
+        Run `work()` on this thread once admitted.
+
+        :raises AdmissionRejected: when the queue is full, or `timeout` would
+        pass before `work()` could start
+        '''
+        if priority not in self._queues:
+            raise ValueError(f'unknown priority {priority}')
+
+        deadline = None if timeout is None else monotonic() + timeout.total_seconds()
+        self._admit(priority, deadline)
+
+        started = monotonic()
+        try:
+            return work()
+        finally:
+            self._finish(monotonic() - started)
+
+    def _admit(self, priority: int, deadline: float | None):
+        with self._condition:
+            waiting = sum(len(q) for q in self._queues.values())
+            if not waiting and self._in_flight < self.limit:
+                self._in_flight += 1
+                self._admitted += 1
+                return
+
+            if waiting >= self._max_queue:
+                self._rejected_queue_full += 1
+                raise AdmissionRejected('queue full')
+
+            if deadline is not None and self._expected_wait(priority) > deadline - monotonic():
+                self._rejected_deadline += 1
+                raise AdmissionRejected('deadline')
+
+            entry = object()
+            queue = self._queues[priority]
+            queue.append(entry)
+            ## the next call is chosen only once there is room for it, from
+            ## every call waiting then
+            while self._in_flight >= self.limit or self._first() is not entry:
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    queue.remove(entry)
+                    if self._next is entry:
+                        self._next = None
+                    self._rejected_deadline += 1
+                    ## the call behind this one may now be first
+                    self._condition.notify_all()
+                    raise AdmissionRejected('deadline')
+                self._condition.wait(remaining)
+
+            queue.popleft()
+            self._next = None
+            self._in_flight += 1
+            self._admitted += 1
+            ## there may be room for the next call, too
+            self._condition.notify_all()
+
+    def _first(self) -> object | None:
+        '''
+        the waiting call that runs next: the first of the priority with the
+        most credit, after each waiting priority is credited its weight
+        (smooth weighted round-robin)
+        '''
+        if self._next is None:
+            waiting = [p for (p, q) in self._queues.items() if q]
+            if not waiting:
+                return None
+            for p in self._queues:
+                if p in waiting:
+                    self._credit[p] += self._weights[p]
+                else:
+                    ## an idle priority saves up no turns
+                    self._credit[p] = 0
+            chosen = max(waiting, key=lambda p: (self._credit[p], -p))
+            self._credit[chosen] -= sum(self._weights[p] for p in waiting)
+            self._next = self._queues[chosen][0]
+        return self._next
+
+    def _expected_wait(self, priority: int) -> float:
+        '''roughly how long a call queued at `priority` would wait, in seconds'''
+        if self._mean_latency is None:
+            return 0.0
+        ## the calls ahead in its own queue, and the other queues' turns
+        ## meanwhile
+        own = len(self._queues[priority]) + 1
+        rounds = own / self._weights[priority]
+        others = sum(
+            min(len(q), rounds * self._weights[p])
+            for (p, q) in self._queues.items()
+            if p != priority)
+        return (own + others) * self._mean_latency / self.limit
+
+    def _finish(self, latency: float):
+        with self._condition:
+            self._in_flight -= 1
+            if self._mean_latency is None:
+                self._mean_latency = latency
+            else:
+                self._mean_latency += _LATENCY_WEIGHT * (latency - self._mean_latency)
+
+            if self._target is not None:
+                if latency <= self._target:
+                    self._limit = min(self._max_limit, self._limit + 1 / self._limit)
+                else:
+                    self._limit = max(self._min_limit, self._limit * _DECREASE_FACTOR)
+            self._condition.notify_all()
+
+class AdmittedBank:
+    '''
+    A Bank whose calls go through an AdmissionController.  One controller
+    may be shared by the AdmittedBanks of many threads, each with its own
+    Bank and database connection.
+    '''
+    def __init__(self, bank: Bank, controller: AdmissionController):
+        self._bank = bank
+        self._controller = controller
+
+    def _call(self, priority: int, timeout: timedelta | None, work: Callable[[], T]) -> T:
+        return self._controller.call(work, priority, timeout)
+
+    def load(self, account_id: AccountId, timeout: timedelta | None = None) -> Account:
+        return self._call(READ, timeout, lambda: self._bank.load(account_id))
+
+    def list_accounts(
+            self,
+            after_id: AccountId = 0,
+            limit: int = 100,
+            is_open: bool | None = None,
+            timeout: timedelta | None = None) -> list[Account]:
+        return self._call(
+            READ,
+            timeout,
+            lambda: self._bank.list_accounts(after_id, limit, is_open))
+
+    def search_by_name(
+            self,
+            query: str,
+            limit: int = 20,
+            timeout: timedelta | None = None) -> list[Account]:
+        return self._call(READ, timeout, lambda: self._bank.search_by_name(query, limit))
+
+    def open_account(self, full_name: str, timeout: timedelta | None = None) -> Account:
+        return self._call(WRITE, timeout, lambda: self._bank.open_account(full_name))
+
+    def close_account(
+            self,
+            account_id: AccountId,
+            timeout: timedelta | None = None) -> AccountChange:
+        return self._call(WRITE, timeout, lambda: self._bank.close_account(account_id))
+
+    def alter_name(
+            self,
+            account_id: AccountId,
+            full_name: str,
+            timeout: timedelta | None = None) -> AccountChange:
+        return self._call(
+            WRITE,
+            timeout,
+            lambda: self._bank.alter_name(account_id, full_name))
+
+    def deposit(
+            self,
+            account_id: AccountId,
+            amount: USD,
+            timeout: timedelta | None = None) -> AccountChange:
+        return self._call(WRITE, timeout, lambda: self._bank.deposit(account_id, amount))
+
+    def withdraw(
+            self,
+            account_id: AccountId,
+            amount: USD,
+            timeout: timedelta | None = None) -> AccountChange:
+        return self._call(WRITE, timeout, lambda: self._bank.withdraw(account_id, amount))
+
+    def open_accounts(
+            self,
+            full_names: list[str],
+            timeout: timedelta | None = None) -> list[Account]:
+        return self._call(BATCH, timeout, lambda: self._bank.open_accounts(full_names))
+
+    def apply_batch(
+            self,
+            operations: list[tuple[str, tuple]],
+            timeout: timedelta | None = None) -> list[Any]:
+        return self._call(BATCH, timeout, lambda: self._bank.apply_batch(operations))
@@ -0,0 +1,161 @@
+from datetime import timedelta
+from threading import Event, Lock, Thread
+from time import sleep
+import unittest
+
+from domain import *
+from memory import BankMemoryDatabase
+from admission import *
+
+def wait_until(condition):
+    for _ in range(1000):
+        if condition():
+            return
+        sleep(0.001)
+    raise AssertionError('condition never became true')
+
+class TestAdmissionController(unittest.TestCase):
+    def hold(self, controller, priority=WRITE) -> tuple[Event, Thread]:
+        '''start a call that runs until the returned event is set'''
+        release = Event()
+        thread = Thread(target=controller.call, args=(release.wait, priority))
+        thread.start()
+        return (release, thread)
+
+    def test_limits_calls_in_flight(self):
+        ## Arrange
+        controller = AdmissionController(limit=2)
+        lock = Lock()
+        running = []
+        most = []
+
+        def work():
+            with lock:
+                running.append(1)
+                most.append(len(running))
+            sleep(0.01)
+            with lock:
+                running.pop()
+
+        ## Act
+        threads = [Thread(target=controller.call, args=(work,)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        ## Assert
+        self.assertLessEqual(max(most), 2)
+        self.assertEqual(8, controller.metrics().admitted)
+
+    def test_reads_before_writes_before_batches(self):
+        ## Arrange
+        controller = AdmissionController(limit=1)
+        (release, holder) = self.hold(controller)
+        wait_until(lambda: controller.metrics().in_flight == 1)
+        order = []
+        waiters = []
+        for (priority, name) in [(BATCH, 'batch'), (WRITE, 'write 1'), (READ, 'read'), (WRITE, 'write 2')]:
+            waiters.append(Thread(
+                target=controller.call,
+                args=(lambda name=name: order.append(name), priority)))
+            waiters[-1].start()
+            wait_until(lambda n=len(waiters): sum(controller.metrics().queue_depth.values()) == n)
+
+        ## Act
+        self.assertEqual({READ: 1, WRITE: 2, BATCH: 1}, controller.metrics().queue_depth)
+        release.set()
+        for t in [holder] + waiters:
+            t.join()
+
+        ## Assert
+        self.assertEqual(['read', 'write 1', 'write 2', 'batch'], order)
+
+    def test_batches_not_starved_by_reads(self):
+        ## Arrange
+        controller = AdmissionController(limit=1)
+        (release, holder) = self.hold(controller)
+        wait_until(lambda: controller.metrics().in_flight == 1)
+        order = []
+        waiters = []
+        for (priority, name) in [(READ, 'read')] * 8 + [(BATCH, 'batch')]:
+            waiters.append(Thread(
+                target=controller.call,
+                args=(lambda name=name: order.append(name), priority)))
+            waiters[-1].start()
+            wait_until(lambda n=len(waiters): sum(controller.metrics().queue_depth.values()) == n)
+
+        ## Act
+        release.set()
+        for t in [holder] + waiters:
+            t.join()
+
+        ## Assert
+        ## within one round of four reads, two writes and a batch
+        self.assertLess(order.index('batch'), 5)
+        self.assertEqual(9, len(order))
+
+    def test_rejects_when_queue_full(self):
+        ## Arrange
+        controller = AdmissionController(limit=1, max_queue=0)
+        (release, holder) = self.hold(controller)
+        wait_until(lambda: controller.metrics().in_flight == 1)
+
+        ## Act
+        with self.assertRaises(AdmissionRejected) as raised:
+            controller.call(lambda: None)
+        release.set()
+        holder.join()
+
+        ## Assert
+        self.assertEqual('queue full', raised.exception.reason)
+        self.assertEqual(1, controller.metrics().rejected_queue_full)
+
+    def test_rejects_when_deadline_passes(self):
+        ## Arrange
+        controller = AdmissionController(limit=1)
+        (release, holder) = self.hold(controller)
+        wait_until(lambda: controller.metrics().in_flight == 1)
+
+        ## Act
+        with self.assertRaises(AdmissionRejected) as raised:
+            controller.call(lambda: None, READ, timeout=timedelta(milliseconds=20))
+        release.set()
+        holder.join()
+
+        ## Assert
+        self.assertEqual('deadline', raised.exception.reason)
+        metrics = controller.metrics()
+        self.assertEqual(1, metrics.rejected_deadline)
+        self.assertEqual({}, metrics.queue_depth)
+
+    def test_adapts_limit_to_latency(self):
+        ## Arrange
+        controller = AdmissionController(
+            limit=4,
+            target_latency=timedelta(milliseconds=5))
+
+        ## Act & Assert
+        for _ in range(3):
+            controller.call(lambda: sleep(0.02))
+        self.assertEqual(2, controller.limit)
+        for _ in range(20):
+            controller.call(lambda: None)
+        self.assertGreater(controller.limit, 2)
+
+class TestAdmittedBank(unittest.TestCase):
+    def test_calls_bank(self):
+        ## Arrange
+        controller = AdmissionController()
+        bank = AdmittedBank(Bank(BankMemoryDatabase(), SystemClock()), controller)
+
+        ## Act
+        frank = bank.open_account('Frank')
+        bank.deposit(frank.id, USD(1_00), timeout=timedelta(seconds=1))
+
+        ## Assert
+        self.assertEqual(USD(1_00), bank.load(frank.id).balance)
+        self.assertEqual(3, controller.metrics().admitted)
+
+if __name__ == '__main__':
+    unittest.main()
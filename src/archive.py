@@ -0,0 +1,104 @@
+'''
+Moves accounts closed longer ago than a retention period from the account
+table into the account archive, e.g.
+
+    python src/archive.py --retention-days 365
+
+Accounts are moved a small batch at a time, each batch in its own short
+transaction with a pause after it, so that the job never holds locks for
+long.  An archived account can still be loaded by ID, but no longer appears
+in account listings or name searches.  The job can be stopped and run again
+at any time.
+'''
+import argparse
+from datetime import timedelta
+from time import sleep
+from typing import Callable
+
+from domain import AccountId, BankDatabase, Clock, SystemClock
+from storage import ArchiveDatabase
+
+DEFAULT_RETENTION = timedelta(days=365)
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_PAUSE = timedelta(milliseconds=50)
+
+class Archiver:
+    def __init__(
+            self,
+            database_factory: Callable[[], BankDatabase],
+            clock: Clock,
+            retention: timedelta = DEFAULT_RETENTION,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            pause: timedelta = DEFAULT_PAUSE):
+        '''
+        `database_factory()` must return a BankDatabase that is also an
+        ArchiveDatabase.
+        '''
+        if batch_size <= 0:
+            raise ValueError(f'batch_size must be positive (it was {batch_size})')
+
+        self._database_factory = database_factory
+        self._clock = clock
+        self._retention = retention
+        self._batch_size = batch_size
+        self._pause = pause.total_seconds()
+
+    def run(self) -> int:
+        '''archive every account due; returns how many were archived'''
+        now = self._clock.utcnow()
+        closed_before = now - self._retention
+        archived = 0
+        after_id = 0
+
+        with self._database_factory() as db:
+            while True:
+                db.start_serializable_transaction()
+                try:
+                    ids = db.archive_closed(
+                        after_id,
+                        closed_before,
+                        self._batch_size,
+                        now)
+                    db.commit_transaction()
+                except:
+                    db.rollback_transaction()
+                    raise
+
+                archived += len(ids)
+                if len(ids) < self._batch_size:
+                    return archived
+                after_id = ids[-1]
+                ## let other transactions at the table in between batches
+                sleep(self._pause)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='move long-closed accounts into the account archive')
+    parser.add_argument(
+        '--retention-days',
+        type=int,
+        default=DEFAULT_RETENTION.days,
+        help='archive accounts closed more than this many days ago')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        '--memory',
+        action='store_true',
+        help='use an empty in-process database instead of MySQL')
+    args = parser.parse_args()
+
+    if args.memory:
+        from memory import BankMemoryDatabase
+        database_factory = BankMemoryDatabase
+    else:
+        from database import BankMySqlDatabase
+        database_factory = BankMySqlDatabase
+
+    archived = Archiver(
+        database_factory,
+        SystemClock(),
+        timedelta(days=args.retention_days),
+        args.batch_size).run()
+    print(f'{archived} accounts archived')
+
+if __name__ == '__main__':
+    main()
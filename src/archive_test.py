@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+import unittest
+
+from domain import *
+from memory import BankMemoryDatabase
+from archive import *
+
+class FakeClock(Clock):
+    def __init__(self, value: datetime):
+        self.value = value
+
+    def utcnow(self):
+        return self.value
+
+class TestArchiver(unittest.TestCase):
+    def setUp(self):
+        self.now = datetime(2026, 10, 1, tzinfo=timezone.utc)
+        self.db = BankMemoryDatabase()
+        self.old = []
+        for days_ago in [800, 400, 400, 10]:
+            bank = Bank(self.db, FakeClock(self.now - timedelta(days=days_ago)))
+            account = bank.open_account(f'closed {days_ago} days ago')
+            bank.close_account(account.id)
+            if days_ago > 365:
+                self.old.append(account)
+        self.recent = account
+        self.still_open = Bank(self.db, SystemClock()).open_account('Frank')
+        self.bank = Bank(self.db, FakeClock(self.now))
+
+    def archiver(self) -> Archiver:
+        return Archiver(
+            lambda: self.db,
+            FakeClock(self.now),
+            timedelta(days=365),
+            batch_size=2,
+            pause=timedelta(0))
+
+    def test_moves_long_closed_accounts(self):
+        ## Act
+        archived = self.archiver().run()
+
+        ## Assert
+        self.assertEqual(3, archived)
+        self.assertEqual(
+            [self.recent.id, self.still_open.id],
+            [a.id for a in self.bank.list_accounts()])
+
+    def test_archived_accounts_still_load(self):
+        ## Arrange
+        self.archiver().run()
+
+        ## Act
+        loaded = self.bank.load(self.old[0].id)
+        change = self.bank.close_account(self.old[0].id)
+
+        ## Assert
+        self.assertEqual(self.old[0].full_name, loaded.full_name)
+        self.assertFalse(loaded.is_open)
+        self.assertEqual(loaded.closed_at, change.after.closed_at)
+        with self.assertRaises(ValueError):
+            self.bank.deposit(self.old[0].id, USD(1))
+
+    def test_run_again_archives_nothing(self):
+        ## Arrange
+        self.archiver().run()
+
+        ## Act & Assert
+        self.assertEqual(0, self.archiver().run())
+
+    def test_rollback_restores_account(self):
+        ## Act
+        self.db.start_serializable_transaction()
+        self.db.archive_closed(0, self.now, 10, self.now)
+        self.db.rollback_transaction()
+
+        ## Assert
+        self.assertEqual(5, len(self.bank.list_accounts()))
+        self.assertEqual({}, self.db._archive)
+
+if __name__ == '__main__':
+    unittest.main()
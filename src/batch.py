@@ -0,0 +1,446 @@
+'''
+Streams a file (or stdin) of Bank operations, one per line, either JSON
+
+    {"op": "deposit", "account_id": 12, "amount_usd_cents": 1000}
+
+or CSV
+
+    deposit,12,1000
+
+The operations are `open_account` (or `open`) with a full_name,
+`close_account` (or `close`) with an account_id, `alter_name` (or `rename`)
+with an account_id and full_name, and `deposit` and `withdraw` with an
+account_id and amount_usd_cents.
+
+Operations are partitioned across worker threads by account ID, so no two
+workers ever touch the same account and each account's operations apply in
+file order.  Each worker applies what is waiting for it in transactions of up
+to `batch_size` operations.  One JSON result line per input line is written
+as soon as its transaction commits, so results are not in input order; each
+names its input line.
+
+With a checkpoint file, progress is recorded as the input offset before
+which every line has a result.  A restarted run resumes from there and skips
+lines after it whose results are already in the output file.  Each line is
+also recorded in the database (see AppliedRequestLog), under the run's ID
+and its line number, in the same transaction as its operation, so a line
+committed just before a crash is not applied again: its result says
+`"already_applied": true` instead.  A line the Bank refused is not
+recorded, and is tried again.
+
+If a worker cannot open the database, or a transaction fails other than by
+the Bank refusing an operation, the run stops reading, and `run()` raises
+that error once the other workers finish what they were given.  The lines
+that failed get no result, so the checkpoint never passes them, and a
+resumed run tries them again.
+'''
+import argparse
+import csv
+import io
+import json
+import os
+from queue import Empty, Queue
+import re
+import sys
+from threading import Event, Thread
+from time import monotonic
+from typing import BinaryIO, Callable, TextIO
+from uuid import uuid4
+
+from domain import USD, Bank, BankDatabase, Clock, SystemClock
+from serialization import amount_from_json, result_json
+
+DEFAULT_WORKERS = 3
+DEFAULT_BATCH_SIZE = 100
+
+## operations waiting for each worker; this bounds memory use
+DEFAULT_QUEUE_SIZE = 1000
+
+## how often progress is saved to the checkpoint file
+_CHECKPOINT_INTERVAL_SECONDS = 1.0
+
+_ALIASES = {
+    'open':     'open_account',
+    'close':    'close_account',
+    'rename':   'alter_name',
+    }
+
+_ARGUMENTS = {
+    'open_account':     ('full_name',),
+    'close_account':    ('account_id',),
+    'alter_name':       ('account_id', 'full_name'),
+    'deposit':          ('account_id', 'amount_usd_cents'),
+    'withdraw':         ('account_id', 'amount_usd_cents'),
+    }
+
+_DIGITS = re.compile(r'[0-9]+')
+
+def _amount(cents: object) -> USD:
+    '''a positive whole number of cents, from JSON or CSV'''
+    if isinstance(cents, str) and _DIGITS.fullmatch(cents):
+        cents = int(cents)
+    return amount_from_json(cents)
+
+_CONVERTERS = {
+    'account_id':       int,
+    'full_name':        str,
+    'amount_usd_cents': _amount,
+    }
+
+def parse_operation(line: str) -> tuple[str, tuple]:
+    '''
+    `(operation name, arguments)` as accepted by `Bank.apply_batch()`
+
+    :raises ValueError: when the line is not a well-formed operation
+    '''
+    line = line.strip()
+    if line.startswith('{'):
+        fields = json.loads(line)
+        if not isinstance(fields, dict):
+            raise ValueError('expected a JSON object')
+        name = _ALIASES.get(fields.get('op'), fields.get('op'))
+        if name not in _ARGUMENTS:
+            raise ValueError(f'unknown operation {fields.get("op")}')
+        values = [fields.get(arg) for arg in _ARGUMENTS[name]]
+    else:
+        (op, *values) = next(csv.reader([line]))
+        name = _ALIASES.get(op, op)
+        if name not in _ARGUMENTS:
+            raise ValueError(f'unknown operation {op}')
+        if len(values) != len(_ARGUMENTS[name]):
+            raise ValueError(
+                f'{name} takes {len(_ARGUMENTS[name])} values: '
+                f'{", ".join(_ARGUMENTS[name])}')
+
+    for (arg, value) in zip(_ARGUMENTS[name], values):
+        if value is None:
+            raise ValueError(f'missing {arg}')
+
+    args = tuple(
+        _CONVERTERS[arg](value)
+        for (arg, value) in zip(_ARGUMENTS[name], values))
+    return (name, args)
+
+class Checkpoint:
+    '''
+    the input offset and line number before which every line has a result,
+    and the ID of the run, which stays the same when it resumes
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        self._run_id: str | None = None
+
+    def _read(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def load(self) -> tuple[int, int]:
+        '''`(offset, line)`, or `(0, 0)` when there is no checkpoint'''
+        saved = self._read()
+        return (saved.get('offset', 0), saved.get('line', 0))
+
+    @property
+    def run_id(self) -> str:
+        '''saved before its first use, so that a run that crashes keeps it'''
+        if self._run_id is None:
+            saved = self._read()
+            self._run_id = saved.get('run_id') or uuid4().hex
+            if 'run_id' not in saved:
+                self.save(saved.get('offset', 0), saved.get('line', 0))
+        return self._run_id
+
+    def save(self, offset: int, line: int):
+        saved = {'run_id': self.run_id, 'offset': offset, 'line': line}
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(saved, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+
+def finished_lines(output_path: str, after_line: int) -> set[int]:
+    '''the input lines after `after_line` with a result in the output file'''
+    finished = set()
+    if not os.path.exists(output_path):
+        return finished
+
+    with open(output_path, encoding='utf-8') as f:
+        for text in f:
+            try:
+                line = json.loads(text)['line']
+            except (ValueError, KeyError, TypeError):
+                ## a result cut short by a crash
+                continue
+            if line > after_line:
+                finished.add(line)
+    return finished
+
+## the outcome of a line that an earlier, interrupted run already applied
+ALREADY_APPLIED = object()
+
+## a parsed input line: (line number, offset just after it, name, arguments)
+_Item = tuple[int, int, str, tuple]
+
+class BatchProcessor:
+    def __init__(
+            self,
+            database_factory: Callable[[], BankDatabase],
+            clock: Clock,
+            output: TextIO,
+            workers: int = DEFAULT_WORKERS,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            queue_size: int = DEFAULT_QUEUE_SIZE,
+            checkpoint: Checkpoint | None = None):
+        if workers <= 0 or batch_size <= 0 or queue_size <= 0:
+            raise ValueError('workers, batch_size and queue_size must be positive')
+
+        self._database_factory = database_factory
+        self._clock = clock
+        self._output = output
+        self._workers = workers
+        self._batch_size = batch_size
+        self._queue_size = queue_size
+        self._checkpoint = checkpoint
+
+    def run(
+            self,
+            source: BinaryIO,
+            start_offset: int = 0,
+            start_line: int = 0,
+            skip_lines: set[int] | None = None) -> int:
+        '''
+        Process every line of `source` after `start_offset`, which must be the
+        offset just after line `start_line`; returns the number of lines read.
+        '''
+        skip_lines = skip_lines or set()
+        ## read (or made and saved) here, before any worker needs it
+        run_id = self._checkpoint.run_id if self._checkpoint else None
+        queues = [Queue(self._queue_size) for _ in range(self._workers)]
+        results = Queue(self._queue_size)
+        ## why any worker stopped early; the run stops reading when one does
+        failures: list[Exception] = []
+        failed = Event()
+        workers = [
+            Thread(
+                target=self._work,
+                args=(q, results, run_id, failures, failed),
+                name=f'batch-{i}')
+            for (i, q) in enumerate(queues)
+            ]
+        writer = Thread(
+            target=self._write,
+            args=(results, start_offset, start_line),
+            name='batch-writer')
+        for thread in workers + [writer]:
+            thread.start()
+
+        offset = start_offset
+        line_number = start_line
+        try:
+            for raw in source:
+                if failed.is_set():
+                    break
+                line_number += 1
+                offset += len(raw)
+                if line_number in skip_lines or not raw.strip():
+                    results.put([(line_number, offset, None)])
+                    continue
+
+                try:
+                    (name, args) = parse_operation(raw.decode('utf-8'))
+                except (ValueError, UnicodeDecodeError) as exc:
+                    results.put([(line_number, offset, exc)])
+                    continue
+
+                ## opening an account touches no existing account
+                key = line_number if name == 'open_account' else args[0]
+                queues[key % self._workers].put(
+                    (line_number, offset, name, args))
+        finally:
+            for q in queues:
+                q.put(None)
+            for thread in workers:
+                thread.join()
+            results.put(None)
+            writer.join()
+
+        if failures:
+            raise failures[0]
+        return line_number - start_line
+
+    def _work(
+            self,
+            items: Queue,
+            results: Queue,
+            run_id: str | None,
+            failures: list[Exception],
+            failed: Event):
+        try:
+            db = self._database_factory().__enter__()
+        except Exception as exc:
+            failures.append(exc)
+            failed.set()
+            _drain(items)
+            return
+
+        try:
+            bank = Bank(db, self._clock)
+            done = False
+            while not done:
+                first = items.get()
+                if first is None:
+                    break
+
+                batch = [first]
+                while len(batch) < self._batch_size:
+                    try:
+                        item = items.get_nowait()
+                    except Empty:
+                        break
+                    if item is None:
+                        done = True
+                        break
+                    batch.append(item)
+
+                try:
+                    results.put(self._apply(bank, batch, run_id))
+                except Exception as exc:
+                    ## e.g. the connection dropped; the batch rolled back
+                    failures.append(exc)
+                    failed.set()
+                    if not done:
+                        _drain(items)
+                    return
+        finally:
+            db.__exit__(None, None, None)
+
+    def _apply(self, bank: Bank, batch: list[_Item], run_id: str | None) -> list[tuple]:
+        operations = [(name, args) for (_, _, name, args) in batch]
+        ## a line's ID stays the same when the run resumes
+        request_ids = None
+        if run_id:
+            request_ids = [
+                f'{run_id}:{line_number}'
+                for (line_number, _, _, _) in batch
+                ]
+        ## An operation the Bank refuses fails alone, as a ValueError result;
+        ## any other error rolls back the whole batch, and is raised.
+        outcomes = bank.apply_batch(operations, request_ids)
+        return [
+            (line_number, offset, ALREADY_APPLIED if outcome is None else outcome)
+            for ((line_number, offset, _, _), outcome) in zip(batch, outcomes)
+            ]
+
+    def _write(self, results: Queue, start_offset: int, start_line: int):
+        ## the offset just after each finished line beyond the checkpoint
+        finished: dict[int, int] = {}
+        checkpoint_line = start_line
+        checkpoint_offset = start_offset
+        saved_at = monotonic()
+
+        while True:
+            batch = results.get()
+            if batch is not None:
+                for (line_number, offset, outcome) in batch:
+                    finished[line_number] = offset
+                    if outcome is not None:
+                        self._output.write(json.dumps(
+                            result_line(line_number, outcome)) + '\n')
+                self._output.flush()
+
+                while checkpoint_line + 1 in finished:
+                    checkpoint_line += 1
+                    checkpoint_offset = finished.pop(checkpoint_line)
+
+            due = monotonic() - saved_at >= _CHECKPOINT_INTERVAL_SECONDS
+            if self._checkpoint and (due or batch is None):
+                ## results must be durable before the checkpoint passes them
+                _sync(self._output)
+                self._checkpoint.save(checkpoint_offset, checkpoint_line)
+                saved_at = monotonic()
+
+            if batch is None:
+                return
+
+def _drain(items: Queue):
+    '''
+    take a failed worker's items, so that the reader never blocks on its full
+    queue; their lines get no result
+    '''
+    while items.get() is not None:
+        pass
+
+def _sync(output: TextIO):
+    '''flush `output` to disk, if it is a file'''
+    try:
+        os.fsync(output.fileno())
+    except (OSError, ValueError, io.UnsupportedOperation):
+        ## a pipe, a terminal or an in-memory buffer
+        pass
+
+def result_line(line_number: int, outcome: object) -> dict:
+    if outcome is ALREADY_APPLIED:
+        return {'line': line_number, 'already_applied': True}
+    if isinstance(outcome, Exception):
+        return {'line': line_number, 'error': str(outcome)}
+    return {'line': line_number, 'result': result_json(outcome)}
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='apply a file of Bank operations, one per line')
+    parser.add_argument('input', help="operations file, or '-' for stdin")
+    parser.add_argument(
+        '--output',
+        default='-',
+        help="results file (appended to), or '-' for stdout")
+    parser.add_argument(
+        '--checkpoint',
+        help='progress file; when it exists, resume from it')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument(
+        '--memory',
+        action='store_true',
+        help='use an empty in-process database instead of MySQL')
+    args = parser.parse_args()
+
+    if args.memory:
+        from memory import BankMemoryDatabase
+        shared = BankMemoryDatabase()
+        database_factory = lambda: shared
+    else:
+        from database import BankMySqlDatabase
+        database_factory = BankMySqlDatabase
+
+    checkpoint = Checkpoint(args.checkpoint) if args.checkpoint else None
+    (offset, line) = checkpoint.load() if checkpoint else (0, 0)
+    skip = set()
+    if line and args.output != '-':
+        skip = finished_lines(args.output, line)
+
+    source = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    output = sys.stdout if args.output == '-' else \
+        open(args.output, 'a', encoding='utf-8')
+    try:
+        if offset:
+            source.seek(offset)
+        processor = BatchProcessor(
+            database_factory,
+            SystemClock(),
+            output,
+            args.workers,
+            args.batch_size,
+            args.queue_size,
+            checkpoint)
+        processor.run(source, offset, line, skip)
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+if __name__ == '__main__':
+    main()
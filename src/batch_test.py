@@ -0,0 +1,189 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from domain import *
+from memory import BankMemoryDatabase
+from batch import *
+
+def results_by_line(output: str) -> dict:
+    return {r['line']: r for r in map(json.loads, output.splitlines())}
+
+class TestParseOperation(unittest.TestCase):
+    def test_json_and_csv(self):
+        for (line, expected) in [
+                ('{"op": "deposit", "account_id": 3, "amount_usd_cents": 250}',
+                    ('deposit', (3, USD(2_50)))),
+                ('withdraw,3,250\n', ('withdraw', (3, USD(2_50)))),
+                ('open,"Cat, Frank the"', ('open_account', ('Cat, Frank the',))),
+                ('{"op": "close", "account_id": 3}', ('close_account', (3,))),
+                ('rename,3,Frank', ('alter_name', (3, 'Frank'))),
+                ]:
+            with self.subTest(line):
+                (name, args) = parse_operation(line)
+                self.assertEqual(expected[0], name)
+                self.assertEqual(repr(expected[1]), repr(args))
+
+    def test_invalid(self):
+        for line in [
+                'embezzle,3,100',
+                'deposit,3',
+                'deposit,x,100',
+                '{"op": "deposit", "account_id": 3}',
+                '[1, 2]',
+                'deposit,3,-100',
+                'deposit,3,0',
+                'deposit,3,1.9',
+                'deposit,3, 100',
+                '{"op": "deposit", "account_id": 3, "amount_usd_cents": 1.9}',
+                '{"op": "deposit", "account_id": 3, "amount_usd_cents": -100}',
+                '{"op": "deposit", "account_id": 3, "amount_usd_cents": true}',
+                ]:
+            with self.subTest(line):
+                with self.assertRaises(ValueError):
+                    parse_operation(line)
+
+class TestBatchProcessor(unittest.TestCase):
+    def test_run(self):
+        ## Arrange
+        db = BankMemoryDatabase()
+        frank = db.insert(Account(None, 'Frank', USD.ZERO, None))
+        felix = db.insert(Account(None, 'Felix', USD.ZERO, None))
+        source = io.BytesIO('\n'.join([
+            f'deposit,{frank.id},500',
+            f'deposit,{felix.id},100',
+            f'withdraw,{frank.id},200',
+            f'withdraw,{felix.id},200',
+            'open,Tom',
+            'nonsense',
+            '',
+            f'{{"op": "withdraw", "account_id": {frank.id}, "amount_usd_cents": 300}}',
+            ]).encode('utf-8'))
+        output = io.StringIO()
+        processor = BatchProcessor(
+            lambda: db, SystemClock(), output, workers=2, batch_size=2)
+
+        ## Act
+        count = processor.run(source)
+
+        ## Assert
+        self.assertEqual(8, count)
+        results = results_by_line(output.getvalue())
+        self.assertEqual([1, 2, 3, 4, 5, 6, 8], sorted(results))
+        self.assertEqual(3_00, results[3]['result']['after']['balance_usd_cents'])
+        self.assertIn('error', results[4])
+        self.assertEqual('Tom', results[5]['result']['full_name'])
+        self.assertIn('error', results[6])
+        self.assertEqual(0, results[8]['result']['after']['balance_usd_cents'])
+        self.assertEqual(USD.ZERO, db.select_by_id(frank.id).balance)
+        self.assertEqual(USD(1_00), db.select_by_id(felix.id).balance)
+
+    def test_resume_from_checkpoint(self):
+        ## Arrange
+        db = BankMemoryDatabase()
+        frank = db.insert(Account(None, 'Frank', USD.ZERO, None))
+        lines = [f'deposit,{frank.id},{cents}\n'.encode() for cents in (1, 10, 100)]
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = Checkpoint(os.path.join(directory, 'checkpoint'))
+            output_path = os.path.join(directory, 'output')
+
+            ## the first run "crashes" after the first line
+            with open(output_path, 'a', encoding='utf-8') as output:
+                BatchProcessor(lambda: db, SystemClock(), output,
+                    checkpoint=checkpoint).run(io.BytesIO(lines[0]))
+            ## ...and the third line's result was written before the crash,
+            ## but not yet covered by the checkpoint
+            with open(output_path, 'a', encoding='utf-8') as output:
+                output.write(json.dumps({'line': 3, 'result': None}) + '\n')
+            db.update_balance(frank.id, USD(1_01))
+
+            ## Act
+            (offset, line) = checkpoint.load()
+            skip = finished_lines(output_path, line)
+            source = io.BytesIO(b''.join(lines))
+            source.seek(offset)
+            with open(output_path, 'a', encoding='utf-8') as output:
+                BatchProcessor(lambda: db, SystemClock(), output,
+                    checkpoint=checkpoint).run(source, offset, line, skip)
+
+            ## Assert
+            self.assertEqual((len(lines[0]), 1), (offset, line))
+            self.assertEqual({3}, skip)
+            self.assertEqual(USD(1_11), db.select_by_id(frank.id).balance)
+            self.assertEqual((len(b''.join(lines)), 3), checkpoint.load())
+
+    def test_resume_after_crash_applies_nothing_twice(self):
+        ## Arrange
+        db = BankMemoryDatabase()
+        frank = db.insert(Account(None, 'Frank', USD.ZERO, None))
+        lines = [f'deposit,{frank.id},{cents}\n'.encode() for cents in (1, 10, 100)]
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = Checkpoint(os.path.join(directory, 'checkpoint'))
+            BatchProcessor(lambda: db, SystemClock(), io.StringIO(),
+                checkpoint=checkpoint).run(io.BytesIO(b''.join(lines)))
+            ## the run "crashed" before its checkpoint or results passed line 1
+            checkpoint.save(len(lines[0]), 1)
+
+            ## Act
+            output = io.StringIO()
+            source = io.BytesIO(b''.join(lines))
+            source.seek(len(lines[0]))
+            BatchProcessor(lambda: db, SystemClock(), output,
+                checkpoint=Checkpoint(checkpoint.path)).run(source, len(lines[0]), 1)
+
+            ## Assert
+            self.assertEqual(USD(1_11), db.select_by_id(frank.id).balance)
+            results = results_by_line(output.getvalue())
+            self.assertEqual(
+                {2: True, 3: True},
+                {line: r.get('already_applied') for (line, r) in results.items()})
+
+    def test_database_failure_stops_run(self):
+        ## Arrange
+        def factory():
+            raise ConnectionError('database is down')
+        source = io.BytesIO(b''.join(
+            f'deposit,{i},100\n'.encode() for i in range(100)))
+        processor = BatchProcessor(
+            factory, SystemClock(), io.StringIO(), workers=2, queue_size=2)
+
+        ## Act & Assert
+        with self.assertRaises(ConnectionError):
+            processor.run(source)
+
+    def test_transaction_failure_stops_run_before_failed_lines(self):
+        ## Arrange
+        class FlakyDatabase(BankMemoryDatabase):
+            fail = True
+            def update_balance(self, account_id, balance):
+                if balance == USD(11) and self.fail:
+                    raise ConnectionError('connection lost')
+                return super().update_balance(account_id, balance)
+        db = FlakyDatabase()
+        frank = db.insert(Account(None, 'Frank', USD.ZERO, None))
+        lines = [f'deposit,{frank.id},{cents}\n'.encode() for cents in (1, 10, 100)]
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = Checkpoint(os.path.join(directory, 'checkpoint'))
+            output = io.StringIO()
+
+            ## Act
+            with self.assertRaises(ConnectionError):
+                BatchProcessor(lambda: db, SystemClock(), output,
+                    batch_size=1, checkpoint=checkpoint).run(
+                        io.BytesIO(b''.join(lines)))
+            (offset, line) = checkpoint.load()
+            db.fail = False
+            source = io.BytesIO(b''.join(lines))
+            source.seek(offset)
+            BatchProcessor(lambda: db, SystemClock(), io.StringIO(),
+                checkpoint=Checkpoint(checkpoint.path)).run(source, offset, line)
+
+            ## Assert
+            self.assertEqual([1], sorted(results_by_line(output.getvalue())))
+            self.assertEqual((len(lines[0]), 1), (offset, line))
+            self.assertEqual(USD(1_11), db.select_by_id(frank.id).balance)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+'''
+Micro-benchmarks of the code every Bank operation runs, compared with the
+committed baseline in benchmark_baseline.json.
+
+    python src/benchmark.py             # exits 1 if anything got slower
+    python src/benchmark.py --record    # after an intended change
+
+Each benchmark reports nanoseconds per operation (the best of several
+timeit runs) and peak bytes: the most memory, traced by tracemalloc, that
+one operation has allocated at once, its temporaries and result included.
+A benchmark regresses when either exceeds its baseline by more than the
+tolerance.
+Times depend on the machine, so record the baseline on the machine that
+checks it.
+'''
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+import sys
+from timeit import Timer
+import tracemalloc
+from typing import Callable
+
+from database import _account_from_row, _accounts_from_rows
+from domain import USD, Account
+
+DEFAULT_BASELINE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..',
+    'benchmark_baseline.json')
+DEFAULT_TOLERANCE = 0.25
+
+_REPEAT = 5
+## few enough that the loop counter is a cached small int
+_PEAK_OPERATIONS = 100
+
+_A = USD(123_45)
+_B = USD(67_89)
+_CLOSED_AT = datetime(2026, 10, 1, 12, 30, tzinfo=timezone.utc)
+_ROW_CLOSED_AT = _CLOSED_AT.replace(tzinfo=None)
+## a page of rows, one in ten closed
+_ROWS = [
+    (i, f'Frank the Cat {i}', 123_45, _ROW_CLOSED_AT if i % 10 == 0 else None)
+    for i in range(100)
+    ]
+
+## name -> one operation
+BENCHMARKS: dict[str, Callable[[], object]] = {
+    'USD.__init__': lambda: USD(123_45),
+    'USD.__add__': lambda: _A + _B,
+    'USD.__sub__': lambda: _A - _B,
+    'USD.parse': lambda: USD.parse('$1,234.56'),
+    'USD.__str__': lambda: str(_A),
+    'Account.__init__': lambda: Account(12, 'Frank the Cat', _A, _CLOSED_AT),
+    'Account.trusted': lambda: Account.trusted(12, 'Frank the Cat', _A, _CLOSED_AT),
+    'select_by_id row, open': lambda: _account_from_row(
+        (12, 'Frank the Cat', 123_45, None)),
+    'select_by_id row, closed': lambda: _account_from_row(
+        (12, 'Frank the Cat', 0, _ROW_CLOSED_AT)),
+    'select_page rows, 100 at once': lambda: _accounts_from_rows(_ROWS),
+    }
+
+class BenchmarkResult:
+    def __init__(self, name: str, ns_per_op: float, peak_bytes: float):
+        self.name = name
+        self.ns_per_op = ns_per_op
+        self.peak_bytes = peak_bytes
+
+    def __repr__(self):
+        return (
+            f'BenchmarkResult({self.name!r}, '
+            f'ns_per_op={self.ns_per_op:.1f}, '
+            f'peak_bytes={self.peak_bytes:.1f})')
+
+def measure(name: str, operation: Callable[[], object], repeat: int = _REPEAT) -> BenchmarkResult:
+    timer = Timer(operation)
+    (number, _) = timer.autorange()
+    best = min(timer.repeat(repeat, number))
+    return BenchmarkResult(name, best / number * 1e9, peak_bytes(operation))
+
+def peak_bytes(operation: Callable[[], object], n: int = _PEAK_OPERATIONS) -> float:
+    '''
+    the most memory allocated at once, in bytes, by any of `n` calls of
+    `operation()`, each result dropped before the next call; memory a call
+    keeps after returning accumulates, so it counts too
+    '''
+    tracemalloc.start()
+    try:
+        ## caches filled on first use are not the operation's own, nor is
+        ## the loop's iterator
+        operation()
+        calls = iter(range(n))
+        (before, _) = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for _ in calls:
+            operation()
+        (_, peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return max(0, peak - before)
+
+def run(names: list[str] | None = None) -> list[BenchmarkResult]:
+    return [
+        measure(name, operation)
+        for (name, operation) in BENCHMARKS.items()
+        if names is None or name in names
+        ]
+
+def regressions(
+        results: list[BenchmarkResult],
+        baseline: dict[str, dict[str, float]],
+        tolerance: float) -> list[str]:
+    '''a description of each way `results` are worse than `baseline`'''
+    found = []
+    for r in results:
+        expected = baseline.get(r.name)
+        if expected is None:
+            continue
+        for (metric, actual) in [
+                ('ns_per_op', r.ns_per_op),
+                ('peak_bytes', r.peak_bytes)]:
+            if metric not in expected:
+                continue
+            ## a fraction of a byte or nanosecond more is only noise
+            limit = expected[metric] * (1 + tolerance)
+            if actual > limit and actual - expected[metric] >= 0.5:
+                found.append(
+                    f'{r.name}: {metric} {actual:.1f} exceeds '
+                    f'{expected[metric]:.1f} by more than {tolerance:.0%}')
+    return found
+
+def load_baseline(path: str) -> dict[str, dict[str, float]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_baseline(path: str, results: list[BenchmarkResult]):
+    '''replace the baseline of each benchmark in `results`, keeping the rest'''
+    baseline = load_baseline(path)
+    baseline.update({
+        r.name: {
+            'ns_per_op': round(r.ns_per_op, 1),
+            'peak_bytes': round(r.peak_bytes, 1),
+        }
+        for r in results
+        })
+    temporary = path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=4)
+        f.write('\n')
+    os.replace(temporary, path)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='time the hot paths and compare them with the baseline')
+    parser.add_argument('names', nargs='*', help='run only these benchmarks')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help='allowed slowdown, as a fraction of the baseline (default %(default)s)')
+    parser.add_argument(
+        '--record',
+        action='store_true',
+        help='replace the baseline with these results')
+    args = parser.parse_args()
+
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f'unknown benchmarks {sorted(unknown)}')
+
+    results = run(args.names or None)
+    baseline = load_baseline(args.baseline)
+    for r in results:
+        expected = baseline.get(r.name, {})
+        print(
+            f'{r.name:28} {r.ns_per_op:9.1f} ns/op '
+            f'(baseline {expected.get("ns_per_op", "-")}) '
+            f'{r.peak_bytes:7.1f} peak bytes '
+            f'(baseline {expected.get("peak_bytes", "-")})')
+
+    if args.record:
+        save_baseline(args.baseline, results)
+        return
+
+    found = regressions(results, baseline, args.tolerance)
+    for regression in found:
+        print(regression, file=sys.stderr)
+    sys.exit(1 if found else 0)
+
+if __name__ == '__main__':
+    main()
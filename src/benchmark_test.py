@@ -0,0 +1,36 @@
+import unittest
+
+from benchmark import *
+
+class TestBenchmark(unittest.TestCase):
+    def test_every_benchmark_runs(self):
+        for (name, operation) in BENCHMARKS.items():
+            with self.subTest(name):
+                operation()
+
+    def test_peak_bytes_counts_temporaries(self):
+        self.assertEqual(0, peak_bytes(lambda: None))
+        self.assertGreater(peak_bytes(lambda: len(bytes(10_000))), 10_000)
+
+    def test_regressions(self):
+        ## Arrange
+        baseline = {
+            'USD.__init__': {'ns_per_op': 100.0, 'peak_bytes': 40.0},
+            'USD.__add__': {'ns_per_op': 100.0, 'peak_bytes': 0.0},
+            }
+        results = [
+            BenchmarkResult('USD.__init__', 130.0, 40.0),
+            BenchmarkResult('USD.__add__', 120.0, 120.0),
+            BenchmarkResult('USD.parse', 1000.0, 1326.0),
+            ]
+
+        ## Act
+        actual = regressions(results, baseline, 0.25)
+
+        ## Assert
+        self.assertEqual(2, len(actual))
+        self.assertIn('USD.__init__: ns_per_op', actual[0])
+        self.assertIn('USD.__add__: peak_bytes', actual[1])
+
+if __name__ == '__main__':
+    unittest.main()
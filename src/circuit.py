@@ -0,0 +1,87 @@
+from datetime import timedelta
+from threading import Lock
+from time import monotonic
+from typing import Callable
+
+from domain import T
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half open'
+
+class CircuitOpen(Exception):
+    '''refused at once, because recent attempts failed'''
+
+class CircuitBreaker:
+    '''
+    Fails fast while something is down.
+
+    After `failure_threshold` consecutive failures the circuit opens, and
+    every call is refused with CircuitOpen, without trying, for
+    `reset_timeout`.  Then one trial call is let through ("half open"): its
+    success closes the circuit again, and its failure re-opens it.
+    '''
+    def __init__(
+            self,
+            failure_threshold: int = 3,
+            reset_timeout: timedelta = timedelta(seconds=5),
+            now: Callable[[], float] = monotonic):
+        if failure_threshold <= 0:
+            raise ValueError(
+                f'failure_threshold must be positive (it was {failure_threshold})')
+
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout.total_seconds()
+        self._now = now
+        self._lock = Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self._now() - self._opened_at >= self._reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def before_call(self):
+        '''
+        :raises CircuitOpen: when the call must not be tried
+        '''
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN:
+                waited = self._now() - self._opened_at
+                if waited < self._reset_timeout:
+                    raise CircuitOpen(
+                        f'circuit open; retry in '
+                        f'{self._reset_timeout - waited:.1f} seconds')
+                ## let this one call through to find out
+                self._state = HALF_OPEN
+                return
+            raise CircuitOpen('circuit half open; a trial call is in progress')
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self._failure_threshold:
+                self._state = OPEN
+                self._opened_at = self._now()
+
+    def call(self, work: Callable[[], T], failure: type[BaseException] = Exception) -> T:
+        '''run `work()` through the breaker; only `failure` errors count'''
+        self.before_call()
+        try:
+            result = work()
+        except failure:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
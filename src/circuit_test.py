@@ -0,0 +1,84 @@
+from datetime import timedelta
+import unittest
+
+from circuit import *
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+class TestCircuitBreaker(unittest.TestCase):
+    def breaker(self, time: FakeTime) -> CircuitBreaker:
+        return CircuitBreaker(
+            failure_threshold=2,
+            reset_timeout=timedelta(seconds=5),
+            now=time)
+
+    def fail(self, breaker: CircuitBreaker):
+        def down():
+            raise ConnectionError('fake error')
+        with self.assertRaises(ConnectionError):
+            breaker.call(down)
+
+    def test_opens_after_consecutive_failures(self):
+        ## Arrange
+        breaker = self.breaker(FakeTime())
+
+        ## Act
+        self.fail(breaker)
+        self.assertEqual(CLOSED, breaker.state)
+        self.fail(breaker)
+
+        ## Assert
+        self.assertEqual(OPEN, breaker.state)
+        with self.assertRaises(CircuitOpen):
+            breaker.call(lambda: 'not tried')
+
+    def test_success_resets_failure_count(self):
+        ## Arrange
+        breaker = self.breaker(FakeTime())
+
+        ## Act
+        self.fail(breaker)
+        breaker.call(lambda: None)
+        self.fail(breaker)
+
+        ## Assert
+        self.assertEqual(CLOSED, breaker.state)
+
+    def test_half_open_trial(self):
+        ## Arrange
+        time = FakeTime()
+        breaker = self.breaker(time)
+        self.fail(breaker)
+        self.fail(breaker)
+
+        ## Act & Assert
+        time.now = 5
+        self.assertEqual(HALF_OPEN, breaker.state)
+        self.fail(breaker)
+        self.assertEqual(OPEN, breaker.state)
+
+        time.now = 10
+        self.assertEqual('ok', breaker.call(lambda: 'ok'))
+        self.assertEqual(CLOSED, breaker.state)
+
+    def test_one_trial_at_a_time(self):
+        ## Arrange
+        time = FakeTime()
+        breaker = self.breaker(time)
+        self.fail(breaker)
+        self.fail(breaker)
+        time.now = 5
+
+        ## Act
+        breaker.before_call()
+
+        ## Assert
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()
+
+if __name__ == '__main__':
+    unittest.main()
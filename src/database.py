@@ -1,41 +1,236 @@
-from datetime import datetime, timezone
-import mysql.connector
-from mysql.connector.pooling import PooledMySQLConnection
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from typing import TYPE_CHECKING
 
-from domain import USD, Account, AccountId, BankDatabase
+from circuit import CircuitBreaker
+from domain import USD, Account, AccountId, BankDatabase, normalized_name
+from storage import (
+    AccrualDatabase,
+    AppliedRequestLog,
+    ArchiveDatabase,
+    InterestCredit,
+    RangeChecksum,
+    ReconcileDatabase,
+    Withdrawal,
+    WithdrawalLog)
+
+if TYPE_CHECKING:
+    from mysql.connector.pooling import PooledMySQLConnection
 
 _POOL_NAME = 'BankDatabase'
-_POOL_SIZE = 3
+## connections per pool; no more threads than this may hold one at a time
+POOL_SIZE = 3
+_REPLICA_POOL_NAME = 'BankDatabaseReplica'
+
+DEFAULT_SCHEMA = 'elite102'
+
+## give up on opening a connection after this long, rather than the OS's
+## much longer TCP timeout
+_CONNECT_TIMEOUT_SECONDS = 5
+
+## run on every new connection, and again whenever one is reopened
+_SESSION_SETUP = [
+    ## all dates and times are in UTC (see upgrade/0000.account_table.sql)
+    "set time_zone = '+00:00'",
+    ]
+
+## accounts per multi-row insert statement
+_INSERT_CHUNK_SIZE = 500
+
+## how long a replica's measured lag is trusted before it is measured again
+_LAG_CHECK_INTERVAL_SECONDS = 5.0
+
+class BankMySqlDatabase(
+        BankDatabase,
+        AccrualDatabase,
+        ArchiveDatabase,
+        ReconcileDatabase,
+        WithdrawalLog,
+        AppliedRequestLog):
+    '''
+    the Bank's MySQL database of accounts
 
-class BankMySqlDatabase(BankDatabase):
-    '''the Bank's MySQL database of accounts'''
-    connection: PooledMySQLConnection
+    Given a read replica, read-only transactions run there instead of on the
+    primary.  Reads still see this instance's own earlier writes: after
+    committing a write, it notes the primary's executed GTID set, and the
+    next read waits (up to `max_replica_lag`) for the replica to apply it.
+    A replica that cannot catch up within `max_replica_lag`, or cannot be
+    reached, is bypassed and the read runs on the primary.
+
+    New accounts get IDs from blocks of `id_block_size` reserved from the
+    `id_sequence` table on a separate connection, so that many accounts can
+    be inserted in a single statement.  IDs left in a block when the
+    database is closed are never used.  Given `id_increment`, only the IDs
+    in a block equal to `id_offset` modulo `id_increment` are used, like
+    MySQL's auto_increment_offset and auto_increment_increment.
+
+    A connection idle for `idle_check_after` is pinged before its next
+    transaction, and reopened if MySQL has dropped it, e.g. by restarting.
+    While the primary cannot be reached, `circuit` refuses transactions at
+    once with CircuitOpen instead of letting each one wait to time out.
+    A transaction cut short by a lost connection still fails; only the next
+    one runs on the new connection.
+    '''
+    connection: 'PooledMySQLConnection'
+    replica: 'PooledMySQLConnection | None'
+
+    def __init__(
+            self,
+            replica_host: str | None = None,
+            replica_port: int = 3306,
+            max_replica_lag: timedelta = timedelta(seconds=1),
+            id_block_size: int = 100,
+            idle_check_after: timedelta = timedelta(seconds=30),
+            circuit: CircuitBreaker | None = None,
+            host: str | None = None,
+            port: int = 3306,
+            schema: str = DEFAULT_SCHEMA,
+            id_offset: int = 1,
+            id_increment: int = 1):
+        '''
+        `host` and `port` locate the primary, by default the local server; a
+        server given this way is used directly, even if it is a replica.
+        `schema` is the database on the primary (and the replica) holding the
+        Bank's tables, e.g. one of several shards on the same server.
+        '''
+        if id_block_size <= 0:
+            raise ValueError(
+                f'id_block_size must be positive (it was {id_block_size})')
+        if id_offset <= 0 or id_increment <= 0:
+            raise ValueError('id_offset and id_increment must be positive')
 
-    def __init__(self):
         self.connection = None
+        self.replica = None
+        self.sequence = None
+        self.circuit = circuit or CircuitBreaker()
+        self._idle_check_after = idle_check_after.total_seconds()
+        self._used_at = float('-inf')
+        self._host = host
+        self._port = port
+        self._schema = schema
+        self._replica_host = replica_host
+        self._replica_port = replica_port
+        self._max_replica_lag = max_replica_lag
+
+        ## whether the current transaction runs on the replica, or has written
+        self._reading_replica = False
+        self._wrote = False
+
+        ## GTIDs of our own writes the replica has not yet been seen to apply
+        self._unreplicated_gtids: str | None = None
+        self._replica_ok = False
+        self._replica_checked_at = float('-inf')
+
+        ## the reserved block of IDs not yet used, [_next_id, _id_limit)
+        self._id_block_size = id_block_size
+        self._id_offset = id_offset
+        self._id_increment = id_increment
+        self._next_id = 0
+        self._id_limit = 0
 
     def __enter__(self):
         '''open the connection'''
+        ## imported here, because it is slow to import and is not needed until
+        ## a connection is opened
+        import mysql.connector
+
+        self._connect_primary()
+
+        if self._replica_host:
+            try:
+                self.replica = mysql.connector.connect(
+                    host = self._replica_host,
+                    port = self._replica_port,
+                    database = self._schema,
+                    user = 'elite102',
+                    password = 'password',
+                    raise_on_warnings = True,
+                    connection_timeout = _CONNECT_TIMEOUT_SECONDS,
+                    pool_name = self._pool_name(
+                        _REPLICA_POOL_NAME,
+                        self._replica_host,
+                        self._replica_port),
+                    pool_size = POOL_SIZE)
+                _prepare_session(self.replica)
+            except mysql.connector.Error:
+                ## reads fall back to the primary
+                self.replica = None
+        return self
+
+    def _connect_primary(self):
+        import mysql.connector
+
         self.connection = mysql.connector.connect(
-            database = 'elite102',
+            **self._location(),
+            database = self._schema,
             user = 'elite102',
             password = 'password',
             raise_on_warnings = True,
-            pool_name = _POOL_NAME,
-            pool_size = _POOL_SIZE)
-        return self
+            connection_timeout = _CONNECT_TIMEOUT_SECONDS,
+            pool_name = self._pool_name(_POOL_NAME, self._host, self._port),
+            pool_size = POOL_SIZE)
+        _prepare_session(self.connection)
+        self._used_at = monotonic()
+
+    def _location(self) -> dict:
+        '''the connection arguments that locate the primary'''
+        if self._host:
+            return {'host': self._host, 'port': self._port}
+        return {}
+
+    def _pool_name(self, base: str, host: str | None, port: int) -> str:
+        '''
+        a pool is found by name, so each server and schema needs a name of its
+        own (made only of the characters MySQL Connector allows)
+        '''
+        name = base
+        if host:
+            name += f':{host}:{port}'
+        if self._schema != DEFAULT_SCHEMA:
+            name += f':{self._schema}'
+        return name
+
+    def _healthy_connection(self) -> 'PooledMySQLConnection':
+        '''
+        the primary connection, checked first if it has been idle, and
+        reopened if it was lost
+
+        :raises CircuitOpen: at once, while the primary is known to be down
+        '''
+        import mysql.connector
+
+        self.circuit.before_call()
+        try:
+            if self.connection is None:
+                self._connect_primary()
+            elif monotonic() - self._used_at >= self._idle_check_after:
+                _check(self.connection)
+        except mysql.connector.Error:
+            self.circuit.record_failure()
+            raise
+        self.circuit.record_success()
+        return self.connection
 
     def __exit__(self, _exc_type, _exc_value, _traceback):
         '''close the connection'''
+        if self.replica:
+            self.replica.close()
+        if self.sequence:
+            self.sequence.close()
         if self.connection:
             self.connection.close()
 
+    @property
+    def _reader(self) -> 'PooledMySQLConnection':
+        '''the connection on which the current transaction reads'''
+        return self.replica if self._reading_replica else self.connection
+
     def select_by_id(self, account_id: AccountId) -> Account:
         '''
-        Select a single account row by ID; returns None if the ID does not exist
-        in the accounts table
+        Select a single account row by ID, from the archive if it has been
+        archived; returns None if the ID does not exist in either table
         '''
-        cursor = self.connection.cursor()
+        cursor = self._reader.cursor()
         cursor.execute('''
             select
                     id,
@@ -46,6 +241,16 @@ class BankMySqlDatabase(BankDatabase):
                     account
                 where
                     id = %(id)s
+            union all
+            select
+                    id,
+                    full_name,
+                    balance_usd_cents,
+                    closed_at_utc
+                from
+                    account_archive
+                where
+                    id = %(id)s
             ''',
             {
                 'id': account_id,
@@ -54,37 +259,201 @@ class BankMySqlDatabase(BankDatabase):
         if row is None:
             return None
 
-        (acct_id, name, balance_usd_cents, closed_at) = row
-        if closed_at is not None:
-            closed_at = closed_at.replace(tzinfo=timezone.utc)
+        return _account_from_row(row)
+
+    def select_page(
+            self,
+            after_id: AccountId,
+            limit: int,
+            is_open: bool | None = None) -> list[Account]:
+        '''
+        Select up to `limit` accounts with IDs greater than `after_id`, in ID
+        order; when `is_open` is not None, only open (or only closed) accounts
+        '''
+        status_filter = '' if is_open is None else 'and is_open = %(is_open)s'
+        cursor = self._reader.cursor()
+        cursor.execute(f'''
+            select
+                    id,
+                    full_name,
+                    balance_usd_cents,
+                    closed_at_utc
+                from
+                    account
+                where
+                    id > %(after_id)s
+                    {status_filter}
+                order by
+                    id
+                limit %(limit)s
+            ''',
+            {
+                'after_id': after_id,
+                'is_open': is_open,
+                'limit': limit,
+            })
+        return _accounts_from_rows(cursor)
+
+    def select_by_name(self, query: str, limit: int) -> list[Account]:
+        '''
+        Select up to `limit` accounts by holder name: first those whose
+        normalized name starts with the normalized `query`, in name order,
+        then (if there is room) those the FULLTEXT index ranks as similar
+        '''
+        normalized = normalized_name(query)
+        cursor = self._reader.cursor()
+        cursor.execute('''
+            select
+                    id,
+                    full_name,
+                    balance_usd_cents,
+                    closed_at_utc
+                from
+                    account
+                where
+                    full_name_normalized like %(prefix)s
+                order by
+                    full_name_normalized,
+                    id
+                limit %(limit)s
+            ''',
+            {
+                'prefix': _escaped_like(normalized) + '%',
+                'limit': limit,
+            })
+        result = _accounts_from_rows(cursor)
+        if len(result) >= limit:
+            return result
 
-        return Account(acct_id, name, USD(balance_usd_cents), closed_at)
+        cursor.execute('''
+            select
+                    id,
+                    full_name,
+                    balance_usd_cents,
+                    closed_at_utc
+                from
+                    account
+                where
+                    match(full_name_normalized)
+                        against (%(query)s in natural language mode)
+                limit %(limit)s
+            ''',
+            {
+                'query': normalized,
+                ## the prefix matches may appear again
+                'limit': limit + len(result),
+            })
+        found = {a.id for a in result}
+        for row in cursor:
+            account = _account_from_row(row)
+            if account.id not in found and len(result) < limit:
+                found.add(account.id)
+                result.append(account)
+        return result
 
     def insert(self, a: Account) -> Account:
         '''insert a row for the never-before-saved Account'''
-        if a.id is not None:
-            raise ValueError(
-                f'cannot insert an Account with an ID (it was {a.id})')
+        return self.insert_many([a])[0]
+
+    def insert_many(self, accounts: list[Account]) -> list[Account]:
+        '''insert rows for never-before-saved Accounts, many per statement'''
+        for a in accounts:
+            if a.id is not None:
+                raise ValueError(
+                    f'cannot insert an Account with an ID (it was {a.id})')
+        if not accounts:
+            return []
+
+        self._wrote = True
+        inserted = [
+            Account(account_id, a.full_name, a.balance, a.closed_at)
+            for (account_id, a) in zip(self._allocate_ids(len(accounts)), accounts)
+            ]
 
         cursor = self.connection.cursor()
+        for start in range(0, len(inserted), _INSERT_CHUNK_SIZE):
+            chunk = inserted[start:start + _INSERT_CHUNK_SIZE]
+            values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))
+            cursor.execute(
+                f'''
+                insert into account (
+                        id,
+                        full_name,
+                        full_name_normalized,
+                        balance_usd_cents,
+                        closed_at_utc
+                    ) values {values};
+                ''',
+                [
+                    value
+                    for a in chunk
+                    for value in (
+                        a.id,
+                        a.full_name,
+                        normalized_name(a.full_name),
+                        a.balance.total_cents,
+                        a.closed_at)
+                ])
+        return inserted
+
+    def _allocate_ids(self, count: int) -> list[AccountId]:
+        '''`count` unused account IDs, reserving more as needed'''
+        step = self._id_increment
+        ids = []
+        while len(ids) < count:
+            if self._next_id >= self._id_limit:
+                self._reserve_ids(
+                    max(self._id_block_size, count - len(ids)) * step)
+                ## skip to the block's first ID equal to id_offset modulo step
+                self._next_id += (self._id_offset - self._next_id) % step
+            ## the block's IDs left to us, rounded up
+            left = -((self._next_id - self._id_limit) // step)
+            take = min(count - len(ids), left)
+            ids.extend(range(self._next_id, self._next_id + take * step, step))
+            self._next_id += take * step
+        return ids
+
+    def _reserve_ids(self, size: int):
+        '''
+        Reserve the next `size` IDs from the sequence table.  This commits
+        at once, on a connection of its own, so that the reservation neither
+        waits for nor is undone with the current transaction.
+        '''
+        import mysql.connector
+
+        if self.sequence is None:
+            ## not pooled, so it never takes a connection the pool needs
+            self.sequence = mysql.connector.connect(
+                **self._location(),
+                database = self._schema,
+                user = 'elite102',
+                password = 'password',
+                raise_on_warnings = True,
+                connection_timeout = _CONNECT_TIMEOUT_SECONDS,
+                autocommit = True)
+        else:
+            _check(self.sequence)
+
+        cursor = self.sequence.cursor()
         cursor.execute(
             '''
-            insert into account (
-                    full_name,     balance_usd_cents,     closed_at_utc
-                ) values (
-                    %(full_name)s, %(balance_usd_cents)s, %(closed_at_utc)s
-                );
+            update id_sequence set
+                    next_value = last_insert_id(next_value + %(size)s)
+                where
+                    name = 'account'
+                ;
             ''',
             {
-                'full_name': a.full_name,
-                'balance_usd_cents': a.balance.total_cents,
-                'closed_at_utc': a.closed_at,
+                'size': size,
             })
-        account_id = cursor.lastrowid
-        return Account(account_id, a.full_name, a.balance, a.closed_at)
+        cursor.execute('select last_insert_id()')
+        (limit,) = next(cursor)
+        self._next_id = limit - size
+        self._id_limit = limit
 
     def update_closed_at(self, account_id: AccountId, closed_at: datetime) -> None:
         '''record the date-time at which an account is closed'''
+        self._wrote = True
         cursor = self.connection.cursor()
         cursor.execute('''
             update account set
@@ -100,21 +469,25 @@ class BankMySqlDatabase(BankDatabase):
 
     def update_name(self, account_id: AccountId, full_name: str) -> None:
         '''alter the name of the account owner'''
+        self._wrote = True
         cursor = self.connection.cursor()
         cursor.execute('''
             update account set
-                    full_name = %(full_name)s
+                    full_name = %(full_name)s,
+                    full_name_normalized = %(full_name_normalized)s
                 where
                     id = %(id)s
                 ;
             ''',
             {
                 'full_name': full_name,
+                'full_name_normalized': normalized_name(full_name),
                 'id': account_id,
             })
 
     def update_balance(self, account_id: AccountId, balance: USD) -> int:
         '''alter the balance of an existing account row'''
+        self._wrote = True
         cursor = self.connection.cursor()
         cursor.execute('''
             update account set
@@ -129,11 +502,460 @@ class BankMySqlDatabase(BankDatabase):
             })
         return cursor.rowcount
 
+    def account_id_bounds(self) -> tuple[AccountId, AccountId] | None:
+        cursor = self._healthy_connection().cursor()
+        cursor.execute('select min(id), max(id) from account')
+        (low, high) = next(cursor)
+        ## end the implicit transaction the select began
+        self.connection.commit()
+        return None if low is None else (low, high)
+
+    def select_interest_bearing(
+            self,
+            first_id: AccountId,
+            end_id: AccountId) -> list[tuple[AccountId, int]]:
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            select
+                    id,
+                    balance_usd_cents
+                from
+                    account
+                where
+                    id >= %(first_id)s
+                    and id < %(end_id)s
+                    and closed_at_utc is null
+                    and balance_usd_cents > 0
+                order by
+                    id
+                for update
+            ''',
+            {
+                'first_id': first_id,
+                'end_id': end_id,
+            })
+        return list(cursor)
+
+    def credit_interest(
+            self,
+            run_id: str,
+            first_id: AccountId,
+            end_id: AccountId,
+            rate_ppm: int,
+            credits: list[InterestCredit],
+            credited_at: datetime) -> None:
+        '''one UPDATE for the chunk's balances, one INSERT for its ledger'''
+        self._wrote = True
+        cursor = self.connection.cursor()
+
+        credited = [c for c in credits if c.interest]
+        if credited:
+            cases = ' '.join(['when %s then %s'] * len(credited))
+            ids = ', '.join(['%s'] * len(credited))
+            cursor.execute(
+                f'''
+                update account set
+                        balance_usd_cents = case id {cases} end
+                    where
+                        id in ({ids})
+                    ;
+                ''',
+                [v for c in credited for v in (c.account_id, c.balance_after)]
+                + [c.account_id for c in credited])
+
+        for start in range(0, len(credits), _INSERT_CHUNK_SIZE):
+            chunk = credits[start:start + _INSERT_CHUNK_SIZE]
+            values = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(chunk))
+            cursor.execute(
+                f'''
+                insert into interest_ledger (
+                        run_id,
+                        account_id,
+                        rate_ppm,
+                        balance_before_usd_cents,
+                        interest_usd_cents,
+                        credited_at_utc
+                    ) values {values};
+                ''',
+                [
+                    value
+                    for c in chunk
+                    for value in (
+                        run_id,
+                        c.account_id,
+                        rate_ppm,
+                        c.balance_before,
+                        c.interest,
+                        credited_at)
+                ])
+
+        cursor.execute('''
+            insert into interest_run_chunk (
+                    run_id,
+                    first_id,
+                    end_id,
+                    account_count,
+                    interest_usd_cents,
+                    finished_at_utc
+                ) values (
+                    %(run_id)s,
+                    %(first_id)s,
+                    %(end_id)s,
+                    %(account_count)s,
+                    %(interest_usd_cents)s,
+                    %(finished_at_utc)s
+                );
+            ''',
+            {
+                'run_id': run_id,
+                'first_id': first_id,
+                'end_id': end_id,
+                'account_count': len(credits),
+                'interest_usd_cents': sum(c.interest for c in credits),
+                'finished_at_utc': credited_at,
+            })
+
+    def archive_closed(
+            self,
+            after_id: AccountId,
+            closed_before: datetime,
+            limit: int,
+            archived_at: datetime) -> list[AccountId]:
+        self._wrote = True
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            select
+                    id
+                from
+                    account
+                where
+                    is_open = 0
+                    and id > %(after_id)s
+                    and closed_at_utc < %(closed_before)s
+                order by
+                    id
+                limit %(limit)s
+                for update
+            ''',
+            {
+                'after_id': after_id,
+                'closed_before': closed_before,
+                'limit': limit,
+            })
+        ids = [account_id for (account_id,) in cursor]
+        if not ids:
+            return []
+
+        in_ids = ', '.join(['%s'] * len(ids))
+        cursor.execute(
+            f'''
+            insert into account_archive (
+                    id,
+                    full_name,
+                    full_name_normalized,
+                    balance_usd_cents,
+                    closed_at_utc,
+                    archived_at_utc
+                )
+                select
+                        id,
+                        full_name,
+                        full_name_normalized,
+                        balance_usd_cents,
+                        closed_at_utc,
+                        %s
+                    from
+                        account
+                    where
+                        id in ({in_ids})
+                ;
+            ''',
+            [archived_at] + ids)
+        cursor.execute(
+            f'delete from account where id in ({in_ids})',
+            ids)
+        return ids
+
+    def finished_chunks(self, run_id: str) -> set[AccountId]:
+        cursor = self._healthy_connection().cursor()
+        cursor.execute(
+            'select first_id from interest_run_chunk where run_id = %(run_id)s',
+            {
+                'run_id': run_id,
+            })
+        finished = {first_id for (first_id,) in cursor}
+        self.connection.commit()
+        return finished
+
+    def range_checksum(self, first_id: AccountId, end_id: AccountId) -> RangeChecksum:
+        ## the same row text as reconcile.account_crc
+        cursor = self._reader.cursor()
+        cursor.execute('''
+            select
+                    count(*),
+                    coalesce(sum(crc32(concat_ws('|',
+                        id,
+                        balance_usd_cents,
+                        coalesce(
+                            timestampdiff(microsecond, '1970-01-01 00:00:00', closed_at_utc),
+                            '')))), 0)
+                from
+                    account
+                where
+                    id >= %(first_id)s
+                    and id < %(end_id)s
+            ''',
+            {
+                'first_id': first_id,
+                'end_id': end_id,
+            })
+        (count, checksum) = next(cursor)
+        return (count, int(checksum))
+
+    def insert_withdrawals(self, withdrawals: list[Withdrawal]) -> None:
+        self._wrote = True
+        cursor = self.connection.cursor()
+        for start in range(0, len(withdrawals), _INSERT_CHUNK_SIZE):
+            chunk = withdrawals[start:start + _INSERT_CHUNK_SIZE]
+            values = ', '.join(['(%s, %s, %s)'] * len(chunk))
+            cursor.execute(
+                f'''
+                insert into account_withdrawal (
+                        account_id,
+                        amount_usd_cents,
+                        withdrawn_at_utc
+                    ) values {values};
+                ''',
+                [
+                    value
+                    for (account_id, amount, at) in chunk
+                    for value in (account_id, amount.total_cents, at)
+                ])
+
+    def select_withdrawals_since(self, since: datetime) -> list[Withdrawal]:
+        cursor = self._healthy_connection().cursor()
+        cursor.execute('''
+            select
+                    account_id,
+                    amount_usd_cents,
+                    withdrawn_at_utc
+                from
+                    account_withdrawal
+                where
+                    withdrawn_at_utc >= %(since)s
+                order by
+                    withdrawn_at_utc
+            ''',
+            {
+                'since': since,
+            })
+        withdrawals = [
+            (account_id, USD.trusted(cents), at.replace(tzinfo=timezone.utc))
+            for (account_id, cents, at) in cursor
+            ]
+        self.connection.commit()
+        return withdrawals
+
+    def purge_withdrawals_before(self, before: datetime, limit: int) -> int:
+        self._wrote = True
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            delete from
+                    account_withdrawal
+                where
+                    withdrawn_at_utc < %(before)s
+                order by
+                    withdrawn_at_utc
+                limit %(limit)s
+            ''',
+            {
+                'before': before,
+                'limit': limit,
+            })
+        return cursor.rowcount
+
+    def mark_applied(
+            self,
+            request_id: str,
+            refused: str | None,
+            applied_at: datetime) -> bool:
+        self._wrote = True
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            insert ignore into applied_request (
+                    request_id,
+                    refused,
+                    applied_at_utc
+                ) values (
+                    %(request_id)s,
+                    %(refused)s,
+                    %(applied_at)s
+                );
+            ''',
+            {
+                'request_id': request_id,
+                'refused': refused,
+                'applied_at': applied_at,
+            })
+        return cursor.rowcount == 1
+
+    def unmark_applied(self, request_id: str) -> None:
+        self._wrote = True
+        cursor = self.connection.cursor()
+        cursor.execute(
+            'delete from applied_request where request_id = %(request_id)s',
+            {
+                'request_id': request_id,
+            })
+
+    def purge_applied_before(self, before: datetime, limit: int) -> int:
+        self._wrote = True
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            delete from
+                    applied_request
+                where
+                    applied_at_utc < %(before)s
+                order by
+                    applied_at_utc
+                limit %(limit)s
+            ''',
+            {
+                'before': before,
+                'limit': limit,
+            })
+        return cursor.rowcount
+
     def start_serializable_transaction(self):
-        self.connection.start_transaction(isolation_level='SERIALIZABLE')
+        self._reading_replica = False
+        self._wrote = False
+        self._healthy_connection().start_transaction(isolation_level='SERIALIZABLE')
+
+    def start_read_only_transaction(self):
+        if self.replica and self._replica_caught_up():
+            self._reading_replica = True
+            self._wrote = False
+            self.replica.start_transaction(readonly=True)
+        else:
+            self.start_serializable_transaction()
 
     def commit_transaction(self):
+        if self._reading_replica:
+            self._reading_replica = False
+            self.replica.commit()
+            return
+
         self.connection.commit()
+        self._used_at = monotonic()
+        if self._wrote and self.replica:
+            self._unreplicated_gtids = self._primary_gtids()
+        self._wrote = False
 
     def rollback_transaction(self):
-        self.connection.rollback()
+        import mysql.connector
+
+        if self._reading_replica:
+            self._reading_replica = False
+            try:
+                self.replica.rollback()
+            except mysql.connector.Error:
+                ## the replica is checked again before it is next used
+                self._replica_checked_at = float('-inf')
+            return
+
+        self._wrote = False
+        try:
+            self.connection.rollback()
+            self._used_at = monotonic()
+        except mysql.connector.Error:
+            ## The connection was lost, and MySQL has already rolled the
+            ## transaction back.  Let the error that ended the transaction
+            ## surface, not this one; the connection is checked before the
+            ## next transaction.
+            self._used_at = float('-inf')
+
+    def _primary_gtids(self) -> str:
+        cursor = self.connection.cursor()
+        cursor.execute('select @@global.gtid_executed')
+        (gtids,) = next(cursor)
+        ## end the implicit transaction the select began
+        self.connection.commit()
+        return gtids
+
+    def _replica_caught_up(self) -> bool:
+        '''
+        Whether the replica has applied our own writes or, lacking any, was
+        recently no more than `max_replica_lag` behind the primary
+        '''
+        import mysql.connector
+
+        now = monotonic()
+        if now - self._replica_checked_at < _LAG_CHECK_INTERVAL_SECONDS:
+            ## a lagging replica is not asked again until the next check;
+            ## otherwise only our own writes need waiting for
+            if not self._replica_ok or self._unreplicated_gtids is None:
+                return self._replica_ok
+
+        try:
+            _check(self.replica)
+            gtids = self._unreplicated_gtids or self._primary_gtids()
+            cursor = self.replica.cursor()
+            cursor.execute(
+                'select wait_for_executed_gtid_set(%(gtids)s, %(timeout)s)',
+                {
+                    'gtids': gtids,
+                    'timeout': self._max_replica_lag.total_seconds(),
+                })
+            (timed_out,) = next(cursor)
+            self.replica.commit()
+            self._replica_ok = timed_out == 0
+        except mysql.connector.Error:
+            self._replica_ok = False
+
+        if self._replica_ok:
+            self._unreplicated_gtids = None
+        self._replica_checked_at = now
+        return self._replica_ok
+
+def _prepare_session(connection):
+    cursor = connection.cursor()
+    for statement in _SESSION_SETUP:
+        cursor.execute(statement)
+    cursor.close()
+
+def _check(connection):
+    '''ping `connection`, reopening it (and its session settings) if lost'''
+    import mysql.connector
+
+    try:
+        connection.ping()
+    except mysql.connector.Error:
+        connection.reconnect(attempts=1)
+        _prepare_session(connection)
+
+def _escaped_like(s: str) -> str:
+    '''`s` with LIKE wildcards escaped, so that it matches only itself'''
+    return s.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _account_from_row(row: tuple) -> Account:
+    '''map an (id, full_name, balance_usd_cents, closed_at_utc) row'''
+    (acct_id, name, balance_usd_cents, closed_at) = row
+    if closed_at is not None:
+        closed_at = closed_at.replace(tzinfo=timezone.utc)
+
+    ## Account and USD validated every value before it was stored
+    return Account.trusted(acct_id, name, USD.trusted(balance_usd_cents), closed_at)
+
+def _accounts_from_rows(rows) -> list[Account]:
+    '''map many rows, as _account_from_row does, with less work per row'''
+    account = Account.trusted
+    usd = USD.trusted
+    utc = timezone.utc
+    return [
+        account(
+            acct_id,
+            name,
+            usd(balance_usd_cents),
+            None if closed_at is None else closed_at.replace(tzinfo=utc))
+        for (acct_id, name, balance_usd_cents, closed_at) in rows
+        ]
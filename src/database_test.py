@@ -1,11 +1,18 @@
 from datetime import timedelta
+import os
+import subprocess
 from time import sleep
 import unittest
+from unittest.mock import MagicMock, call
 from threading import Thread, current_thread
+import mysql.connector
 from mysql.connector import errorcode
 
+from circuit import CircuitBreaker, CircuitOpen
 from domain import *
+import database
 from database import *
+from storage import checksum_of
 
 DEBUG = False
 
@@ -64,6 +71,43 @@ class TestBankMySqlDatabase(unittest.TestCase):
                 self.assertEqual(expected.balance,   actual.balance)
                 self.assertEqual(expected.closed_at, actual.closed_at)
 
+    def test_insert_many(self):
+        ## Arrange
+        with BankMySqlDatabase(id_block_size=2) as db:
+            names = [f'Frank the Cat {i}' for i in range(5)]
+
+            ## Act
+            inserted = db.insert_many([Account.new(n) for n in names])
+
+            ## Assert
+            ids = [a.id for a in inserted]
+            self.assertEqual(len(set(ids)), len(ids))
+            self.assertEqual(
+                names,
+                [db.select_by_id(i).full_name for i in ids])
+
+    def test_id_increment(self):
+        ## Arrange
+        with BankMySqlDatabase(id_block_size=2, id_offset=2, id_increment=3) as db:
+            ## Act
+            inserted = db.insert_many([Account.new(f'Frank {i}') for i in range(5)])
+
+            ## Assert
+            self.assertEqual([2] * 5, [a.id % 3 for a in inserted])
+
+    def test_id_blocks_do_not_overlap(self):
+        ## Arrange
+        with BankMySqlDatabase() as one, BankMySqlDatabase() as other:
+            ## Act
+            ids = [
+                db.insert(Account.new('Frank the Cat')).id
+                for _ in range(3)
+                for db in [one, other]
+                ]
+
+            ## Assert
+            self.assertEqual(len(set(ids)), len(ids))
+
     def test_update_closed_at(self):
         ## Arrange
         with BankMySqlDatabase() as db:
@@ -111,6 +155,146 @@ class TestBankMySqlDatabase(unittest.TestCase):
             self.assertEqual(one_dollar,        actual.balance)
             self.assertEqual(frank.closed_at,   actual.closed_at)
 
+    def test_select_page(self):
+        ## Arrange
+        with BankMySqlDatabase() as db:
+            now = datetime.now(timezone.utc)
+            first = db.insert(Account(None, 'page test 1', USD.ZERO, None))
+            second = db.insert(Account(None, 'page test 2', USD.ZERO, now))
+            third = db.insert(Account(None, 'page test 3', USD.ZERO, None))
+
+            ## Act
+            all_accounts = db.select_page(first.id - 1, 3)
+            open_accounts = db.select_page(first.id - 1, 3, is_open=True)
+            closed_accounts = db.select_page(first.id - 1, 3, is_open=False)
+            next_page = db.select_page(second.id, 10)
+
+            ## Assert
+            self.assertEqual(
+                [first.id, second.id, third.id],
+                [a.id for a in all_accounts])
+            self.assertEqual(
+                [first.id, third.id],
+                [a.id for a in open_accounts])
+            self.assertEqual([second.id], [a.id for a in closed_accounts])
+            self.assertEqual([third.id], [a.id for a in next_page])
+
+    def test_select_by_name(self):
+        ## Arrange
+        with BankMySqlDatabase() as db:
+            unique = datetime.now(timezone.utc).strftime('%H%M%S%f')
+            exact = db.insert(Account(None, f'Zed{unique}  Cat', USD.ZERO, None))
+            renamed = db.insert(Account(None, 'placeholder', USD.ZERO, None))
+            db.update_name(renamed.id, f'ZED{unique} Dog')
+
+            ## Act
+            prefix_matches = db.select_by_name(f'zed{unique} ', 10)
+            limited = db.select_by_name(f'zed{unique}', 1)
+
+            ## Assert
+            self.assertEqual(
+                [exact.id, renamed.id],
+                [a.id for a in prefix_matches])
+            self.assertEqual([exact.id], [a.id for a in limited])
+
+    def test_archive_closed(self):
+        ## Arrange
+        with BankMySqlDatabase() as db:
+            now = datetime.now(timezone.utc)
+            closed_at = now - timedelta(days=1)
+            frank = db.insert(Account(None, 'archive test', USD.ZERO, closed_at))
+            db.commit_transaction()
+
+            ## Act
+            db.start_serializable_transaction()
+            archived = db.archive_closed(frank.id - 1, now, 1, now)
+            db.commit_transaction()
+
+            ## Assert
+            self.assertEqual([frank.id], archived)
+            self.assertEqual('archive test', db.select_by_id(frank.id).full_name)
+            self.assertNotIn(frank.id, [a.id for a in db.select_page(frank.id - 1, 1)])
+
+    def test_range_checksum_matches_python(self):
+        ## Arrange
+        with BankMySqlDatabase() as db:
+            db.start_serializable_transaction()
+            closed_at = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+            accounts = db.insert_many([
+                Account(None, 'checksum test open', USD(12_34), None),
+                Account(None, 'checksum test closed', USD.ZERO, closed_at),
+                ])
+            db.commit_transaction()
+            first_id = accounts[0].id
+            end_id = accounts[-1].id + 1
+
+            ## Act
+            db.start_read_only_transaction()
+            actual = db.range_checksum(first_id, end_id)
+            expected = checksum_of(db.select_page(first_id - 1, end_id - first_id))
+            db.commit_transaction()
+
+            ## Assert
+            self.assertEqual(expected, actual)
+
+    def test_withdrawal_log_round_trip(self):
+        ## Arrange
+        with BankMySqlDatabase() as db:
+            at = datetime.now(timezone.utc)
+            db.start_serializable_transaction()
+            frank = db.insert(Account(None, 'withdrawal test', USD(10_00), None))
+            db.insert_withdrawals([(frank.id, USD(1_23), at)])
+            db.commit_transaction()
+
+            ## Act
+            actual = db.select_withdrawals_since(at)
+
+            ## Assert
+            self.assertIn((frank.id, USD(1_23), at), actual)
+
+    def test_mark_applied_once(self):
+        ## Arrange
+        request_id = os.urandom(16).hex()
+        with BankMySqlDatabase() as db:
+            at = datetime.now(timezone.utc)
+            db.start_serializable_transaction()
+
+            ## Act
+            first = db.mark_applied(request_id, None, at)
+            second = db.mark_applied(request_id, 'insufficient funds', at)
+            db.commit_transaction()
+
+            ## Assert
+            self.assertTrue(first)
+            self.assertFalse(second)
+
+    def test_purge_logs(self):
+        ## Arrange
+        request_id = os.urandom(16).hex()
+        with BankMySqlDatabase() as db:
+            long_ago = datetime(2000, 1, 1, tzinfo=timezone.utc)
+            db.start_serializable_transaction()
+            frank = db.insert(Account(None, 'purge test', USD(10_00), None))
+            db.insert_withdrawals([(frank.id, USD(1_23), long_ago)])
+            db.mark_applied(request_id, None, long_ago)
+            db.commit_transaction()
+
+            ## Act
+            db.start_serializable_transaction()
+            withdrawals = db.purge_withdrawals_before(long_ago + timedelta(days=1), 1000)
+            requests = db.purge_applied_before(long_ago + timedelta(days=1), 1000)
+            db.commit_transaction()
+
+            ## Assert
+            self.assertGreaterEqual(withdrawals, 1)
+            self.assertGreaterEqual(requests, 1)
+            self.assertNotIn(
+                (frank.id, USD(1_23), long_ago),
+                db.select_withdrawals_since(long_ago))
+            db.start_serializable_transaction()
+            self.assertTrue(db.mark_applied(request_id, None, long_ago))
+            db.rollback_transaction()
+
     def test_serializable_transaction(self):
         '''
         Frank, who has only $1.00, attempts to withdraw almost a dollar from two
@@ -160,6 +344,131 @@ class TestBankMySqlDatabase(unittest.TestCase):
                 ## Assert
                 self.assertFalse(db.connection.in_transaction)
 
+class TestRowMapping(unittest.TestCase):
+    def test_accounts_from_rows(self):
+        ## Arrange
+        closed_at = datetime(2026, 10, 1, 12, 30)
+        rows = [
+            (1, 'Frank the Cat', 12_34, None),
+            (2, 'Sam the Dog', 0, closed_at),
+            ]
+
+        ## Act
+        actual = database._accounts_from_rows(rows)
+
+        ## Assert
+        self.assertEqual(
+            [repr(database._account_from_row(row)) for row in rows],
+            [repr(a) for a in actual])
+        self.assertEqual(closed_at.replace(tzinfo=timezone.utc), actual[1].closed_at)
+
+class TestConnectionHealth(unittest.TestCase):
+    def test_reconnects_lost_connection(self):
+        ## Arrange
+        db = BankMySqlDatabase(idle_check_after=timedelta(0))
+        db.connection = MagicMock()
+        db.connection.ping.side_effect = mysql.connector.errors.InterfaceError('gone')
+
+        ## Act
+        db.start_serializable_transaction()
+
+        ## Assert
+        db.connection.reconnect.assert_called_once_with(attempts=1)
+        db.connection.cursor().execute.assert_called_with("set time_zone = '+00:00'")
+        db.connection.start_transaction.assert_called_once_with(
+            isolation_level='SERIALIZABLE')
+
+    def test_fails_fast_while_down(self):
+        ## Arrange
+        db = BankMySqlDatabase(
+            idle_check_after=timedelta(0),
+            circuit=CircuitBreaker(failure_threshold=2))
+        db.connection = MagicMock()
+        db.connection.ping.side_effect = mysql.connector.errors.InterfaceError('gone')
+        db.connection.reconnect.side_effect = mysql.connector.errors.InterfaceError('down')
+
+        ## Act
+        for _ in range(2):
+            with self.assertRaises(mysql.connector.Error):
+                db.start_serializable_transaction()
+
+        ## Assert
+        with self.assertRaises(CircuitOpen):
+            db.start_serializable_transaction()
+        self.assertEqual(2, db.connection.reconnect.call_count)
+
+    @unittest.skipUnless(
+        os.environ.get('ELITE102_RESTART_TEST'),
+        'set ELITE102_RESTART_TEST=1 to restart the MySQL container')
+    def test_survives_mysql_restart(self):
+        with BankMySqlDatabase(idle_check_after=timedelta(0)) as db:
+            ## Arrange
+            bank = Bank(db, SystemClock())
+            frank = bank.open_account('Frank the Cat')
+
+            ## Act
+            subprocess.run(
+                ['sudo', 'docker', 'restart', 'elite102-mysql'],
+                check=True)
+            deadline = datetime.now() + timedelta(seconds=60)
+            while True:
+                try:
+                    actual = bank.load(frank.id)
+                    break
+                except (CircuitOpen, mysql.connector.Error):
+                    if datetime.now() > deadline:
+                        raise
+                    sleep(0.5)
+
+            ## Assert
+            self.assertEqual('Frank the Cat', actual.full_name)
+
+## set by `db.bash replica` to 3307; replica tests are skipped without it
+REPLICA_PORT = os.environ.get('ELITE102_REPLICA_PORT')
+
+@unittest.skipUnless(REPLICA_PORT, 'no replica (see db.bash replica)')
+class TestReplicaRouting(unittest.TestCase):
+    def replicated(self):
+        return BankMySqlDatabase(
+            replica_host='127.0.0.1',
+            replica_port=int(REPLICA_PORT))
+
+    def test_reads_use_replica(self):
+        with self.replicated() as db:
+            ## Act
+            db.start_read_only_transaction()
+            reading_replica = db._reading_replica
+            db.commit_transaction()
+
+            ## Assert
+            self.assertIsNotNone(db.replica)
+            self.assertTrue(reading_replica)
+
+    def test_read_your_writes(self):
+        with self.replicated() as db:
+            ## Arrange
+            bank = Bank(db, SystemClock())
+            frank = bank.open_account('Frank the Cat')
+
+            ## Act
+            for cents in range(1, 20):
+                bank.deposit(frank.id, USD(1))
+                actual = bank.load(frank.id)
+
+                ## Assert
+                self.assertEqual(USD(cents), actual.balance)
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        with BankMySqlDatabase(replica_host='127.0.0.1', replica_port=1) as db:
+            ## Act
+            db.start_read_only_transaction()
+            reading_replica = db._reading_replica
+            db.commit_transaction()
+
+            ## Assert
+            self.assertIsNone(db.replica)
+            self.assertFalse(reading_replica)
+
 def withdraw(account_id: AccountId, withdrawal: USD, wait: WaitSignal) -> None:
     def withdraw_closure():
         with BankMySqlDatabase() as db:
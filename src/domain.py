@@ -1,17 +1,20 @@
 from abc import ABC, abstractmethod
-from datetime import datetime
+from datetime import datetime, timezone
 import re
+from typing import TYPE_CHECKING, Callable, TypeVar
+
+if TYPE_CHECKING:
+    from velocity import VelocityTracker
 
 
 AccountId = int
+T = TypeVar('T')
 
 class USD:
     '''quantity of money in units of United States Dollars (USD)'''
+    __slots__ = ('_total_cents',)
 
     _total_cents: int
-    _dollars: int
-    _cents: int
-    _sign: int # always -1 or +1
 
     _CENTS_PER_DOLLAR = 100
     ##                      spaces $  dollars   . cents spaces
@@ -33,21 +36,38 @@ class USD:
 
         self._total_cents = cents
 
-        (d, c) = divmod(
-            abs(self._total_cents),
-            USD._CENTS_PER_DOLLAR)
-        self._sign = -1 if cents < 0 else 1
-        self._dollars = self._sign * d
-        self._cents = self._sign * c
+    @staticmethod
+    def trusted(cents: int) -> 'USD':
+        '''
+        USD from a value already known to be in range, e.g. one read back
+        from the database; skips the constructor's check
+        '''
+        money = object.__new__(USD)
+        money._total_cents = cents
+        return money
 
     @property
     def total_cents(self):
         '''ONLY FOR USE IN SERIALIZATION, DESERIALIZATION!'''
         return self._total_cents
 
+    @property
+    def _sign(self) -> int:
+        '''always -1 or +1'''
+        return -1 if self._total_cents < 0 else 1
+
+    @property
+    def _dollars(self) -> int:
+        return self._sign * (abs(self._total_cents) // USD._CENTS_PER_DOLLAR)
+
+    @property
+    def _cents(self) -> int:
+        return self._sign * (abs(self._total_cents) % USD._CENTS_PER_DOLLAR)
+
     def __str__(self):
-        sign = '-' if self._sign < 0 else ''
-        return f'${sign}{abs(self._dollars):0,}.{abs(self._cents):02d}'
+        (d, c) = divmod(abs(self._total_cents), USD._CENTS_PER_DOLLAR)
+        sign = '-' if self._total_cents < 0 else ''
+        return f'${sign}{d:0,}.{c:02d}'
 
     def __repr__(self):
         return f'USD({self._total_cents})'
@@ -106,8 +126,21 @@ def validated_full_name(full_name: str) -> str:
 
     return full_name
 
+## the length of the indexed, normalized copy of an account holder's name
+NORMALIZED_NAME_LENGTH = 255
+
+def normalized_name(full_name: str) -> str:
+    '''
+    the form in which names are indexed and searched: whitespace runs
+    collapsed to a single space, lower case, and at most NORMALIZED_NAME_LENGTH
+    characters
+    '''
+    return ' '.join(full_name.split()).lower()[:NORMALIZED_NAME_LENGTH]
+
 class Account:
     '''a single bank account'''
+    __slots__ = ('_id', '_full_name', '_balance', '_closed_at')
+
     _id: AccountId | None
     _full_name: str
     _balance: USD
@@ -118,6 +151,24 @@ class Account:
         '''create a new account'''
         return Account(None, full_name, USD.ZERO, None)
 
+    @staticmethod
+    def trusted(
+            acct_id: AccountId,
+            full_name: str,
+            balance: USD,
+            closed_at: datetime | None) -> 'Account':
+        '''
+        "Rehydrate" an Account from data already validated, e.g. a row read
+        back from the database, without validating it again.  `closed_at`
+        must be None or have a tzinfo.
+        '''
+        a = object.__new__(Account)
+        a._id = acct_id
+        a._full_name = full_name
+        a._balance = balance
+        a._closed_at = closed_at
+        return a
+
     def __init__(
             self,
             acct_id: AccountId | None,
@@ -172,6 +223,72 @@ class Account:
         s = self
         return f'Account({s.id}, {q(s.full_name)}, {repr(s.balance)}, {s.closed_at})'
 
+class AccountChange:
+    '''an Account as it was just before and just after a single operation'''
+    _before: Account
+    _after: Account
+
+    def __init__(self, before: Account, after: Account):
+        self._before = before
+        self._after = after
+
+    @property
+    def before(self) -> Account:
+        return self._before
+
+    @property
+    def after(self) -> Account:
+        return self._after
+
+    def __repr__(self):
+        return f'AccountChange({repr(self._before)}, {repr(self._after)})'
+
+class AccountEvent:
+    '''something that happened to one account, published once committed'''
+    _account: Account
+
+    def __init__(self, account: Account):
+        self._account = account
+
+    @property
+    def account_id(self) -> AccountId:
+        return self._account.id
+
+    @property
+    def account(self) -> Account:
+        '''the account just after the event'''
+        return self._account
+
+    def __repr__(self):
+        return f'{type(self).__name__}({repr(self._account)})'
+
+class AccountOpened(AccountEvent):
+    pass
+
+class AccountChangeEvent(AccountEvent):
+    '''an event that changed an existing account'''
+    _before: Account
+
+    def __init__(self, before: Account, after: Account):
+        super().__init__(after)
+        self._before = before
+
+    @property
+    def before(self) -> Account:
+        return self._before
+
+    def __repr__(self):
+        return f'{type(self).__name__}({repr(self._before)}, {repr(self._account)})'
+
+class AccountRenamed(AccountChangeEvent):
+    pass
+
+class BalanceChanged(AccountChangeEvent):
+    pass
+
+class AccountClosed(AccountChangeEvent):
+    pass
+
 def q(x) -> str:
     '''quoted string-ified version of `x`, or "None"'''
     return 'None' if x is None else f'"{str(x)}"'
@@ -181,8 +298,29 @@ class BankDatabase(ABC):
     def select_by_id(self, account_id: AccountId) -> Account:
         raise NotImplementedError()
     @abstractmethod
+    def select_page(
+            self,
+            after_id: AccountId,
+            limit: int,
+            is_open: bool | None = None) -> list[Account]:
+        raise NotImplementedError()
+    @abstractmethod
+    def select_by_name(self, query: str, limit: int) -> list[Account]:
+        raise NotImplementedError()
+    @abstractmethod
+    def account_id_bounds(self) -> tuple[AccountId, AccountId] | None:
+        '''the smallest and largest account IDs, or None when there are none'''
+        raise NotImplementedError()
+    @abstractmethod
     def insert(self, a: Account) -> Account:
         raise NotImplementedError()
+    def insert_many(self, accounts: list[Account]) -> list[Account]:
+        '''
+        insert rows for never-before-saved Accounts, returning them with their
+        new IDs in the same order; databases that can insert many rows at once
+        override this
+        '''
+        return [self.insert(a) for a in accounts]
     @abstractmethod
     def update_closed_at(self, account_id: AccountId, closed_at: datetime) -> None:
         raise NotImplementedError()
@@ -195,6 +333,12 @@ class BankDatabase(ABC):
     @abstractmethod
     def start_serializable_transaction(self) -> None:
         raise NotImplementedError()
+    def start_read_only_transaction(self) -> None:
+        '''
+        start a transaction that only reads; a database with read replicas may
+        run it on one, and others run an ordinary transaction
+        '''
+        self.start_serializable_transaction()
     @abstractmethod
     def commit_transaction(self) -> None:
         raise NotImplementedError()
@@ -208,104 +352,354 @@ class Clock(ABC):
         '''the current time '''
         raise NotImplementedError()
 
+class SystemClock(Clock):
+    def utcnow(self):
+        return datetime.now(timezone.utc)
+
+class EventPublisher(ABC):
+    @abstractmethod
+    def publish(self, events: list[AccountEvent]) -> None:
+        '''deliver committed events to subscribers; must not block or raise'''
+        raise NotImplementedError()
+
 class BoolLike(ABC):
     @abstractmethod
     def __bool__(self):
         raise NotImplementedError()
 
-class Bank:
-    def __init__(self, database: BankDatabase, clock: Clock):
-        self._db = database
-        self._clock = clock
+class BankSession:
+    '''
+    A unit of work: any sequence of Bank operations in a single transaction.
 
-    def open_account(self, full_name: str) -> Account:
-        self._db.start_serializable_transaction()
-        try:
-            account = self._db.insert(Account.new(full_name))
-            self._db.commit_transaction()
-            return account
-        except:
-            self._db.rollback_transaction()
-            raise
+        with bank.session() as s:
+            frank = s.open_account('Frank the Cat')
+            s.deposit(frank.id, USD(1_00))
 
-    def _load(self, account_id: AccountId) -> Account:
-        return self._db.select_by_id(account_id)
+    Each account is read at most once per session; later operations see the
+    session's own changes.  Changes are written when the session ends
+    without an error, and only the fields that changed.  An error rolls back
+    everything, including accounts opened in the session.
 
-    def load(self, account_id: AccountId) -> Account:
+    Operations check their business rules before changing anything, so one
+    that raises ValueError leaves the session as it was.
+
+    Once the session commits, an AccountEvent for each change goes to
+    `events`.
+
+    With a `velocity` tracker, withdrawals are also checked against its
+    limits, and logged in the database, which must be a WithdrawalLog.
+
+    `mark_applied()` makes a request idempotent: its ID commits with the
+    session's changes, or not at all.  The database must be an
+    AppliedRequestLog.
+    '''
+    def __init__(
+            self,
+            database: BankDatabase,
+            clock: Clock,
+            events: EventPublisher | None = None,
+            velocity: 'VelocityTracker | None' = None):
+        self._db = database
+        self._clock = clock
+        self._events = events
+        self._velocity = velocity
+        ## committed with the session, then published
+        self._pending_events: list[AccountEvent] = []
+        ## counted by `velocity`; logged with the session, or released
+        self._withdrawals: list[tuple[AccountId, USD, datetime]] = []
+        self._logged = 0
+        ## each account as it is in the database, and as it is in this session
+        self._stored: dict[AccountId, Account | None] = {}
+        self._current: dict[AccountId, Account | None] = {}
+
+    def __enter__(self):
         self._db.start_serializable_transaction()
+        return self
+
+    def __exit__(self, exc_type, _exc_value, _traceback):
         try:
-            result = self._db.select_by_id(account_id)
-            self._db.commit_transaction()
-            return result
+            if exc_type is None:
+                self.flush()
+                self._db.commit_transaction()
+                if self._events and self._pending_events:
+                    self._events.publish(self._pending_events)
+            else:
+                self._db.rollback_transaction()
+                self._release_withdrawals()
         except:
             self._db.rollback_transaction()
+            self._release_withdrawals()
             raise
+        finally:
+            self._stored.clear()
+            self._current.clear()
+            self._pending_events = []
+            self._withdrawals = []
+            self._logged = 0
+
+    def _release_withdrawals(self):
+        for withdrawal in self._withdrawals:
+            self._velocity.release(*withdrawal)
+
+    def flush(self) -> None:
+        '''write every change not yet written, without committing'''
+        for (account_id, after) in self._current.items():
+            before = self._stored[account_id]
+            if after is before:
+                continue
+
+            if after.full_name != before.full_name:
+                self._db.update_name(account_id, after.full_name)
+                self._pending_events.append(AccountRenamed(before, after))
+            if after.balance != before.balance:
+                self._db.update_balance(account_id, after.balance)
+                self._pending_events.append(BalanceChanged(before, after))
+            if after.closed_at != before.closed_at:
+                self._db.update_closed_at(account_id, after.closed_at)
+                self._pending_events.append(AccountClosed(before, after))
+            self._stored[account_id] = after
+
+        if self._logged < len(self._withdrawals):
+            self._db.insert_withdrawals(self._withdrawals[self._logged:])
+            self._logged = len(self._withdrawals)
+
+    def mark_applied(self, request_id: str, refused: str | None = None) -> bool:
+        '''
+        record the request as applied in this session (or refused, for the
+        reason given); False, recording nothing, when it already was
+        '''
+        return self._db.mark_applied(request_id, refused, self._clock.utcnow())
 
-    def close_account(self, account_id: AccountId) -> Account:
-        self._db.start_serializable_transaction()
-        try:
-            before = self._load(account_id)
+    def unmark_applied(self, request_id: str) -> None:
+        '''undo `mark_applied(request_id)` of this session'''
+        self._db.unmark_applied(request_id)
 
-            if not before.is_open:
-                return before
+    def load(self, account_id: AccountId) -> Account | None:
+        if account_id not in self._current:
+            account = self._db.select_by_id(account_id)
+            self._stored[account_id] = account
+            self._current[account_id] = account
+        return self._current[account_id]
 
-            if before.balance != USD.ZERO:
-                raise ValueError('cannot close account with non-zero balance')
+    def _load_existing(self, account_id: AccountId) -> Account:
+        account = self.load(account_id)
+        if account is None:
+            raise ValueError(f'no account {account_id}')
+        return account
 
-            self._db.update_closed_at(account_id, self._clock.utcnow())
-            after = self._load(account_id)
-            self._db.commit_transaction()
-            return after
-        except:
-            self._db.rollback_transaction()
-            raise
+    def _change(self, before: Account, after: Account) -> AccountChange:
+        self._current[before.id] = after
+        return AccountChange(before, after)
 
-    def alter_name(self, account_id: AccountId, full_name: str) -> Account:
+    def open_account(self, full_name: str) -> Account:
+        ## inserted right away, since the database assigns the ID
+        account = self._db.insert(Account.new(full_name))
+        self._stored[account.id] = account
+        self._current[account.id] = account
+        self._pending_events.append(AccountOpened(account))
+        return account
+
+    def open_accounts(self, full_names: list[str]) -> list[Account]:
+        '''open an account for each name, inserting them all at once'''
+        accounts = self._db.insert_many([Account.new(n) for n in full_names])
+        for account in accounts:
+            self._stored[account.id] = account
+            self._current[account.id] = account
+            self._pending_events.append(AccountOpened(account))
+        return accounts
+
+    def close_account(self, account_id: AccountId) -> AccountChange:
+        before = self._load_existing(account_id)
+
+        if not before.is_open:
+            return AccountChange(before, before)
+
+        if before.balance != USD.ZERO:
+            raise ValueError('cannot close account with non-zero balance')
+
+        return self._change(
+            before,
+            Account(before.id, before.full_name, before.balance, self._clock.utcnow()))
+
+    def alter_name(self, account_id: AccountId, full_name: str) -> AccountChange:
         full_name = validated_full_name(full_name)
-        self._db.start_serializable_transaction()
-        try:
-            account = self._load(account_id)
+        before = self._load_existing(account_id)
 
-            if not account.is_open:
-                raise ValueError('cannot alter closed account')
+        if not before.is_open:
+            raise ValueError('cannot alter closed account')
 
-            self._db.update_name(account_id, full_name)
-            after = self._load(account_id)
-            self._db.commit_transaction()
-            return after
-        except:
-            self._db.rollback_transaction()
-            raise
+        return self._change(
+            before,
+            Account(before.id, full_name, before.balance, before.closed_at))
 
-    def deposit(self, account_id: AccountId, amount: USD) -> Account:
-        self._db.start_serializable_transaction()
-        try:
-            account = self._load(account_id)
-            if not account.is_open:
-                raise ValueError('cannot deposit into closed account')
+    def deposit(self, account_id: AccountId, amount: USD) -> AccountChange:
+        if not amount > USD.ZERO:
+            raise ValueError(f'deposit amount must be positive (it was {amount})')
+        before = self._load_existing(account_id)
+        if not before.is_open:
+            raise ValueError('cannot deposit into closed account')
 
-            self._db.update_balance(account_id, account.balance + amount)
-            after = self._load(account_id)
-            self._db.commit_transaction()
-            return after
-        except:
-            self._db.rollback_transaction()
-            raise
+        return self._change(
+            before,
+            Account(before.id, before.full_name, before.balance + amount, before.closed_at))
 
-    def withdraw(self, account_id: AccountId, amount: USD) -> Account:
-        self._db.start_serializable_transaction()
-        try:
-            account = self._load(account_id)
-            if not account.is_open:
-                raise ValueError('cannot withdraw from closed account')
+    def withdraw(self, account_id: AccountId, amount: USD) -> AccountChange:
+        if not amount > USD.ZERO:
+            raise ValueError(f'withdrawal amount must be positive (it was {amount})')
+        before = self._load_existing(account_id)
+        if not before.is_open:
+            raise ValueError('cannot withdraw from closed account')
+
+        if before.balance < amount:
+            raise ValueError('cannot withdraw more than current balance')
+
+        if self._velocity is not None:
+            at = self._clock.utcnow()
+            self._velocity.reserve(account_id, amount, at)
+            self._withdrawals.append((account_id, amount, at))
+
+        return self._change(
+            before,
+            Account(before.id, before.full_name, before.balance - amount, before.closed_at))
+
+class Bank:
+    def __init__(
+            self,
+            database: BankDatabase,
+            clock: Clock,
+            events: EventPublisher | None = None,
+            velocity: 'VelocityTracker | None' = None):
+        '''
+        `events`, when given, receives an AccountEvent for each change.
+        `velocity`, when given, limits withdrawals (see BankSession).
+        '''
+        self._db = database
+        self._clock = clock
+        self._events = events
+        self._velocity = velocity
 
-            if account.balance < amount:
-                raise ValueError('cannot withdraw more than current balance')
+    def session(self) -> BankSession:
+        '''a unit of work for running several operations in one transaction'''
+        return BankSession(self._db, self._clock, self._events, self._velocity)
 
-            self._db.update_balance(account_id, account.balance - amount)
-            after = self._load(account_id)
+    def _in_transaction(self, work: Callable[[], T], read_only=False) -> T:
+        '''run `work()` in its own transaction, rolling back if it raises'''
+        if read_only:
+            self._db.start_read_only_transaction()
+        else:
+            self._db.start_serializable_transaction()
+        try:
+            result = work()
             self._db.commit_transaction()
-            return after
+            return result
         except:
             self._db.rollback_transaction()
             raise
+
+    def open_account(self, full_name: str) -> Account:
+        with self.session() as s:
+            return s.open_account(full_name)
+
+    def open_accounts(self, full_names: list[str]) -> list[Account]:
+        '''open an account for each name, all in one transaction'''
+        with self.session() as s:
+            return s.open_accounts(full_names)
+
+    def load(self, account_id: AccountId) -> Account:
+        return self._in_transaction(
+            lambda: self._db.select_by_id(account_id),
+            read_only=True)
+
+    def list_accounts(
+            self,
+            after_id: AccountId = 0,
+            limit: int = 100,
+            is_open: bool | None = None) -> list[Account]:
+        '''
+        Up to `limit` accounts in ID order, starting just after `after_id`;
+        pass the last ID of one page as `after_id` to get the next.  When
+        `is_open` is not None, list only open (or only closed) accounts.
+        '''
+        if limit <= 0:
+            raise ValueError(f'limit must be positive (it was {limit})')
+
+        return self._in_transaction(
+            lambda: self._db.select_page(after_id, limit, is_open),
+            read_only=True)
+
+    def search_by_name(self, query: str, limit: int = 20) -> list[Account]:
+        '''
+        Up to `limit` accounts whose holder's name best matches `query`; names
+        that start with the query come first, followed by similar names.
+        '''
+        if query is None or len(query.strip()) == 0:
+            raise ValueError('query must contain non-whitespace characters')
+        if limit <= 0:
+            raise ValueError(f'limit must be positive (it was {limit})')
+
+        return self._in_transaction(
+            lambda: self._db.select_by_name(query, limit),
+            read_only=True)
+
+    def close_account(self, account_id: AccountId) -> AccountChange:
+        with self.session() as s:
+            return s.close_account(account_id)
+
+    def alter_name(self, account_id: AccountId, full_name: str) -> AccountChange:
+        with self.session() as s:
+            return s.alter_name(account_id, full_name)
+
+    def deposit(self, account_id: AccountId, amount: USD) -> AccountChange:
+        with self.session() as s:
+            return s.deposit(account_id, amount)
+
+    def withdraw(self, account_id: AccountId, amount: USD) -> AccountChange:
+        with self.session() as s:
+            return s.withdraw(account_id, amount)
+
+    ## the BankSession operations `apply_batch()` accepts, by name
+    _BATCH_OPERATIONS = {
+        'open_account',
+        'close_account',
+        'alter_name',
+        'deposit',
+        'withdraw',
+        }
+
+    def apply_batch(
+            self,
+            operations: list[tuple[str, tuple]],
+            request_ids: list[str] | None = None,
+            ) -> list[Account | AccountChange | ValueError | None]:
+        '''
+        Apply a sequence of `(operation name, arguments)`, such as
+        `('deposit', (12, USD(1_00)))`, in a single session.
+
+        An operation that breaks a business rule fails alone: its result is
+        the ValueError, and the rest still commit.  Any other error rolls back
+        the whole batch.
+
+        Given a request ID for each operation, each is applied at most once
+        (see `BankSession.mark_applied()`); the result of one already
+        applied is None.  One the Bank refuses is not recorded, so it may be
+        tried again.
+        '''
+        for (name, _) in operations:
+            if name not in Bank._BATCH_OPERATIONS:
+                raise ValueError(f'unknown operation {name}')
+        if request_ids is not None and len(request_ids) != len(operations):
+            raise ValueError('expected a request ID for each operation')
+
+        results = []
+        with self.session() as s:
+            for (i, (name, args)) in enumerate(operations):
+                if request_ids is not None and not s.mark_applied(request_ids[i]):
+                    results.append(None)
+                    continue
+                try:
+                    results.append(getattr(s, name)(*args))
+                except ValueError as exc:
+                    if request_ids is not None:
+                        s.unmark_applied(request_ids[i])
+                    results.append(exc)
+        return results
@@ -1,8 +1,9 @@
 import unittest
-from unittest.mock import MagicMock, Mock, call
+from unittest.mock import ANY, MagicMock, Mock, call
 from datetime import timezone
 
 from domain import *
+from memory import BankMemoryDatabase
 
 class TestUSD(unittest.TestCase):
     def test_positive_value(self):
@@ -112,6 +113,14 @@ class TestUSD(unittest.TestCase):
         self.assertEqual(USD(1_000_000_00), USD.parse('$1,000,000.00'))
         self.assertEqual(USD(10_00), USD.parse(' \t\r\n$10.00 \t\r\n'))
 
+    def test_trusted(self):
+        self.assertEqual(USD(-12_34), USD.trusted(-12_34))
+        self.assertEqual('$-12.34', str(USD.trusted(-12_34)))
+
+    def test_compact(self):
+        with self.assertRaises(AttributeError):
+            USD(1).__dict__
+
 class TestValidatedFullName(unittest.TestCase):
     def test_invalid_name(self):
         ## Arrange
@@ -133,6 +142,16 @@ class TestValidatedFullName(unittest.TestCase):
                 ## Assert
                 self.assertEqual(valid_name, actual)
 
+class TestNormalizedName(unittest.TestCase):
+    def test_normalized_name(self):
+        for (name, expected) in [
+                ('Frank', 'frank'),
+                ('  Frank \t the\r\nCat ', 'frank the cat'),
+                ('x' * 300, 'x' * NORMALIZED_NAME_LENGTH),
+                ]:
+            with self.subTest(name):
+                self.assertEqual(expected, normalized_name(name))
+
 class TestAccount(unittest.TestCase):
     def test_invalid_names(self):
         for invalid_name in [None, '', ' \t\r\n']:
@@ -175,6 +194,24 @@ class TestAccount(unittest.TestCase):
         closed_account = Account(2, 'y', USD.ZERO, FakeClock().utcnow())
         self.assertFalse(closed_account.is_open)
 
+    def test_trusted(self):
+        ## Arrange
+        utcnow = datetime.now(timezone.utc)
+
+        ## Act
+        actual = Account.trusted(12, 'Frank the Cat', USD(1_23), utcnow)
+
+        ## Assert
+        self.assertEqual(12, actual.id)
+        self.assertEqual('Frank the Cat', actual.full_name)
+        self.assertEqual(USD(1_23), actual.balance)
+        self.assertEqual(utcnow, actual.closed_at)
+        self.assertFalse(actual.is_open)
+
+    def test_compact(self):
+        with self.assertRaises(AttributeError):
+            Account.new('Frank the Cat').__dict__
+
 class FakeClock(Clock):
     def __init__(self, return_value=None):
         self.value = return_value if return_value else datetime.now(timezone.utc)
@@ -217,6 +254,26 @@ class TestBank(unittest.TestCase):
         self.assertTrue(db.commit_transaction.called)
         self.assertTrue(db.rollback_transaction.called)
 
+    def test_open_accounts(self):
+        ## Arrange
+        db = MagicMock(BankDatabase)
+        db.insert_many.return_value = [
+            Account(1, 'Frank', USD.ZERO, None),
+            Account(2, 'Felix', USD.ZERO, None),
+            ]
+        bank = Bank(db, Mock(Clock))
+
+        ## Act
+        actual = bank.open_accounts(['Frank', 'Felix'])
+
+        ## Assert
+        self.assertEqual([1, 2], [a.id for a in actual])
+        self.assertEqual(
+            ['Frank', 'Felix'],
+            [a.full_name for a in db.insert_many.call_args[0][0]])
+        self.assertFalse(db.insert.called)
+        self.assertEqual(1, db.commit_transaction.call_count)
+
     def test_load(self):
         ## Arrange
         db = Mock(return_value=Account(1, 'x', USD.ZERO, None))
@@ -224,12 +281,87 @@ class TestBank(unittest.TestCase):
         bank = Bank(db, clock)
 
         ## Act
-        actual = bank._load(1)
+        actual = bank.load(1)
 
         ## Assert
         self.assertTrue(db.select_by_id.called)
         self.assertEqual(1, db.select_by_id.call_args[0][0])
 
+    def test_list_accounts(self):
+        ## Arrange
+        db = MagicMock(BankDatabase)
+        db.select_page.return_value = [Account(8, 'x', USD.ZERO, None)]
+        bank = Bank(db, Mock(Clock))
+
+        ## Act
+        actual = bank.list_accounts(after_id=7, limit=1, is_open=True)
+
+        ## Assert
+        db.assert_has_calls([
+            call.start_read_only_transaction(),
+            call.select_page(7, 1, True),
+            call.commit_transaction(),
+            ])
+        self.assertEqual([8], [a.id for a in actual])
+
+    def test_list_accounts_with_invalid_limit(self):
+        ## Arrange
+        db = MagicMock(BankDatabase)
+        bank = Bank(db, Mock(Clock))
+
+        ## Act & Assert
+        with self.assertRaises(ValueError):
+            bank.list_accounts(limit=0)
+
+        self.assertFalse(db.select_page.called)
+
+    def test_search_by_name(self):
+        ## Arrange
+        db = MagicMock(BankDatabase)
+        db.select_by_name.return_value = [Account(1, 'Frank', USD.ZERO, None)]
+        bank = Bank(db, Mock(Clock))
+
+        ## Act
+        actual = bank.search_by_name('fra', 5)
+
+        ## Assert
+        db.assert_has_calls([
+            call.start_read_only_transaction(),
+            call.select_by_name('fra', 5),
+            call.commit_transaction(),
+            ])
+        self.assertEqual([1], [a.id for a in actual])
+
+    def test_search_by_name_with_blank_query(self):
+        ## Arrange
+        db = MagicMock(BankDatabase)
+        bank = Bank(db, Mock(Clock))
+
+        ## Act & Assert
+        for query in [None, '', ' \t\r\n']:
+            with self.subTest(query):
+                with self.assertRaises(ValueError):
+                    bank.search_by_name(query)
+
+        self.assertFalse(db.select_by_name.called)
+
+    def test_load_is_read_only(self):
+        ## Arrange
+        db = MagicMock(BankDatabase)
+        db.select_by_id.return_value = Account(1, 'x', USD.ZERO, None)
+        bank = Bank(db, Mock(Clock))
+
+        ## Act
+        actual = bank.load(1)
+
+        ## Assert
+        db.assert_has_calls([
+            call.start_read_only_transaction(),
+            call.select_by_id(1),
+            call.commit_transaction(),
+            ])
+        self.assertFalse(db.start_serializable_transaction.called)
+
     def test_close_account_with_zero_balance(self):
         ## Arrange
         utcnow = datetime.now(timezone.utc)
@@ -245,6 +377,9 @@ class TestBank(unittest.TestCase):
         self.assertTrue(db.update_closed_at.called)
         self.assertEqual(1, db.update_closed_at.call_args[0][0])
         self.assertEqual(utcnow, db.update_closed_at.call_args[0][1])
+        self.assertTrue(actual.before.is_open)
+        self.assertEqual(utcnow, actual.after.closed_at)
+        self.assertEqual(1, db.select_by_id.call_count)
 
     def test_close_account_with_positive_balance(self):
         ## Arrange
@@ -269,10 +404,12 @@ class TestBank(unittest.TestCase):
         bank = Bank(db, clock)
 
         ## Act
-        bank.close_account(1)
+        actual = bank.close_account(1)
 
         ## Assert
         self.assertFalse(db.update_closed_at.called)
+        self.assertTrue(db.commit_transaction.called)
+        self.assertEqual(utcnow, actual.after.closed_at)
 
     def test_close_account_db_error(self):
         ## Arrange
@@ -305,6 +442,8 @@ class TestBank(unittest.TestCase):
         self.assertTrue(db.update_name.called)
         self.assertEqual(1, db.update_name.call_args[0][0])
         self.assertEqual('Frank the Cat', db.update_name.call_args[0][1])
+        self.assertEqual('x', actual.before.full_name)
+        self.assertEqual('Frank the Cat', actual.after.full_name)
 
     def test_alter_name_with_closed_account(self):
         ## Arrange
@@ -365,9 +504,11 @@ class TestBank(unittest.TestCase):
             call.start_serializable_transaction(),
             call.select_by_id(1),
             call.update_balance(1, USD(3_00)),
-            call.select_by_id(1),
             call.commit_transaction(),
             ])
+        self.assertEqual(1, db.select_by_id.call_count)
+        self.assertEqual(USD(1_00), actual.before.balance)
+        self.assertEqual(USD(3_00), actual.after.balance)
 
     def test_deposit_into_closed_account(self):
         ## Arrange
@@ -411,9 +552,11 @@ class TestBank(unittest.TestCase):
             call.start_serializable_transaction(),
             call.select_by_id(1),
             call.update_balance(1, USD.ZERO),
-            call.select_by_id(1),
             call.commit_transaction(),
             ])
+        self.assertEqual(1, db.select_by_id.call_count)
+        self.assertEqual(USD(1_00), actual.before.balance)
+        self.assertEqual(USD.ZERO, actual.after.balance)
 
     def test_withdraw_from_closed_account(self):
         ## Arrange
@@ -454,5 +597,179 @@ class TestBank(unittest.TestCase):
         self.assertTrue(db.commit_transaction.called)
         self.assertTrue(db.rollback_transaction.called)
 
+    def test_deposit_into_missing_account(self):
+        ## Arrange
+        db = MagicMock(BankDatabase)
+        db.select_by_id.return_value = None
+        bank = Bank(db, Mock(Clock))
+
+        ## Act & Assert
+        with self.assertRaises(ValueError):
+            bank.deposit(1, USD(1))
+
+        self.assertFalse(db.update_balance.called)
+        self.assertTrue(db.rollback_transaction.called)
+
+    def test_apply_batch(self):
+        ## Arrange
+        db = MagicMock(BankDatabase)
+        db.select_by_id.return_value = Account(1, 'x', USD(1_00), None)
+        db.insert.return_value = Account(2, 'y', USD.ZERO, None)
+        bank = Bank(db, Mock(Clock))
+
+        ## Act
+        actual = bank.apply_batch([
+            ('deposit', (1, USD(1_00))),
+            ('withdraw', (1, USD(5_00))),
+            ('open_account', ('y',)),
+            ])
+
+        ## Assert
+        db.assert_has_calls([
+            call.start_serializable_transaction(),
+            call.select_by_id(1),
+            call.insert(ANY),
+            call.update_balance(1, USD(2_00)),
+            call.commit_transaction(),
+            ])
+        self.assertEqual(1, db.start_serializable_transaction.call_count)
+        self.assertEqual(1, db.select_by_id.call_count)
+        self.assertEqual(USD(2_00), actual[0].after.balance)
+        self.assertIsInstance(actual[1], ValueError)
+        self.assertEqual(2, actual[2].id)
+
+    def test_apply_batch_leaves_refused_request_unmarked(self):
+        ## Arrange
+        db = BankMemoryDatabase()
+        frank = db.insert(Account(None, 'Frank', USD.ZERO, None))
+        bank = Bank(db, SystemClock())
+
+        ## Act
+        refused = bank.apply_batch([('withdraw', (frank.id, USD(1_00)))], ['r1'])
+        bank.deposit(frank.id, USD(1_00))
+        retried = bank.apply_batch([('withdraw', (frank.id, USD(1_00)))], ['r1'])
+        again = bank.apply_batch([('withdraw', (frank.id, USD(1_00)))], ['r1'])
+
+        ## Assert
+        self.assertIsInstance(refused[0], ValueError)
+        self.assertEqual(USD.ZERO, retried[0].after.balance)
+        self.assertEqual([None], again)
+
+    def test_apply_batch_db_error(self):
+        ## Arrange
+        db = MagicMock(BankDatabase)
+        db.select_by_id.return_value = Account(1, 'x', USD(1_00), None)
+        db.update_balance.side_effect = ExpectedError()
+        bank = Bank(db, Mock(Clock))
+
+        ## Act
+        with self.assertRaises(ExpectedError):
+            bank.apply_batch([
+                ('withdraw', (1, USD(5_00))),
+                ('deposit', (1, USD(1_00))),
+                ])
+
+        ## Assert
+        self.assertFalse(db.commit_transaction.called)
+        self.assertTrue(db.rollback_transaction.called)
+
+    def test_apply_batch_unknown_operation(self):
+        ## Arrange
+        db = MagicMock(BankDatabase)
+        bank = Bank(db, Mock(Clock))
+
+        ## Act & Assert
+        with self.assertRaises(ValueError):
+            bank.apply_batch([('embezzle', (1,))])
+
+        self.assertFalse(db.start_serializable_transaction.called)
+
+class TestBankSession(unittest.TestCase):
+    def test_reads_each_account_once(self):
+        ## Arrange
+        db = MagicMock(BankDatabase)
+        db.select_by_id.return_value = Account(1, 'x', USD(1_00), None)
+        bank = Bank(db, Mock(Clock))
+
+        ## Act
+        with bank.session() as s:
+            s.deposit(1, USD(1_00))
+            s.withdraw(1, USD(50))
+            actual = s.load(1)
+
+        ## Assert
+        self.assertEqual(USD(1_50), actual.balance)
+        self.assertEqual(
+            [
+                call.start_serializable_transaction(),
+                call.select_by_id(1),
+                call.update_balance(1, USD(1_50)),
+                call.commit_transaction(),
+            ],
+            db.mock_calls)
+
+    def test_amount_must_be_positive(self):
+        ## Arrange
+        db = MagicMock(BankDatabase)
+        db.select_by_id.return_value = Account(1, 'x', USD(10_00), None)
+        bank = Bank(db, Mock(Clock))
+
+        ## Act & Assert
+        for amount in [USD.ZERO, USD(-5_00)]:
+            with self.subTest(amount=amount):
+                with self.assertRaises(ValueError):
+                    bank.deposit(1, amount)
+                with self.assertRaises(ValueError):
+                    bank.withdraw(1, amount)
+        self.assertFalse(db.update_balance.called)
+
+    def test_flushes_only_changed_fields(self):
+        ## Arrange
+        utcnow = datetime.now(timezone.utc)
+        db = MagicMock(BankDatabase)
+        db.select_by_id.return_value = Account(1, 'x', USD.ZERO, None)
+        bank = Bank(db, FakeClock(utcnow))
+
+        ## Act
+        with bank.session() as s:
+            s.alter_name(1, 'Frank the Cat')
+            s.close_account(1)
+
+        ## Assert
+        db.update_name.assert_called_once_with(1, 'Frank the Cat')
+        db.update_closed_at.assert_called_once_with(1, utcnow)
+        self.assertFalse(db.update_balance.called)
+
+    def test_rolls_back_on_error(self):
+        ## Arrange
+        db = MagicMock(BankDatabase)
+        db.insert.return_value = Account(2, 'Frank the Cat', USD.ZERO, None)
+        bank = Bank(db, Mock(Clock))
+
+        ## Act
+        with self.assertRaises(ExpectedError):
+            with bank.session() as s:
+                frank = s.open_account('Frank the Cat')
+                s.deposit(frank.id, USD(1_00))
+                raise ExpectedError()
+
+        ## Assert
+        self.assertFalse(db.update_balance.called)
+        self.assertFalse(db.commit_transaction.called)
+        self.assertTrue(db.rollback_transaction.called)
+
+    def test_open_and_fund(self):
+        ## Arrange
+        db = BankMemoryDatabase()
+        bank = Bank(db, SystemClock())
+
+        ## Act
+        with bank.session() as s:
+            frank = s.open_account('Frank the Cat')
+            s.deposit(frank.id, USD(1_00))
+
+        ## Assert
+        self.assertEqual(USD(1_00), bank.load(frank.id).balance)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,126 @@
+'''
+Delivers committed AccountEvents from a Bank to any number of subscribers
+in the same process, e.g.
+
+    events = EventBus()
+    bank = Bank(db, clock, events)
+    subscription = events.subscribe(account_id=12, policy=COALESCE)
+    ...
+    for event in subscription.drain():
+        ...
+
+Publishing never waits for a subscriber.  Each subscription has a bounded
+queue, and a policy for what to do when it is full.
+'''
+from collections import OrderedDict, deque
+from threading import Lock
+
+from domain import AccountEvent, AccountId, EventPublisher
+
+## when a subscription's queue is full, discard the new event
+DROP_NEWEST = 'drop_newest'
+## when a subscription's queue is full, discard its oldest event
+DROP_OLDEST = 'drop_oldest'
+## keep only the latest event for each account; when events for more than
+## `max_size` accounts are waiting, discard the oldest
+COALESCE = 'coalesce'
+
+_POLICIES = (DROP_NEWEST, DROP_OLDEST, COALESCE)
+
+DEFAULT_MAX_SIZE = 100
+
+class Subscription:
+    '''events waiting for one subscriber, who takes them with `drain()`'''
+    def __init__(
+            self,
+            bus: 'EventBus',
+            max_size: int,
+            policy: str,
+            account_id: AccountId | None):
+        if max_size <= 0:
+            raise ValueError(f'max_size must be positive (it was {max_size})')
+        if policy not in _POLICIES:
+            raise ValueError(f'unknown policy {policy}')
+
+        self._bus = bus
+        self._max_size = max_size
+        self._policy = policy
+        self._account_id = account_id
+        self._lock = Lock()
+        self._queue: deque[AccountEvent] = deque()
+        self._latest: OrderedDict[AccountId, AccountEvent] = OrderedDict()
+        self.dropped = 0
+
+    @property
+    def account_id(self) -> AccountId | None:
+        '''the only account whose events are delivered, or None for all'''
+        return self._account_id
+
+    def _offer(self, event: AccountEvent):
+        if self._account_id is not None and event.account_id != self._account_id:
+            return
+
+        with self._lock:
+            if self._policy == COALESCE:
+                if event.account_id in self._latest:
+                    self.dropped += 1
+                elif len(self._latest) >= self._max_size:
+                    self._latest.popitem(last=False)
+                    self.dropped += 1
+                self._latest.pop(event.account_id, None)
+                self._latest[event.account_id] = event
+            elif len(self._queue) < self._max_size:
+                self._queue.append(event)
+            elif self._policy == DROP_OLDEST:
+                self._queue.popleft()
+                self._queue.append(event)
+                self.dropped += 1
+            else:
+                self.dropped += 1
+
+    def drain(self) -> list[AccountEvent]:
+        '''every waiting event, oldest first; never blocks'''
+        with self._lock:
+            if self._policy == COALESCE:
+                events = list(self._latest.values())
+                self._latest.clear()
+            else:
+                events = list(self._queue)
+                self._queue.clear()
+            return events
+
+    def close(self):
+        '''stop receiving events'''
+        self._bus.unsubscribe(self)
+
+class EventBus(EventPublisher):
+    def __init__(self):
+        self._lock = Lock()
+        self._subscriptions: list[Subscription] = []
+
+    def subscribe(
+            self,
+            max_size: int = DEFAULT_MAX_SIZE,
+            policy: str = DROP_OLDEST,
+            account_id: AccountId | None = None) -> Subscription:
+        '''
+        a new subscription to every event, or only to events for
+        `account_id`
+        '''
+        subscription = Subscription(self, max_size, policy, account_id)
+        with self._lock:
+            self._subscriptions = self._subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions = [
+                s for s in self._subscriptions if s is not subscription
+                ]
+
+    def publish(self, events: list[AccountEvent]) -> None:
+        ## the list is replaced, never changed, so it needs no lock to read
+        subscriptions = self._subscriptions
+        for event in events:
+            for subscription in subscriptions:
+                subscription._offer(event)
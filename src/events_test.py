@@ -0,0 +1,116 @@
+from unittest.mock import MagicMock, Mock
+import unittest
+
+from domain import *
+from memory import BankMemoryDatabase
+from events import *
+
+def balance_event(account_id: int, cents: int) -> BalanceChanged:
+    before = Account(account_id, 'x', USD.ZERO, None)
+    return BalanceChanged(before, Account(account_id, 'x', USD(cents), None))
+
+class TestEventBus(unittest.TestCase):
+    def test_drop_newest(self):
+        ## Arrange
+        bus = EventBus()
+        subscription = bus.subscribe(max_size=2, policy=DROP_NEWEST)
+
+        ## Act
+        bus.publish([balance_event(1, c) for c in [1, 2, 3]])
+
+        ## Assert
+        self.assertEqual([1, 2], [e.account.balance.total_cents for e in subscription.drain()])
+        self.assertEqual(1, subscription.dropped)
+        self.assertEqual([], subscription.drain())
+
+    def test_drop_oldest(self):
+        ## Arrange
+        bus = EventBus()
+        subscription = bus.subscribe(max_size=2, policy=DROP_OLDEST)
+
+        ## Act
+        bus.publish([balance_event(1, c) for c in [1, 2, 3]])
+
+        ## Assert
+        self.assertEqual([2, 3], [e.account.balance.total_cents for e in subscription.drain()])
+        self.assertEqual(1, subscription.dropped)
+
+    def test_coalesce(self):
+        ## Arrange
+        bus = EventBus()
+        subscription = bus.subscribe(max_size=2, policy=COALESCE)
+
+        ## Act
+        bus.publish([
+            balance_event(1, 1),
+            balance_event(2, 2),
+            balance_event(1, 3),
+            balance_event(3, 4),
+            ])
+
+        ## Assert
+        self.assertEqual(
+            [(1, 3), (3, 4)],
+            [(e.account_id, e.account.balance.total_cents) for e in subscription.drain()])
+
+    def test_account_filter_and_close(self):
+        ## Arrange
+        bus = EventBus()
+        subscription = bus.subscribe(account_id=2)
+
+        ## Act
+        bus.publish([balance_event(1, 1), balance_event(2, 2)])
+        first = subscription.drain()
+        subscription.close()
+        bus.publish([balance_event(2, 3)])
+
+        ## Assert
+        self.assertEqual([2], [e.account_id for e in first])
+        self.assertEqual([], subscription.drain())
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            EventBus().subscribe(policy='block')
+
+class TestBankEvents(unittest.TestCase):
+    def test_published_after_commit(self):
+        ## Arrange
+        bus = EventBus()
+        subscription = bus.subscribe()
+        bank = Bank(BankMemoryDatabase(), SystemClock(), bus)
+
+        ## Act
+        with bank.session() as s:
+            frank = s.open_account('Frank')
+            s.deposit(frank.id, USD(1_00))
+            self.assertEqual([], subscription.drain())
+        bank.alter_name(frank.id, 'Frank the Cat')
+        bank.withdraw(frank.id, USD(1_00))
+        bank.close_account(frank.id)
+
+        ## Assert
+        events = subscription.drain()
+        self.assertEqual(
+            [AccountOpened, BalanceChanged, AccountRenamed, BalanceChanged, AccountClosed],
+            [type(e) for e in events])
+        self.assertEqual(USD(1_00), events[1].account.balance)
+        self.assertEqual('Frank', events[2].before.full_name)
+
+    def test_nothing_published_on_rollback(self):
+        ## Arrange
+        bus = EventBus()
+        subscription = bus.subscribe()
+        db = MagicMock(BankDatabase)
+        db.select_by_id.return_value = Account(1, 'x', USD.ZERO, None)
+        db.commit_transaction.side_effect = RuntimeError('fake error')
+        bank = Bank(db, Mock(Clock), bus)
+
+        ## Act
+        with self.assertRaises(RuntimeError):
+            bank.deposit(1, USD(1_00))
+
+        ## Assert
+        self.assertEqual([], subscription.drain())
+
+if __name__ == '__main__':
+    unittest.main()
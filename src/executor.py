@@ -0,0 +1,292 @@
+'''
+Runs Bank operations across several worker processes, so that Python work
+is not limited to one core.
+
+Each process has its own database connection and Bank.  Operations on an
+account always go to process `account_id % shards`, so operations on one
+account run one at a time, in submission order, and never contend with each
+other in the database.  Requests and responses cross process boundaries as
+small tuples of built-in types.
+
+If a worker process dies, e.g. killed or out of memory, its unanswered
+operations fail with WorkerExited, since whether they committed is unknown,
+and later operations routed to it fail at once.
+'''
+from concurrent.futures import Future
+from datetime import datetime
+from itertools import count
+import multiprocessing
+from multiprocessing.connection import wait
+from threading import Lock, Thread
+from typing import Callable
+
+from domain import USD, Account, AccountChange, AccountId, Bank, BankDatabase, \
+    Clock, SystemClock
+
+## (id, full_name, balance_usd_cents, closed_at)
+_AccountTuple = tuple[AccountId, str, int, datetime | None]
+
+class WorkerExited(RuntimeError):
+    '''the worker process running an operation exited before answering'''
+
+def mysql_database(shard: int, shards: int) -> BankDatabase:
+    '''
+    a `database_factory` for ShardedBankExecutor that connects to MySQL; each
+    shard allocates only the IDs routed to it
+    '''
+    from database import BankMySqlDatabase
+    return BankMySqlDatabase(id_offset=shard or shards, id_increment=shards)
+
+def _account_tuple(account: Account | None) -> _AccountTuple | None:
+    if account is None:
+        return None
+    return (
+        account.id,
+        account.full_name,
+        account.balance.total_cents,
+        account.closed_at)
+
+def _account(values: _AccountTuple | None) -> Account | None:
+    if values is None:
+        return None
+    (acct_id, full_name, balance_usd_cents, closed_at) = values
+    ## made by the Bank in a worker, so already valid
+    return Account.trusted(acct_id, full_name, USD.trusted(balance_usd_cents), closed_at)
+
+def _change_tuple(change: AccountChange) -> tuple:
+    return (_account_tuple(change.before), _account_tuple(change.after))
+
+def _change(values: tuple) -> AccountChange:
+    return AccountChange(_account(values[0]), _account(values[1]))
+
+## operation name -> (Bank, arguments) -> response tuple, run in a worker
+_OPERATIONS = {
+    'open_account': lambda bank, full_name:
+        _account_tuple(bank.open_account(full_name)),
+    'load': lambda bank, account_id:
+        _account_tuple(bank.load(account_id)),
+    'close_account': lambda bank, account_id:
+        _change_tuple(bank.close_account(account_id)),
+    'alter_name': lambda bank, account_id, full_name:
+        _change_tuple(bank.alter_name(account_id, full_name)),
+    'deposit': lambda bank, account_id, cents:
+        _change_tuple(bank.deposit(account_id, USD(cents))),
+    'withdraw': lambda bank, account_id, cents:
+        _change_tuple(bank.withdraw(account_id, USD(cents))),
+    }
+
+def _serve(
+        shard: int,
+        shards: int,
+        database_factory: Callable[[int, int], BankDatabase],
+        clock: Clock,
+        requests: multiprocessing.Queue,
+        responses: multiprocessing.Queue):
+    '''the body of each worker process'''
+    with database_factory(shard, shards) as db:
+        bank = Bank(db, clock)
+        while True:
+            request = requests.get()
+            if request is None:
+                return
+
+            (request_id, name, args) = request
+            try:
+                responses.put((request_id, True, _OPERATIONS[name](bank, *args)))
+            except ValueError as exc:
+                responses.put((request_id, False, (True, str(exc))))
+            except Exception as exc:
+                responses.put((
+                    request_id,
+                    False,
+                    (False, f'{type(exc).__name__}: {exc}')))
+
+class ShardedBankExecutor:
+    '''
+    Bank operations that return futures, run by `shards` worker processes.
+
+    `database_factory(shard, shards)` runs in each worker process to create
+    its database, so it must be a module-level function.
+    '''
+    def __init__(
+            self,
+            database_factory: Callable[[int, int], BankDatabase],
+            shards: int,
+            clock: Clock | None = None):
+        if shards <= 0:
+            raise ValueError(f'shards must be positive (it was {shards})')
+        clock = clock or SystemClock()
+
+        self._shards = shards
+        self._request_ids = count()
+        ## new accounts have no ID to route by; spread them out
+        self._next_open = count()
+        ## request ID -> (future, decode, shard)
+        self._pending: dict[int, tuple[Future, Callable, int]] = {}
+        self._pending_lock = Lock()
+        self._closed = False
+        ## shard -> why its worker process is gone
+        self._exited: dict[int, str] = {}
+
+        self._requests = [multiprocessing.Queue() for _ in range(shards)]
+        self._responses = multiprocessing.Queue()
+        self._processes = [
+            multiprocessing.Process(
+                target=_serve,
+                args=(
+                    shard,
+                    shards,
+                    database_factory,
+                    clock,
+                    self._requests[shard],
+                    self._responses),
+                name=f'bank-shard-{shard}',
+                daemon=True)
+            for shard in range(shards)
+            ]
+        for process in self._processes:
+            process.start()
+
+        ## started after the processes, which may be forked from this one
+        self._collector = Thread(
+            target=self._collect,
+            name='bank-shard-responses',
+            daemon=True)
+        self._collector.start()
+        self._watcher = Thread(
+            target=self._watch,
+            name='bank-shard-watcher',
+            daemon=True)
+        self._watcher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _exc_type, _exc_value, _traceback):
+        self.close()
+
+    def shard_of(self, account_id: AccountId) -> int:
+        return account_id % self._shards
+
+    def _submit(
+            self,
+            shard: int,
+            name: str,
+            args: tuple,
+            decode: Callable) -> Future:
+        future = Future()
+        future.set_running_or_notify_cancel()
+        request_id = next(self._request_ids)
+        with self._pending_lock:
+            if self._closed:
+                raise RuntimeError('executor is closed')
+            if shard in self._exited:
+                raise WorkerExited(self._exited[shard])
+            self._pending[request_id] = (future, decode, shard)
+        self._requests[shard].put((request_id, name, args))
+        return future
+
+    def _watch(self):
+        '''
+        Report each worker process's exit to the collector, through the
+        responses queue, behind every response the process managed to send.
+        '''
+        running = {p.sentinel: shard for (shard, p) in enumerate(self._processes)}
+        while running:
+            for sentinel in wait(list(running)):
+                shard = running.pop(sentinel)
+                self._responses.put((None, shard, self._processes[shard].exitcode))
+
+    def _collect(self):
+        while True:
+            response = self._responses.get()
+            if response is None:
+                return
+
+            (request_id, ok, payload) = response
+            if request_id is None:
+                self._fail_shard(ok, payload)
+                continue
+
+            with self._pending_lock:
+                (future, decode, _) = self._pending.pop(request_id)
+            if ok:
+                future.set_result(decode(payload))
+            else:
+                (is_value_error, message) = payload
+                future.set_exception(
+                    ValueError(message) if is_value_error
+                    else RuntimeError(message))
+
+    def _fail_shard(self, shard: int, exitcode: int | None):
+        '''fail the operations the shard's exited process never answered'''
+        reason = (
+            f'worker process for shard {shard} exited with code {exitcode}; '
+            f'the outcome of its unanswered operations is unknown')
+        with self._pending_lock:
+            self._exited[shard] = reason
+            lost = [
+                request_id
+                for (request_id, (_, _, s)) in self._pending.items()
+                if s == shard
+                ]
+            futures = [self._pending.pop(request_id)[0] for request_id in lost]
+        for future in futures:
+            future.set_exception(WorkerExited(reason))
+
+    def open_account(self, full_name: str) -> 'Future[Account]':
+        shard = next(self._next_open) % self._shards
+        return self._submit(shard, 'open_account', (full_name,), _account)
+
+    def load(self, account_id: AccountId) -> 'Future[Account]':
+        return self._submit(
+            self.shard_of(account_id), 'load', (account_id,), _account)
+
+    def close_account(self, account_id: AccountId) -> 'Future[AccountChange]':
+        return self._submit(
+            self.shard_of(account_id), 'close_account', (account_id,), _change)
+
+    def alter_name(
+            self,
+            account_id: AccountId,
+            full_name: str) -> 'Future[AccountChange]':
+        return self._submit(
+            self.shard_of(account_id),
+            'alter_name',
+            (account_id, full_name),
+            _change)
+
+    def deposit(self, account_id: AccountId, amount: USD) -> 'Future[AccountChange]':
+        return self._submit(
+            self.shard_of(account_id),
+            'deposit',
+            (account_id, amount.total_cents),
+            _change)
+
+    def withdraw(self, account_id: AccountId, amount: USD) -> 'Future[AccountChange]':
+        return self._submit(
+            self.shard_of(account_id),
+            'withdraw',
+            (account_id, amount.total_cents),
+            _change)
+
+    def close(self):
+        '''finish every operation already submitted, then stop the workers'''
+        with self._pending_lock:
+            if self._closed:
+                return
+            self._closed = True
+
+        for requests in self._requests:
+            requests.put(None)
+        for process in self._processes:
+            process.join()
+        ## every exit is reported before the collector is stopped
+        self._watcher.join()
+        self._responses.put(None)
+        self._collector.join()
+
+        with self._pending_lock:
+            for (future, _, _) in self._pending.values():
+                future.set_exception(WorkerExited('worker process exited'))
+            self._pending.clear()
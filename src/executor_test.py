@@ -0,0 +1,75 @@
+import os
+import signal
+import unittest
+
+from domain import *
+from memory import BankMemoryDatabase
+from executor import *
+
+def memory_database(shard: int, shards: int) -> BankDatabase:
+    '''each shard allocates only the IDs routed to it'''
+    return BankMemoryDatabase(id_offset=shard or shards, id_increment=shards)
+
+class TestShardedBankExecutor(unittest.TestCase):
+    def test_operations(self):
+        with ShardedBankExecutor(memory_database, shards=3) as executor:
+            ## Arrange
+            accounts = [
+                executor.open_account(f'Frank {i}').result() for i in range(6)
+                ]
+
+            ## Act
+            deposits = [executor.deposit(a.id, USD(1_00)) for a in accounts]
+            for a in accounts:
+                executor.withdraw(a.id, USD(25))
+            overdraft = executor.withdraw(accounts[0].id, USD(1_00))
+            renamed = executor.alter_name(accounts[1].id, 'Felix')
+            loaded = [executor.load(a.id) for a in accounts]
+
+            ## Assert
+            self.assertEqual(
+                [0, 1, 2, 0, 1, 2],
+                [executor.shard_of(a.id) for a in accounts])
+            self.assertEqual(USD(1_00), deposits[0].result().after.balance)
+            with self.assertRaises(ValueError):
+                overdraft.result()
+            self.assertEqual('Felix', renamed.result().after.full_name)
+            self.assertEqual(
+                [USD(75)] * 6,
+                [f.result().balance for f in loaded])
+
+    def test_close_finishes_submitted_work(self):
+        ## Arrange
+        executor = ShardedBankExecutor(memory_database, shards=2)
+        account = executor.open_account('Frank').result()
+
+        ## Act
+        futures = [executor.deposit(account.id, USD(1)) for _ in range(100)]
+        executor.close()
+
+        ## Assert
+        self.assertEqual(USD(100), futures[-1].result().after.balance)
+        with self.assertRaises(RuntimeError):
+            executor.load(account.id)
+
+    def test_worker_death_fails_its_operations(self):
+        with ShardedBankExecutor(memory_database, shards=2) as executor:
+            ## Arrange
+            account = executor.open_account('Frank').result()
+            shard = executor.shard_of(account.id)
+            other = executor.open_account('Felix').result()
+
+            ## Act
+            os.kill(executor._processes[shard].pid, signal.SIGKILL)
+
+            ## Assert
+            with self.assertRaises(WorkerExited):
+                ## the deposit may be queued before or after the death is seen
+                executor.deposit(account.id, USD(1_00)).result(timeout=10)
+            with self.assertRaises(WorkerExited):
+                executor.load(account.id)
+            self.assertNotEqual(shard, executor.shard_of(other.id))
+            self.assertEqual('Felix', executor.load(other.id).result(timeout=10).full_name)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,470 @@
+'''
+Makes any BankDatabase slow and unreliable on purpose, to predict how Bank
+behaves against a distant or overloaded MySQL without one, e.g.
+
+    timings = Timings()
+    db = FaultInjectingDatabase(
+        BankMemoryDatabase(),
+        default_latency=lognormal(timedelta(milliseconds=5), 0.5),
+        deadlock_rate=0.01,
+        timings=timings)
+    bank = Bank(db, SystemClock())
+    ...
+    print(timings.percentile('transaction', 0.99))
+
+or, to model a whole workload from the command line,
+
+    python src/faults.py --latency-ms 5 --deadlock-rate 0.01 --workers 8
+'''
+import argparse
+from datetime import datetime, timedelta
+from itertools import count
+from math import ceil, log
+from random import Random
+from threading import Lock, Thread
+from time import monotonic, sleep
+from typing import Callable
+
+from domain import USD, Account, AccountId, Bank, BankDatabase, SystemClock
+from storage import AppliedRequestLog, Withdrawal, WithdrawalLog
+
+## draws one delay, in seconds
+Latency = Callable[[Random], float]
+
+## MySQL's ER_LOCK_DEADLOCK
+DEADLOCK_ERRNO = 1213
+
+## every method that may be given its own latency
+_STATEMENTS = (
+    'select_by_id',
+    'select_page',
+    'select_by_name',
+    'account_id_bounds',
+    'insert',
+    'insert_many',
+    'update_closed_at',
+    'update_name',
+    'update_balance',
+    'insert_withdrawals',
+    'select_withdrawals_since',
+    'purge_withdrawals_before',
+    'mark_applied',
+    'unmark_applied',
+    'purge_applied_before',
+    )
+_METHODS = _STATEMENTS + (
+    'start_serializable_transaction',
+    'start_read_only_transaction',
+    'commit_transaction',
+    'rollback_transaction',
+    )
+
+def constant(latency: timedelta) -> Latency:
+    seconds = latency.total_seconds()
+    return lambda _random: seconds
+
+def uniform(low: timedelta, high: timedelta) -> Latency:
+    (a, b) = (low.total_seconds(), high.total_seconds())
+    return lambda random: random.uniform(a, b)
+
+def lognormal(median: timedelta, sigma: float) -> Latency:
+    '''
+    mostly near `median`, with a long tail; about 1% of delays exceed
+    `median * exp(2.33 * sigma)`
+    '''
+    mu = log(median.total_seconds())
+    return lambda random: random.lognormvariate(mu, sigma)
+
+class InjectedDeadlock(Exception):
+    '''a deadlock that did not really happen; the transaction must be retried'''
+    errno = DEADLOCK_ERRNO
+    sqlstate = '40001'
+
+    def __init__(self):
+        super().__init__(
+            f'{DEADLOCK_ERRNO} ({self.sqlstate}): Deadlock found when trying '
+            'to get lock; try restarting transaction')
+
+class Timings:
+    '''
+    How long things took, by name: each database method, and "transaction"
+    for each transaction from its start to its commit.  One Timings may be
+    shared by many FaultInjectingDatabases on many threads.
+    '''
+    def __init__(self):
+        self._lock = Lock()
+        self._seconds: dict[str, list[float]] = {}
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self._seconds.setdefault(name, []).append(seconds)
+
+    def names(self) -> list[str]:
+        with self._lock:
+            return sorted(self._seconds)
+
+    def count(self, name: str) -> int:
+        with self._lock:
+            return len(self._seconds.get(name, []))
+
+    def mean(self, name: str) -> timedelta:
+        with self._lock:
+            seconds = self._seconds.get(name, [])
+            return timedelta(seconds=sum(seconds) / len(seconds) if seconds else 0)
+
+    def percentile(self, name: str, fraction: float) -> timedelta:
+        '''e.g. `percentile('transaction', 0.99)`, by the nearest-rank method'''
+        if not 0 < fraction <= 1:
+            raise ValueError(f'fraction must be in (0, 1] (it was {fraction})')
+        with self._lock:
+            seconds = sorted(self._seconds.get(name, []))
+        if not seconds:
+            return timedelta(0)
+        return timedelta(seconds=seconds[max(1, ceil(fraction * len(seconds))) - 1])
+
+class FaultInjectingDatabase(BankDatabase, WithdrawalLog, AppliedRequestLog):
+    '''
+    A BankDatabase that delays every call to another one, by a latency drawn
+    from that method's distribution (or `default_latency`).
+
+    Each statement fails with InjectedDeadlock, instead of running, with
+    probability `deadlock_rate`; like MySQL, it leaves the transaction to be
+    rolled back.  Each commit stalls for an extra `commit_stall` with
+    probability `commit_stall_rate`, as when the log device is busy.
+
+    Every call's duration, injected delays included, is recorded in
+    `timings`.  The withdrawal and applied request logs are passed through
+    the same way, when the other database keeps them.
+    '''
+    def __init__(
+            self,
+            database: BankDatabase,
+            latencies: dict[str, Latency] | None = None,
+            default_latency: Latency | None = None,
+            deadlock_rate: float = 0.0,
+            commit_stall_rate: float = 0.0,
+            commit_stall: Latency = constant(timedelta(milliseconds=200)),
+            timings: Timings | None = None,
+            seed: int | None = None,
+            sleep: Callable[[float], None] = sleep,
+            now: Callable[[], float] = monotonic):
+        latencies = latencies or {}
+        unknown = set(latencies) - set(_METHODS)
+        if unknown:
+            raise ValueError(f'unknown methods {sorted(unknown)}')
+        if not 0 <= deadlock_rate <= 1 or not 0 <= commit_stall_rate <= 1:
+            raise ValueError('deadlock_rate and commit_stall_rate must be in [0, 1]')
+
+        self._database = database
+        self._latencies = latencies
+        self._default_latency = default_latency
+        self._deadlock_rate = deadlock_rate
+        self._commit_stall_rate = commit_stall_rate
+        self._commit_stall = commit_stall
+        self.timings = timings or Timings()
+        self._random = Random(seed)
+        self._sleep = sleep
+        self._now = now
+        self._transaction_started: float | None = None
+
+        self.deadlocks = 0
+        self.commit_stalls = 0
+
+    def __enter__(self):
+        self._database = self._database.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._database.__exit__(exc_type, exc_value, traceback)
+
+    def _call(self, name: str, work: Callable):
+        started = self._now()
+        try:
+            latency = self._latencies.get(name, self._default_latency)
+            if latency:
+                self._sleep(latency(self._random))
+            if name == 'commit_transaction' and self._chance(self._commit_stall_rate):
+                self.commit_stalls += 1
+                self._sleep(self._commit_stall(self._random))
+            if name in _STATEMENTS and self._chance(self._deadlock_rate):
+                self.deadlocks += 1
+                raise InjectedDeadlock()
+            return work()
+        finally:
+            self.timings.record(name, self._now() - started)
+
+    def _chance(self, rate: float) -> bool:
+        return rate > 0 and self._random.random() < rate
+
+    def select_by_id(self, account_id: AccountId) -> Account:
+        return self._call(
+            'select_by_id',
+            lambda: self._database.select_by_id(account_id))
+
+    def select_page(
+            self,
+            after_id: AccountId,
+            limit: int,
+            is_open: bool | None = None) -> list[Account]:
+        return self._call(
+            'select_page',
+            lambda: self._database.select_page(after_id, limit, is_open))
+
+    def select_by_name(self, query: str, limit: int) -> list[Account]:
+        return self._call(
+            'select_by_name',
+            lambda: self._database.select_by_name(query, limit))
+
+    def account_id_bounds(self) -> tuple[AccountId, AccountId] | None:
+        return self._call(
+            'account_id_bounds',
+            lambda: self._database.account_id_bounds())
+
+    def insert(self, a: Account) -> Account:
+        return self._call('insert', lambda: self._database.insert(a))
+
+    def insert_many(self, accounts: list[Account]) -> list[Account]:
+        return self._call('insert_many', lambda: self._database.insert_many(accounts))
+
+    def update_closed_at(self, account_id: AccountId, closed_at: datetime) -> None:
+        return self._call(
+            'update_closed_at',
+            lambda: self._database.update_closed_at(account_id, closed_at))
+
+    def update_name(self, account_id: AccountId, full_name: str) -> int:
+        return self._call(
+            'update_name',
+            lambda: self._database.update_name(account_id, full_name))
+
+    def update_balance(self, account_id: AccountId, balance: USD) -> int:
+        return self._call(
+            'update_balance',
+            lambda: self._database.update_balance(account_id, balance))
+
+    def insert_withdrawals(self, withdrawals: list[Withdrawal]) -> None:
+        return self._call(
+            'insert_withdrawals',
+            lambda: self._database.insert_withdrawals(withdrawals))
+
+    def select_withdrawals_since(self, since: datetime) -> list[Withdrawal]:
+        return self._call(
+            'select_withdrawals_since',
+            lambda: self._database.select_withdrawals_since(since))
+
+    def purge_withdrawals_before(self, before: datetime, limit: int) -> int:
+        return self._call(
+            'purge_withdrawals_before',
+            lambda: self._database.purge_withdrawals_before(before, limit))
+
+    def mark_applied(
+            self,
+            request_id: str,
+            refused: str | None,
+            applied_at: datetime) -> bool:
+        return self._call(
+            'mark_applied',
+            lambda: self._database.mark_applied(request_id, refused, applied_at))
+
+    def unmark_applied(self, request_id: str) -> None:
+        return self._call(
+            'unmark_applied',
+            lambda: self._database.unmark_applied(request_id))
+
+    def purge_applied_before(self, before: datetime, limit: int) -> int:
+        return self._call(
+            'purge_applied_before',
+            lambda: self._database.purge_applied_before(before, limit))
+
+    def start_serializable_transaction(self) -> None:
+        self._transaction_started = self._now()
+        self._call(
+            'start_serializable_transaction',
+            self._database.start_serializable_transaction)
+
+    def start_read_only_transaction(self) -> None:
+        self._transaction_started = self._now()
+        self._call(
+            'start_read_only_transaction',
+            self._database.start_read_only_transaction)
+
+    def commit_transaction(self) -> None:
+        self._call('commit_transaction', self._database.commit_transaction)
+        if self._transaction_started is not None:
+            self.timings.record('transaction', self._now() - self._transaction_started)
+            self._transaction_started = None
+
+    def rollback_transaction(self) -> None:
+        self._transaction_started = None
+        self._call('rollback_transaction', self._database.rollback_transaction)
+
+class WorkloadResult:
+    '''
+    what `run_workload` measured; `failures` are operations that deadlocked
+    on every attempt, and `errors` those that failed any other way
+    '''
+    def __init__(
+            self,
+            operations: int,
+            retries: int,
+            failures: int,
+            seconds: float,
+            errors: int = 0):
+        self.operations = operations
+        self.retries = retries
+        self.failures = failures
+        self.seconds = seconds
+        self.errors = errors
+
+    @property
+    def throughput(self) -> float:
+        '''operations per second'''
+        return self.operations / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return (
+            f'WorkloadResult(operations={self.operations}, '
+            f'retries={self.retries}, '
+            f'failures={self.failures}, '
+            f'errors={self.errors}, '
+            f'throughput={self.throughput:.1f}/s)')
+
+def run_workload(
+        database_factory: Callable[[], BankDatabase],
+        workers: int,
+        operations: int,
+        accounts: int,
+        max_retries: int = 3,
+        seed: int | None = None) -> WorkloadResult:
+    '''
+    `workers` threads, each with its own database and Bank, each depositing
+    to and then withdrawing from a randomly chosen account `operations`
+    times, retrying an operation that deadlocks up to `max_retries` times;
+    an operation that fails otherwise is counted, and the worker goes on
+    '''
+    with database_factory() as db:
+        ids = [a.id for a in Bank(db, SystemClock()).open_accounts(
+            [f'workload {i}' for i in range(accounts)])]
+
+    lock = Lock()
+    totals = {'operations': 0, 'retries': 0, 'failures': 0, 'errors': 0}
+
+    def work(worker: int):
+        random = Random(None if seed is None else seed + worker)
+        done = {'operations': 0, 'retries': 0, 'failures': 0, 'errors': 0}
+        try:
+            db = database_factory().__enter__()
+        except Exception:
+            ## every operation of the worker fails
+            done['errors'] += 2 * operations
+        else:
+            try:
+                bank = Bank(db, SystemClock())
+                for _ in range(operations):
+                    account_id = random.choice(ids)
+                    for operation in [bank.deposit, bank.withdraw]:
+                        for attempt in range(max_retries + 1):
+                            try:
+                                operation(account_id, USD(1_00))
+                                done['operations'] += 1
+                                break
+                            except InjectedDeadlock:
+                                if attempt == max_retries:
+                                    done['failures'] += 1
+                                else:
+                                    done['retries'] += 1
+                            except Exception:
+                                done['errors'] += 1
+                                break
+            finally:
+                db.__exit__(None, None, None)
+        with lock:
+            for (key, value) in done.items():
+                totals[key] += value
+
+    started = monotonic()
+    threads = [Thread(target=work, args=(i,), name=f'workload-{i}') for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return WorkloadResult(
+        totals['operations'],
+        totals['retries'],
+        totals['failures'],
+        monotonic() - started,
+        totals['errors'])
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='model Bank throughput and latency against a slow, faulty database')
+    parser.add_argument(
+        '--latency-ms',
+        type=float,
+        default=5.0,
+        help='median delay of every database call')
+    parser.add_argument(
+        '--sigma',
+        type=float,
+        default=0.5,
+        help='spread of the (lognormal) delays; 0 for constant delays')
+    parser.add_argument('--deadlock-rate', type=float, default=0.0)
+    parser.add_argument('--commit-stall-rate', type=float, default=0.0)
+    parser.add_argument('--commit-stall-ms', type=float, default=200.0)
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='default 4, or with --mysql one per pooled connection')
+    parser.add_argument(
+        '--operations',
+        type=int,
+        default=100,
+        help='deposit-and-withdraw pairs per worker')
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument(
+        '--mysql',
+        action='store_true',
+        help='add the faults to MySQL, instead of to an in-process database '
+        '(whose transactions never overlap, so contention is the worst case)')
+    args = parser.parse_args()
+
+    if args.mysql:
+        from database import POOL_SIZE, BankMySqlDatabase
+        backend = BankMySqlDatabase
+        workers = args.workers or POOL_SIZE
+    else:
+        from memory import BankMemoryDatabase
+        shared = BankMemoryDatabase()
+        backend = lambda: shared
+        workers = args.workers or 4
+
+    median = timedelta(milliseconds=args.latency_ms)
+    latency = lognormal(median, args.sigma) if args.sigma > 0 else constant(median)
+    timings = Timings()
+    seeds = count(args.seed or 0)
+    database_factory = lambda: FaultInjectingDatabase(
+        backend(),
+        default_latency=latency,
+        deadlock_rate=args.deadlock_rate,
+        commit_stall_rate=args.commit_stall_rate,
+        commit_stall=constant(timedelta(milliseconds=args.commit_stall_ms)),
+        timings=timings,
+        seed=None if args.seed is None else next(seeds))
+
+    result = run_workload(
+        database_factory,
+        workers,
+        args.operations,
+        args.accounts,
+        seed=args.seed)
+
+    print(result)
+    for name in timings.names():
+        print(
+            f'{name:32} n={timings.count(name):<6} '
+            f'mean={timings.mean(name).total_seconds() * 1000:8.2f}ms '
+            f'p50={timings.percentile(name, 0.5).total_seconds() * 1000:8.2f}ms '
+            f'p99={timings.percentile(name, 0.99).total_seconds() * 1000:8.2f}ms')
+
+if __name__ == '__main__':
+    main()
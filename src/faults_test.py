@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta, timezone
+import unittest
+
+from domain import *
+from memory import BankMemoryDatabase
+from faults import *
+from velocity import VelocityLimit, VelocityTracker
+
+class FakeTime:
+    '''a clock that only advances when slept on'''
+    def __init__(self):
+        self.seconds = 0.0
+
+    def now(self) -> float:
+        return self.seconds
+
+    def sleep(self, seconds: float):
+        self.seconds += seconds
+
+class TestTimings(unittest.TestCase):
+    def test_percentile(self):
+        ## Arrange
+        timings = Timings()
+        for i in range(1, 101):
+            timings.record('select_by_id', i / 1000)
+
+        ## Act & Assert
+        self.assertEqual(timedelta(milliseconds=50), timings.percentile('select_by_id', 0.5))
+        self.assertEqual(timedelta(milliseconds=99), timings.percentile('select_by_id', 0.99))
+        self.assertEqual(timedelta(milliseconds=100), timings.percentile('select_by_id', 1))
+        self.assertEqual(timedelta(0), timings.percentile('insert', 0.5))
+        self.assertEqual(100, timings.count('select_by_id'))
+
+class TestFaultInjectingDatabase(unittest.TestCase):
+    def setUp(self):
+        self.time = FakeTime()
+        self.inner = BankMemoryDatabase()
+        self.frank = self.inner.insert(Account(None, 'Frank the Cat', USD(10_00), None))
+
+    def database(self, **faults) -> FaultInjectingDatabase:
+        return FaultInjectingDatabase(
+            self.inner,
+            sleep=self.time.sleep,
+            now=self.time.now,
+            seed=1,
+            **faults)
+
+    def test_latency_per_method(self):
+        ## Arrange
+        db = self.database(
+            latencies={'select_by_id': constant(timedelta(milliseconds=5))},
+            default_latency=constant(timedelta(milliseconds=1)))
+        bank = Bank(db, SystemClock())
+
+        ## Act
+        bank.deposit(self.frank.id, USD(1_00))
+
+        ## Assert
+        self.assertEqual(USD(11_00), self.inner.select_by_id(self.frank.id).balance)
+        self.assertAlmostEqual(0.005, db.timings.mean('select_by_id').total_seconds())
+        self.assertAlmostEqual(0.001, db.timings.mean('update_balance').total_seconds())
+        ## start, select, update and commit
+        self.assertAlmostEqual(0.008, db.timings.mean('transaction').total_seconds())
+
+    def test_deadlock_rolls_back(self):
+        ## Arrange
+        db = self.database(deadlock_rate=1.0)
+        bank = Bank(db, SystemClock())
+
+        ## Act
+        with self.assertRaises(InjectedDeadlock) as raised:
+            bank.deposit(self.frank.id, USD(1_00))
+
+        ## Assert
+        self.assertEqual(DEADLOCK_ERRNO, raised.exception.errno)
+        self.assertEqual(1, db.deadlocks)
+        self.assertEqual(1, db.timings.count('rollback_transaction'))
+        self.assertEqual(0, db.timings.count('transaction'))
+        self.assertEqual(USD(10_00), self.inner.select_by_id(self.frank.id).balance)
+
+    def test_commit_stall(self):
+        ## Arrange
+        db = self.database(
+            commit_stall_rate=1.0,
+            commit_stall=constant(timedelta(seconds=2)))
+
+        ## Act
+        Bank(db, SystemClock()).deposit(self.frank.id, USD(1_00))
+
+        ## Assert
+        self.assertEqual(1, db.commit_stalls)
+        self.assertAlmostEqual(2.0, db.timings.percentile('transaction', 1).total_seconds())
+
+    def test_logs_passed_through(self):
+        ## Arrange
+        db = self.database(latencies={'insert_withdrawals': constant(timedelta(milliseconds=3))})
+        velocity = VelocityTracker([VelocityLimit(USD(5_00), timedelta(hours=24))])
+        bank = Bank(db, SystemClock(), velocity=velocity)
+
+        ## Act
+        bank.withdraw(self.frank.id, USD(1_00))
+
+        ## Assert
+        (logged,) = self.inner.select_withdrawals_since(datetime.min.replace(tzinfo=timezone.utc))
+        self.assertEqual((self.frank.id, USD(1_00)), logged[:2])
+        self.assertAlmostEqual(0.003, db.timings.mean('insert_withdrawals').total_seconds())
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            self.database(latencies={'select_everything': constant(timedelta(0))})
+
+    def test_lognormal_median(self):
+        ## Arrange
+        latency = lognormal(timedelta(milliseconds=5), 0.5)
+        random = Random(1)
+
+        ## Act
+        samples = sorted(latency(random) for _ in range(2001))
+
+        ## Assert
+        self.assertAlmostEqual(0.005, samples[1000], delta=0.0005)
+
+class TestRunWorkload(unittest.TestCase):
+    def test_retries_deadlocks(self):
+        ## Arrange
+        shared = BankMemoryDatabase()
+        timings = Timings()
+        database_factory = lambda: FaultInjectingDatabase(
+            shared,
+            deadlock_rate=0.05,
+            timings=timings,
+            seed=7)
+
+        ## Act
+        result = run_workload(database_factory, 2, 20, 5, max_retries=10, seed=7)
+
+        ## Assert
+        self.assertEqual(80, result.operations)
+        self.assertEqual(0, result.failures)
+        self.assertGreater(result.retries, 0)
+        self.assertEqual(
+            [USD(0)] * 5,
+            [a.balance for a in shared.select_page(0, 5)])
+
+    def test_counts_other_errors(self):
+        ## Arrange
+        shared = BankMemoryDatabase()
+        original = shared.update_balance
+        calls = []
+        def fail_every_third(account_id, balance):
+            calls.append(1)
+            if len(calls) % 3 == 0:
+                raise ConnectionError('connection lost')
+            return original(account_id, balance)
+        shared.update_balance = fail_every_third
+
+        ## Act
+        result = run_workload(lambda: shared, 2, 15, 5, seed=7)
+
+        ## Assert
+        self.assertEqual(60, result.operations + result.errors)
+        self.assertGreater(result.errors, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+'''
+Coalesces concurrent deposits, withdrawals and other changes from many
+threads into shared transactions, e.g.
+
+    with GroupCommitBank(bank, window=timedelta(milliseconds=2)) as group:
+        group.deposit(12, USD(1_00))    # from any number of threads
+
+One commit then carries many operations, so throughput is no longer limited
+by one commit per operation, at the cost of up to `window` more latency
+each.  Statistics on batch sizes and waits come from `stats()`.
+'''
+from concurrent.futures import Future
+from datetime import timedelta
+from threading import Condition, Lock, Thread
+from time import monotonic
+
+from domain import USD, Account, AccountChange, AccountId, Bank
+
+class GroupCommitStats:
+    '''what group commit has done so far'''
+    def __init__(
+            self,
+            batches: int,
+            operations: int,
+            max_batch_size: int,
+            total_wait_seconds: float,
+            max_wait_seconds: float):
+        self.batches = batches
+        self.operations = operations
+        self.max_batch_size = max_batch_size
+        self.total_wait_seconds = total_wait_seconds
+        self.max_wait_seconds = max_wait_seconds
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.operations / self.batches if self.batches else 0.0
+
+    @property
+    def mean_wait(self) -> timedelta:
+        '''how long an operation waited, on average, for its batch to start'''
+        if not self.operations:
+            return timedelta(0)
+        return timedelta(seconds=self.total_wait_seconds / self.operations)
+
+    @property
+    def max_wait(self) -> timedelta:
+        return timedelta(seconds=self.max_wait_seconds)
+
+    def __repr__(self):
+        return (
+            f'GroupCommitStats(batches={self.batches}, '
+            f'operations={self.operations}, '
+            f'mean_batch_size={self.mean_batch_size:.1f}, '
+            f'max_batch_size={self.max_batch_size}, '
+            f'mean_wait={self.mean_wait}, '
+            f'max_wait={self.max_wait})')
+
+class _Request:
+    def __init__(self, name: str, args: tuple, account_id: AccountId):
+        self.name = name
+        self.args = args
+        self.account_id = account_id
+        self.future = Future()
+        self.submitted_at = monotonic()
+
+class GroupCommitBank:
+    '''
+    Coalesces concurrent Bank mutations into shared transactions.
+
+    Each call blocks its caller.  The first call to arrive opens a window of
+    `window`; every call that arrives within it (up to `max_batch`) is
+    applied in the same transaction, in account ID order, and answered when
+    it commits.  A call that breaks a business rule, such as withdrawing more
+    than the balance, fails alone while the rest commit.
+
+    Every operation runs on one thread with `bank`'s single connection.
+    '''
+    def __init__(
+            self,
+            bank: Bank,
+            window: timedelta = timedelta(milliseconds=2),
+            max_batch: int = 100):
+        if max_batch <= 0:
+            raise ValueError(f'max_batch must be positive (it was {max_batch})')
+
+        self._bank = bank
+        self._window = window.total_seconds()
+        self._max_batch = max_batch
+        self._pending: list[_Request] = []
+        self._condition = Condition()
+        self._closed = False
+
+        self._stats_lock = Lock()
+        self._batches = 0
+        self._operations = 0
+        self._max_batch_size = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+        self._committer = Thread(
+            target=self._commit_batches,
+            name='group-commit',
+            daemon=True)
+        self._committer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _exc_type, _exc_value, _traceback):
+        self.close()
+
+    def open_account(self, full_name: str) -> Account:
+        return self._call('open_account', (full_name,), 0)
+
+    def close_account(self, account_id: AccountId) -> AccountChange:
+        return self._call('close_account', (account_id,), account_id)
+
+    def alter_name(self, account_id: AccountId, full_name: str) -> AccountChange:
+        return self._call('alter_name', (account_id, full_name), account_id)
+
+    def deposit(self, account_id: AccountId, amount: USD) -> AccountChange:
+        return self._call('deposit', (account_id, amount), account_id)
+
+    def withdraw(self, account_id: AccountId, amount: USD) -> AccountChange:
+        return self._call('withdraw', (account_id, amount), account_id)
+
+    def stats(self) -> GroupCommitStats:
+        with self._stats_lock:
+            return GroupCommitStats(
+                self._batches,
+                self._operations,
+                self._max_batch_size,
+                self._total_wait,
+                self._max_wait)
+
+    def close(self):
+        '''finish every call already made, then stop'''
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._committer.join()
+
+    def _call(self, name: str, args: tuple, account_id: AccountId):
+        request = _Request(name, args, account_id)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('group commit is closed')
+            self._pending.append(request)
+            self._condition.notify()
+        return request.future.result()
+
+    def _next_batch(self) -> list[_Request]:
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+
+            deadline = self._pending[0].submitted_at + self._window \
+                if self._pending else 0
+            while len(self._pending) < self._max_batch and not self._closed:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch = self._pending[:self._max_batch]
+            del self._pending[:self._max_batch]
+            return batch
+
+    def _commit_batches(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+
+            started_at = monotonic()
+            self._record(batch, started_at)
+
+            ## a fixed row order keeps concurrent batches from deadlocking;
+            ## the sort is stable, so one account's operations keep their order
+            ordered = sorted(batch, key=lambda r: r.account_id)
+            for (request, outcome) in zip(ordered, self._apply(ordered)):
+                if isinstance(outcome, Exception):
+                    request.future.set_exception(outcome)
+                else:
+                    request.future.set_result(outcome)
+
+    def _apply(self, ordered: list[_Request]) -> list:
+        operations = [(r.name, r.args) for r in ordered]
+        try:
+            return self._bank.apply_batch(operations)
+        except Exception:
+            ## The shared transaction rolled back; run each operation alone
+            ## so that only the one at fault fails.
+            outcomes = []
+            for operation in operations:
+                try:
+                    outcomes.append(self._bank.apply_batch([operation])[0])
+                except Exception as exc:
+                    outcomes.append(exc)
+            return outcomes
+
+    def _record(self, batch: list[_Request], started_at: float):
+        waits = [started_at - r.submitted_at for r in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._operations += len(batch)
+            self._max_batch_size = max(self._max_batch_size, len(batch))
+            self._total_wait += sum(waits)
+            self._max_wait = max(self._max_wait, *waits)
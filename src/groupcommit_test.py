@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest.mock import MagicMock
+import unittest
+
+from domain import *
+from memory import BankMemoryDatabase
+from groupcommit import *
+
+class TestGroupCommitBank(unittest.TestCase):
+    def test_concurrent_calls_share_transactions(self):
+        ## Arrange
+        db = BankMemoryDatabase()
+        bank = Bank(db, SystemClock())
+        accounts = [bank.open_account(f'Frank {i}') for i in range(10)]
+        group = GroupCommitBank(bank, window=timedelta(milliseconds=20))
+
+        ## Act
+        with ThreadPoolExecutor(max_workers=50) as pool:
+            futures = [
+                pool.submit(group.deposit, a.id, USD(1))
+                for a in accounts for _ in range(5)
+                ]
+            for f in futures:
+                f.result()
+        group.close()
+
+        ## Assert
+        stats = group.stats()
+        self.assertEqual(50, stats.operations)
+        self.assertLess(stats.batches, 50)
+        self.assertGreater(stats.mean_batch_size, 1)
+        self.assertGreater(stats.max_wait, timedelta(0))
+        for a in accounts:
+            self.assertEqual(USD(5), db.select_by_id(a.id).balance)
+
+    def test_rule_violation_fails_alone(self):
+        ## Arrange
+        db = BankMemoryDatabase()
+        bank = Bank(db, SystemClock())
+        frank = bank.open_account('Frank')
+        felix = bank.open_account('Felix')
+        bank.deposit(frank.id, USD(1_00))
+        group = GroupCommitBank(bank, window=timedelta(milliseconds=50))
+
+        ## Act
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            ## one account each, so either order gives the same outcome
+            overdraft = pool.submit(group.withdraw, felix.id, USD(1))
+            withdrawal = pool.submit(group.withdraw, frank.id, USD(25))
+
+            ## Assert
+            with self.assertRaises(ValueError):
+                overdraft.result()
+            self.assertEqual(USD(75), withdrawal.result().after.balance)
+
+        ## the overdraft changed nothing, and did not stop the group
+        self.assertEqual(USD(2), group.deposit(felix.id, USD(2)).after.balance)
+        group.close()
+
+    def test_deterministic_row_order(self):
+        ## Arrange
+        bank = MagicMock(Bank)
+        bank.apply_batch.side_effect = lambda ops: [None] * len(ops)
+        group = GroupCommitBank(bank, window=timedelta(milliseconds=50))
+
+        ## Act
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            for account_id in [3, 1, 2]:
+                pool.submit(group.close_account, account_id)
+        group.close()
+
+        ## Assert
+        batches = [c.args[0] for c in bank.apply_batch.call_args_list]
+        for batch in batches:
+            ids = [args[0] for (_, args) in batch]
+            self.assertEqual(sorted(ids), ids)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,285 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+from queue import SimpleQueue
+from time import monotonic
 from tkinter import Frame, StringVar, Toplevel, Widget, ttk, Tk
-from typing import Callable
+from typing import Any, Callable
 
 import domain
+from events import COALESCE, EventBus
+from outbox import DEPOSIT, WITHDRAW, Outbox, OutboxEntry, apply
 
+## how often the Tk thread checks on a pending Bank call
+_POLL_INTERVAL_MS = 50
 
-class OpenAccount(Toplevel):
-    def __init__(self, parent: Widget, bank: domain.Bank):
+## how often a window checks for account events it subscribed to
+_EVENT_POLL_INTERVAL_MS = 250
+
+## events a window holds between checks; each account needs only its latest
+_EVENT_QUEUE_SIZE = 1000
+
+## how long a window waits for a Bank call before giving up on it
+_BANK_CALL_TIMEOUT = timedelta(seconds=30)
+
+## how long a deposit or withdrawal waits for the Bank before it is accepted
+## into the outbox instead; the teller should not wait long for that
+_OUTBOX_FALLBACK_TIMEOUT = timedelta(seconds=3)
+
+## how often the main window shows the outbox's depth, replay lag and refusals
+_OUTBOX_POLL_INTERVAL_MS = 1000
+
+## refused outbox requests the main window keeps showing, latest last
+_REFUSALS_SHOWN = 5
+
+class OutcomeUnknown(TimeoutError):
+    '''a Bank call ran too long to wait for; it may yet succeed or fail'''
+
+class BackgroundTasks:
+    '''
+    Runs Bank calls on a worker thread so that the Tk mainloop never blocks on
+    the database.  Results are delivered back on the Tk thread by polling with
+    `after()`.
+
+    There is exactly one worker by default because a Bank shares a single
+    database connection, which may not be used by two threads at once.
+    '''
+    def __init__(self, root: Tk, max_workers: int = 1):
+        self._root = root
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='bank')
+
+    def submit(
+            self,
+            work: Callable[[], Any],
+            on_done: Callable[[Any], None],
+            on_error: Callable[[Exception], None],
+            timeout: timedelta = _BANK_CALL_TIMEOUT,
+            on_late: Callable[[Any, Exception | None], None] | None = None) -> Future:
+        '''
+        Run `work()` on the worker thread, then call exactly one of
+        `on_done(result)` or `on_error(exception)` on the Tk thread.
+
+        When `timeout` elapses first, a call still queued is dropped and
+        reported as a TimeoutError.  A call already running cannot be
+        interrupted and may still commit, so it is reported as OutcomeUnknown
+        instead; once it does finish, `on_late(result, exception)` is called
+        with how it turned out.
+        '''
+        future = self._executor.submit(work)
+        deadline = monotonic() + timeout.total_seconds()
+        waited = f'no response after {timeout.total_seconds():g} seconds'
+
+        def poll():
+            if future.done():
+                exc = future.exception()
+                if exc is None:
+                    on_done(future.result())
+                else:
+                    on_error(exc)
+            elif monotonic() >= deadline:
+                if future.cancel():
+                    on_error(TimeoutError(f'{waited}; not run'))
+                else:
+                    on_error(OutcomeUnknown(f'{waited}; it may still succeed'))
+                    self._root.after(_POLL_INTERVAL_MS, poll_late)
+            else:
+                self._root.after(_POLL_INTERVAL_MS, poll)
+
+        def poll_late():
+            if not future.done():
+                self._root.after(_POLL_INTERVAL_MS, poll_late)
+            elif on_late:
+                exc = future.exception()
+                on_late(None if exc else future.result(), exc)
+
+        self._root.after(_POLL_INTERVAL_MS, poll)
+        return future
+
+    def shutdown(self):
+        '''
+        abandon queued work and wait for a call in progress, which cannot be
+        interrupted, so that the connection it uses may then be closed
+        '''
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+def accepted_message(entry: OutboxEntry) -> str:
+    return (
+        f'{entry.operation.capitalize()} of {entry.amount} for account '
+        f'{entry.account_id} accepted as request {entry.request_id}; the '
+        f'database did not answer, so it will be applied when it does.')
+
+def queued_message(entry: OutboxEntry) -> str:
+    return (
+        f'{entry.operation.capitalize()} of {entry.amount} for account '
+        f'{entry.account_id} accepted as request {entry.request_id}; it will '
+        f'be applied after the account\'s earlier requests, which are waiting '
+        f'for the database.')
+
+def refused_message(entry: OutboxEntry, reason: str) -> str:
+    return (
+        f'REFUSED {entry.operation} of {entry.amount} for account '
+        f'{entry.account_id} (request {entry.request_id}, accepted '
+        f'{entry.accepted_at:%H:%M:%S}): {reason}')
+
+class BankWindow(Toplevel):
+    '''a window whose button sends a single request to the Bank'''
+    button: ttk.Button
+    message: StringVar
+
+    def __init__(self, parent: Widget, bank: domain.Bank, tasks: BackgroundTasks):
         super().__init__(parent)
         self.parent = parent
         self.bank = bank
+        self.tasks = tasks
+        self.progress = ttk.Progressbar(self, mode='indeterminate')
+        self.subscription = None
+        self.subscription_poll = None
+        self.bind('<Destroy>', self.on_destroy)
+
+    def on_destroy(self, event):
+        ## <Destroy> also arrives for each of the window's widgets
+        if event.widget is self:
+            self.unwatch()
+
+    def watch(
+            self,
+            events: EventBus,
+            account_id: domain.AccountId | None,
+            on_events: Callable[[list[domain.AccountEvent]], None]):
+        '''
+        Call `on_events(events)` on the Tk thread with committed events for
+        `account_id` (or for every account, when None) until the window
+        closes or `unwatch()` is called.  The events come from the Bank, so
+        watching adds no database reads.
+        '''
+        self.unwatch()
+        subscription = events.subscribe(
+            _EVENT_QUEUE_SIZE,
+            COALESCE,
+            account_id)
+
+        def poll():
+            pending = subscription.drain()
+            if pending:
+                on_events(pending)
+            self.subscription_poll = self.after(_EVENT_POLL_INTERVAL_MS, poll)
+
+        self.subscription = subscription
+        self.subscription_poll = self.after(_EVENT_POLL_INTERVAL_MS, poll)
+
+    def unwatch(self):
+        if self.subscription_poll is not None:
+            self.after_cancel(self.subscription_poll)
+            self.subscription_poll = None
+        if self.subscription is not None:
+            self.subscription.close()
+            self.subscription = None
+
+    def run_in_background(
+            self,
+            work: Callable[[], Any],
+            on_done: Callable[[Any], None],
+            on_error: Callable[[Exception], None] | None = None,
+            timeout: timedelta = _BANK_CALL_TIMEOUT):
+        '''
+        Disable the button and show progress while `work()` runs on the
+        worker thread; `on_done(result)` (or `on_error(exception)`) runs on the
+        Tk thread afterward.  A call that outlasts `timeout` is shown as
+        unknown, and its result, if it comes, is shown after all.
+        '''
+        self.button.state(['disabled'])
+        self.message.set('working...')
+        self.progress.pack(fill='x')
+        self.progress.start()
+
+        def finished():
+            ## the user may have closed the window while waiting
+            if not self.winfo_exists():
+                return False
+            self.progress.stop()
+            self.progress.pack_forget()
+            self.button.state(['!disabled'])
+            return True
+
+        def done(result):
+            if finished():
+                on_done(result)
+
+        def error(exc: Exception):
+            if finished():
+                if isinstance(exc, OutcomeUnknown):
+                    self.message.set(f'UNKNOWN {exc}')
+                else:
+                    self.message.set(f'ERROR {exc}')
+                if on_error:
+                    on_error(exc)
+
+        def late(result, exc: Exception | None):
+            if not self.winfo_exists():
+                return
+            if exc is None:
+                on_done(result)
+            else:
+                self.message.set(f'ERROR {exc}')
+
+        self.tasks.submit(work, done, error, timeout, late)
+
+    def run_or_accept(
+            self,
+            outbox: Outbox,
+            operation: str,
+            account_id: domain.AccountId,
+            amount: domain.USD,
+            on_done: Callable[[domain.AccountChange], None]):
+        '''
+        Run the deposit or withdrawal against the Bank in the background; if
+        it fails other than by breaking a business rule, e.g. the database is
+        down or the call times out, accept it into `outbox` instead, under
+        the same request ID, so that it is applied once either way.
+
+        While earlier requests for the account wait in `outbox`, the new one
+        is accepted there at once, behind them, so that the account's
+        requests are applied in the order they were made.
+        '''
+        try:
+            entry = outbox.request(operation, account_id, amount)
+        except ValueError as exc:
+            self.message.set(f'ERROR {exc}')
+            return
+
+        def accept(message: str):
+            try:
+                outbox.accept(entry)
+            except ValueError as refused:
+                self.message.set(f'ERROR {refused}')
+                return
+            self.message.set(message)
+
+        def error(exc: Exception):
+            if isinstance(exc, ValueError):
+                ## refused by the Bank; already shown
+                return
+            accept(accepted_message(entry))
+
+        if outbox.is_waiting(account_id):
+            accept(queued_message(entry))
+            return
+
+        self.run_in_background(
+            lambda: apply(self.bank, entry),
+            on_done,
+            error,
+            _OUTBOX_FALLBACK_TIMEOUT)
+
+class OpenAccount(BankWindow):
+    def __init__(
+            self,
+            parent: Widget,
+            bank: domain.Bank,
+            tasks: BackgroundTasks):
+        super().__init__(parent, bank, tasks)
 
         ttk.Label(
             self,
@@ -28,11 +299,11 @@ class OpenAccount(Toplevel):
             textvariable=self.full_name,
             ).grid(row=0, column=1)
 
-        ttk.Button(
+        self.button = ttk.Button(
             self,
             text='Create',
-            command=self.on_click,
-            ).pack()
+            command=self.on_click)
+        self.button.pack()
         self.message = StringVar()
         self.message.set('')
         ttk.Label(
@@ -41,17 +312,22 @@ class OpenAccount(Toplevel):
             ).pack(fill='both')
 
     def on_click(self):
-        try:
-            account = self.bank.open_account(self.full_name.get())
+        full_name = self.full_name.get()
+
+        def done(account: domain.Account):
             self.message.set(f'opened account ID {account.id}')
-        except Exception as exc:
-            self.message.set(f'ERROR {exc}')
 
-class ModifyAccount(Toplevel):
-    def __init__(self, parent: Widget, bank: domain.Bank):
-        super().__init__(parent)
-        self.parent = parent
-        self.bank = bank
+        self.run_in_background(
+            lambda: self.bank.open_account(full_name),
+            done)
+
+class ModifyAccount(BankWindow):
+    def __init__(
+            self,
+            parent: Widget,
+            bank: domain.Bank,
+            tasks: BackgroundTasks):
+        super().__init__(parent, bank, tasks)
 
         ttk.Label(
             self,
@@ -81,11 +357,11 @@ class ModifyAccount(Toplevel):
             textvariable=self.full_name,
             ).grid(row=1, column=1)
 
-        ttk.Button(
+        self.button = ttk.Button(
             self,
             text='Modify',
-            command=self.on_click,
-            ).pack(side='top')
+            command=self.on_click)
+        self.button.pack(side='top')
 
         self.message = StringVar()
         self.message.set('')
@@ -97,18 +373,27 @@ class ModifyAccount(Toplevel):
     def on_click(self):
         try:
             account_id = int(self.account_id.get())
-            account = self.bank.alter_name(account_id, self.full_name.get())
-            self.message.set(
-                f'Account holder name for {account_id} '
-                f'changed to {account.full_name}.')
         except Exception as exc:
             self.message.set(f'ERROR {exc}')
+            return
+        full_name = self.full_name.get()
 
-class CloseAccount(Toplevel):
-    def __init__(self, parent: Widget, bank: domain.Bank):
-        super().__init__(parent)
-        self.parent = parent
-        self.bank = bank
+        def done(change: domain.AccountChange):
+            self.message.set(
+                f'Account holder name for {account_id} '
+                f'changed to {change.after.full_name}.')
+
+        self.run_in_background(
+            lambda: self.bank.alter_name(account_id, full_name),
+            done)
+
+class CloseAccount(BankWindow):
+    def __init__(
+            self,
+            parent: Widget,
+            bank: domain.Bank,
+            tasks: BackgroundTasks):
+        super().__init__(parent, bank, tasks)
 
         ttk.Label(
             self,
@@ -128,11 +413,11 @@ class CloseAccount(Toplevel):
             textvariable=self.account_id,
             ).grid(row=0, column=1)
 
-        ttk.Button(
+        self.button = ttk.Button(
             self,
             text='Close',
-            command=self.on_click,
-            ).pack(side='top')
+            command=self.on_click)
+        self.button.pack(side='top')
 
         self.message = StringVar()
         self.message.set('')
@@ -144,16 +429,34 @@ class CloseAccount(Toplevel):
     def on_click(self):
         try:
             account_id = int(self.account_id.get())
-            account = self.bank.close_account(account_id)
-            self.message.set(f'Account {account_id} closed at {account.closed_at}')
         except Exception as exc:
             self.message.set(f'ERROR {exc}')
+            return
 
-class ViewBalance(Toplevel):
-    def __init__(self, parent: Widget, bank: domain.Bank):
-        super().__init__(parent)
-        self.parent = parent
-        self.bank = bank
+        def done(change: domain.AccountChange):
+            self.message.set(
+                f'Account {account_id} closed at {change.after.closed_at}')
+
+        self.run_in_background(
+            lambda: self.bank.close_account(account_id),
+            done)
+
+class ViewBalance(BankWindow):
+    '''
+    Looks up an account; given `events`, keeps showing its balance as it
+    changes.
+    '''
+    def __init__(
+            self,
+            parent: Widget,
+            bank: domain.Bank,
+            tasks: BackgroundTasks,
+            events: EventBus | None = None):
+        super().__init__(parent, bank, tasks)
+        self.events = events
+        ## the account as loaded, and the events that arrived before it was
+        self.loaded: domain.Account | None = None
+        self.early: list[domain.AccountEvent] = []
 
         ttk.Label(
             self,
@@ -173,11 +476,11 @@ class ViewBalance(Toplevel):
             textvariable=self.account_id,
             ).grid(row=0, column=1)
 
-        ttk.Button(
+        self.button = ttk.Button(
             self,
             text='Look Up',
-            command=self.on_click,
-            ).pack(side='top')
+            command=self.on_click)
+        self.button.pack(side='top')
 
         self.message = StringVar()
         self.message.set('')
@@ -189,19 +492,72 @@ class ViewBalance(Toplevel):
     def on_click(self):
         try:
             account_id = int(self.account_id.get())
-            account = self.bank.load(account_id)
-            open_or_closed = 'open' if account.is_open else 'closed'
-            self.message.set(
-                f'{open_or_closed} account {account_id} '
-                f'balance is {account.balance}')
         except Exception as exc:
             self.message.set(f'ERROR {exc}')
+            return
 
-class Deposit(Toplevel):
-    def __init__(self, parent: Widget, bank: domain.Bank):
-        super().__init__(parent)
-        self.parent = parent
-        self.bank = bank
+        self.unwatch()
+        self.loaded = None
+        self.early = []
+        if self.events:
+            ## subscribe before loading, so that no change committed after the
+            ## load is missed
+            self.watch(self.events, account_id, self.on_events)
+        self.load(account_id)
+
+    def load(self, account_id: domain.AccountId):
+        self.run_in_background(
+            lambda: self.bank.load(account_id),
+            lambda account: self.on_loaded(account_id, account))
+
+    def on_events(self, events: list[domain.AccountEvent]):
+        if self.loaded is None:
+            ## perhaps older than what the load will return
+            self.early.extend(events)
+        else:
+            self.show(events[-1].account)
+
+    def on_loaded(self, account_id: domain.AccountId, account: domain.Account | None):
+        early = self.early
+        self.early = []
+        if account is None:
+            ## nothing to watch
+            self.unwatch()
+            self.message.set(f'ERROR no account {account_id}')
+            return
+
+        self.show(account)
+        if not early or _same_state(early[-1].account, account):
+            self.loaded = account
+        elif (isinstance(early[-1], domain.AccountChangeEvent)
+                and _same_state(early[-1].before, account)):
+            ## committed just after the load read the account
+            self.loaded = account
+            self.show(early[-1].account)
+        else:
+            ## Committed either before the load, or after it with the changes
+            ## in between coalesced away; only another load can tell.
+            self.load(account_id)
+
+    def show(self, account: domain.Account):
+        open_or_closed = 'open' if account.is_open else 'closed'
+        self.message.set(
+            f'{open_or_closed} account {account.id} '
+            f'balance is {account.balance}')
+
+def _same_state(a: domain.Account, b: domain.Account) -> bool:
+    return (a.full_name, a.balance, a.closed_at) == (b.full_name, b.balance, b.closed_at)
+
+class Deposit(BankWindow):
+    def __init__(
+            self,
+            parent: Widget,
+            bank: domain.Bank,
+            tasks: BackgroundTasks,
+            outbox: Outbox | None = None):
+        '''given `outbox`, accepts the deposit there when the Bank does not answer'''
+        super().__init__(parent, bank, tasks)
+        self.outbox = outbox
 
         ttk.Label(
             self,
@@ -231,11 +587,11 @@ class Deposit(Toplevel):
             textvariable=self.amount_var,
             ).grid(row=1, column=1)
 
-        ttk.Button(
+        self.button = ttk.Button(
             self,
             text='Deposit',
-            command=self.on_click,
-            ).pack(side='top')
+            command=self.on_click)
+        self.button.pack(side='top')
 
         self.message = StringVar()
         self.message.set('')
@@ -248,21 +604,33 @@ class Deposit(Toplevel):
         try:
             account_id = int(self.account_id.get())
             amount = domain.USD.parse(self.amount_var.get())
-
-            before = self.bank.load(account_id)
-            after = self.bank.deposit(account_id, amount)
-
-            self.message.set(
-                f'Account {account_id} balance was {before.balance};'
-                f'is now {after.balance}.')
         except Exception as exc:
             self.message.set(f'ERROR {exc}')
+            return
 
-class Withdraw(Toplevel):
-    def __init__(self, parent: Widget, bank: domain.Bank):
-        super().__init__(parent)
-        self.parent = parent
-        self.bank = bank
+        def done(change: domain.AccountChange):
+            self.message.set(
+                f'Account {account_id} balance was {change.before.balance}; '
+                f'is now {change.after.balance}.')
+
+        if self.outbox:
+            self.run_or_accept(self.outbox, DEPOSIT, account_id, amount, done)
+            return
+
+        self.run_in_background(
+            lambda: self.bank.deposit(account_id, amount),
+            done)
+
+class Withdraw(BankWindow):
+    def __init__(
+            self,
+            parent: Widget,
+            bank: domain.Bank,
+            tasks: BackgroundTasks,
+            outbox: Outbox | None = None):
+        '''given `outbox`, accepts the withdrawal there when the Bank does not answer'''
+        super().__init__(parent, bank, tasks)
+        self.outbox = outbox
 
         ttk.Label(
             self,
@@ -292,11 +660,11 @@ class Withdraw(Toplevel):
             textvariable=self.amount_var,
             ).grid(row=1, column=1)
 
-        ttk.Button(
+        self.button = ttk.Button(
             self,
             text='Withdraw',
-            command=self.on_click,
-            ).pack(side='top')
+            command=self.on_click)
+        self.button.pack(side='top')
 
         self.message = StringVar()
         self.message.set('')
@@ -309,25 +677,323 @@ class Withdraw(Toplevel):
         try:
             account_id = int(self.account_id.get())
             amount = domain.USD.parse(self.amount_var.get())
-
-            before = self.bank.load(account_id)
-            after = self.bank.withdraw(account_id, amount)
-
-            self.message.set(
-                f'Account {account_id} balance was {before.balance};'
-                f'is now {after.balance}.')
         except Exception as exc:
             self.message.set(f'ERROR {exc}')
+            return
+
+        def done(change: domain.AccountChange):
+            self.message.set(
+                f'Account {account_id} balance was {change.before.balance}; '
+                f'is now {change.after.balance}.')
+
+        if self.outbox:
+            self.run_or_accept(self.outbox, WITHDRAW, account_id, amount, done)
+            return
+
+        self.run_in_background(
+            lambda: self.bank.withdraw(account_id, amount),
+            done)
+
+def account_tree(parent: Widget) -> tuple[ttk.Treeview, ttk.Scrollbar]:
+    '''a scrollable, packed table of accounts, one per row'''
+    tree_frame = Frame(parent)
+    tree_frame.pack(fill='both', expand=True)
+    tree = ttk.Treeview(
+        tree_frame,
+        columns=('id', 'full_name', 'balance', 'status'),
+        show='headings')
+    for (column, heading) in [
+            ('id',          'Account ID'),
+            ('full_name',   'Full Name'),
+            ('balance',     'Balance'),
+            ('status',      'Status'),
+            ]:
+        tree.heading(column, text=heading)
+    scrollbar = ttk.Scrollbar(
+        tree_frame,
+        orient='vertical',
+        command=tree.yview)
+    tree.configure(yscrollcommand=scrollbar.set)
+    tree.pack(side='left', fill='both', expand=True)
+    scrollbar.pack(side='right', fill='y')
+    return (tree, scrollbar)
+
+def account_values(account: domain.Account) -> tuple:
+    '''a row of a table made by `account_tree()`'''
+    return (
+        account.id,
+        account.full_name,
+        str(account.balance),
+        'open' if account.is_open else 'closed',
+        )
+
+def insert_account(
+        tree: ttk.Treeview,
+        account: domain.Account,
+        index: int | str = 'end'):
+    '''add a row, identified by the account ID, to an `account_tree()`'''
+    tree.insert('', index, iid=str(account.id), values=account_values(account))
+
+def update_accounts(tree: ttk.Treeview, events: list[domain.AccountEvent]):
+    '''update the rows of an `account_tree()` showing changed accounts'''
+    for event in events:
+        if tree.exists(str(event.account_id)):
+            tree.item(str(event.account_id), values=account_values(event.account))
+
+class SearchAccounts(BankWindow):
+    _LIMIT = 50
+
+    def __init__(
+            self,
+            parent: Widget,
+            bank: domain.Bank,
+            tasks: BackgroundTasks):
+        super().__init__(parent, bank, tasks)
+
+        ttk.Label(
+            self,
+            text="Find Accounts by Name",
+            ).pack()
+
+        form_grid = Frame(self)
+        form_grid.pack()
+
+        ttk.Label(
+            form_grid,
+            text="Full Name",
+            ).grid(row=0, column=0)
+        self.query = StringVar()
+        entry = ttk.Entry(
+            form_grid,
+            textvariable=self.query)
+        entry.grid(row=0, column=1)
+        entry.bind('<Return>', lambda _event: self.on_click())
+
+        self.button = ttk.Button(
+            self,
+            text='Search',
+            command=self.on_click)
+        self.button.pack(side='top')
+
+        (self.tree, _) = account_tree(self)
+
+        self.message = StringVar()
+        self.message.set('')
+        ttk.Label(
+            self,
+            textvariable=self.message,
+            ).pack(fill='both')
+
+    def on_click(self):
+        if self.button.instate(['disabled']):
+            return
+        query = self.query.get()
+
+        def done(accounts: list[domain.Account]):
+            self.tree.delete(*self.tree.get_children())
+            for account in accounts:
+                insert_account(self.tree, account)
+            self.message.set(f'{len(accounts)} accounts found')
+
+        self.run_in_background(
+            lambda: self.bank.search_by_name(query, SearchAccounts._LIMIT),
+            done)
+
+class AccountBrowser(BankWindow):
+    '''
+    Lists accounts in ID order.  Pages are fetched only as the user scrolls
+    near the bottom of the list, so opening the window costs one small query
+    no matter how many accounts exist.  Only a few pages are kept; a page
+    scrolled far out of view is dropped, and fetched again when the user
+    scrolls back to it.  Given `events`, rows listed are updated in place as
+    their accounts change.
+    '''
+    _PAGE_SIZE = 100
+
+    ## pages kept in the list at once
+    _MAX_PAGES = 5
+
+    ## fetch another page once the bottom (or top) of the view passes this
+    ## fraction of the way to the end of the list
+    _FETCH_THRESHOLD = 0.9
+
+    _FILTERS = {
+        'All':      None,
+        'Open':     True,
+        'Closed':   False,
+        }
+
+    def __init__(
+            self,
+            parent: Widget,
+            bank: domain.Bank,
+            tasks: BackgroundTasks,
+            events: EventBus | None = None):
+        super().__init__(parent, bank, tasks)
+
+        ttk.Label(
+            self,
+            text="Browse Accounts",
+            ).pack()
+
+        form_grid = Frame(self)
+        form_grid.pack()
+
+        ttk.Label(
+            form_grid,
+            text="Show",
+            ).grid(row=0, column=0)
+        self.status_filter = StringVar()
+        self.status_filter.set('All')
+        ttk.Combobox(
+            form_grid,
+            textvariable=self.status_filter,
+            values=list(AccountBrowser._FILTERS),
+            state='readonly',
+            ).grid(row=0, column=1)
+
+        self.button = ttk.Button(
+            self,
+            text='Refresh',
+            command=self.on_click)
+        self.button.pack(side='top')
+
+        (self.tree, self.scrollbar) = account_tree(self)
+        self.tree.configure(yscrollcommand=self.on_scroll)
+
+        self.message = StringVar()
+        self.message.set('')
+        ttk.Label(
+            self,
+            textvariable=self.message,
+            ).pack(fill='both')
+
+        ## keyset pagination state; `generation` identifies the current
+        ## listing so pages requested before a Refresh are ignored
+        self.generation = 0
+        ## the `after_id` of every page fetched, by page number
+        self.page_starts: list[domain.AccountId] = []
+        ## the row IDs of each page in the list, from page `first_page` on
+        self.pages: deque[list[str]] = deque()
+        self.first_page = 0
+        self.exhausted = False
+        self.loading = False
+
+        if events:
+            self.watch(events, None, lambda e: update_accounts(self.tree, e))
+        self.on_click()
+
+    def on_click(self):
+        self.generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self.page_starts = [0]
+        self.pages = deque()
+        self.first_page = 0
+        self.exhausted = False
+        self.loading = False
+        self.fetch_page(0)
+
+    def on_scroll(self, first: str, last: str):
+        self.scrollbar.set(first, last)
+        if float(last) >= AccountBrowser._FETCH_THRESHOLD and not self.exhausted:
+            self.fetch_page(self.first_page + len(self.pages))
+        elif float(first) <= 1 - AccountBrowser._FETCH_THRESHOLD and self.first_page > 0:
+            self.fetch_page(self.first_page - 1)
+
+    def fetch_page(self, page: int):
+        if self.loading:
+            return
+
+        self.loading = True
+        generation = self.generation
+        after_id = self.page_starts[page]
+        is_open = AccountBrowser._FILTERS[self.status_filter.get()]
+
+        def done(accounts: list[domain.Account]):
+            if generation != self.generation:
+                return
+
+            self.loading = False
+            if page + 1 < len(self.page_starts):
+                ## fetched before and dropped; it ends where the next page
+                ## starts, whose rows may be listed already
+                end_id = self.page_starts[page + 1]
+                accounts = [a for a in accounts if a.id <= end_id]
+            if page < self.first_page:
+                self.prepend(accounts)
+            else:
+                self.append(accounts)
+            shown = len(self.tree.get_children())
+            more = '' if self.exhausted else ' (scroll for more)'
+            self.message.set(f'{shown} accounts shown{more}')
+
+        def error(_exc: Exception):
+            if generation == self.generation:
+                self.loading = False
+
+        self.run_in_background(
+            lambda: self.bank.list_accounts(
+                after_id,
+                AccountBrowser._PAGE_SIZE,
+                is_open),
+            done,
+            error)
+
+    def append(self, accounts: list[domain.Account]):
+        ## a page fetched before keeps its place, even if now empty
+        fetched_before = self.first_page + len(self.pages) + 1 < len(self.page_starts)
+        self.exhausted = (
+            not fetched_before and len(accounts) < AccountBrowser._PAGE_SIZE)
+        if not accounts and not fetched_before:
+            return
+
+        for account in accounts:
+            insert_account(self.tree, account)
+        self.pages.append([str(a.id) for a in accounts])
+        if not fetched_before:
+            self.page_starts.append(accounts[-1].id)
+        if len(self.pages) > AccountBrowser._MAX_PAGES:
+            self.keep_view(-len(self.pages[0]), lambda: self.tree.delete(*self.pages.popleft()))
+            self.first_page += 1
+
+    def prepend(self, accounts: list[domain.Account]):
+        def insert():
+            for (i, account) in enumerate(accounts):
+                insert_account(self.tree, account, i)
+        self.keep_view(len(accounts), insert)
+        self.pages.appendleft([str(a.id) for a in accounts])
+        self.first_page -= 1
+        if len(self.pages) > AccountBrowser._MAX_PAGES:
+            self.tree.delete(*self.pages.pop())
+            self.exhausted = False
+
+    def keep_view(self, rows_above: int, change: Callable[[], None]):
+        '''
+        make a `change` that adds (or, when negative, removes) `rows_above`
+        rows above the view without moving the rows in view
+        '''
+        (first, _) = self.tree.yview()
+        top_row = first * len(self.tree.get_children())
+        change()
+        total = len(self.tree.get_children())
+        if total:
+            self.tree.yview_moveto(max(0.0, top_row + rows_above) / total)
 
 class MainMenu(Frame):
     def __init__(
             self,
             parent: Widget,
             bank: domain.Bank,
-            on_quit: Callable):
+            tasks: BackgroundTasks,
+            on_quit: Callable,
+            events: EventBus | None = None,
+            outbox: Outbox | None = None):
         super().__init__(parent)
         self.parent = parent
         self.bank = bank
+        self.tasks = tasks
+        self.events = events
+        self.outbox = outbox
 
         ttk.Label(
             self,
@@ -341,6 +1007,8 @@ class MainMenu(Frame):
             ('View Balance',        self.on_view_balance),
             ('Deposit',             self.on_deposit),
             ('Withdraw',            self.on_withdraw),
+            ('Browse Accounts',     self.on_browse_accounts),
+            ('Find Accounts',       self.on_search_accounts),
             ('Quit',                on_quit),
             ]
 
@@ -348,31 +1016,106 @@ class MainMenu(Frame):
             ttk.Button(self, text=text, command=command).pack(fill='both')
 
     def on_open_account(self):
-        OpenAccount(self.parent, self.bank)
+        OpenAccount(self.parent, self.bank, self.tasks)
 
     def on_modify_account(self):
-        ModifyAccount(self.parent, self.bank)
+        ModifyAccount(self.parent, self.bank, self.tasks)
 
     def on_close_account(self):
-        CloseAccount(self.parent, self.bank)
+        CloseAccount(self.parent, self.bank, self.tasks)
 
     def on_view_balance(self):
-        ViewBalance(self.parent, self.bank)
+        ViewBalance(self.parent, self.bank, self.tasks, self.events)
 
     def on_deposit(self):
-        Deposit(self.parent, self.bank)
+        Deposit(self.parent, self.bank, self.tasks, self.outbox)
 
     def on_withdraw(self):
-        Withdraw(self.parent, self.bank)
+        Withdraw(self.parent, self.bank, self.tasks, self.outbox)
+
+    def on_browse_accounts(self):
+        AccountBrowser(self.parent, self.bank, self.tasks, self.events)
+
+    def on_search_accounts(self):
+        SearchAccounts(self.parent, self.bank, self.tasks)
 
 class Application:
-    def __init__(self, bank: domain.Bank):
+    def __init__(
+            self,
+            bank: domain.Bank,
+            warm_up: Callable[[], Any] | None = None,
+            events: EventBus | None = None,
+            outbox: Outbox | None = None):
+        '''
+        `warm_up()`, e.g. opening the database connection, runs on the worker
+        thread ahead of any Bank call, while the window is already showing.
+        `events`, the bus `bank` publishes to, lets windows show changes as
+        they happen.  Given `outbox`, deposits and withdrawals are accepted
+        there when the database does not answer, and the status line shows
+        how far behind it is; pass `on_refused` to its Replayer.
+        '''
         self.root = Tk()
+        self.tasks = BackgroundTasks(self.root)
+        self.outbox = outbox
+        self.outbox_waiting = False
+        ## from the replayer's thread, for the Tk thread to show
+        self.new_refusals: SimpleQueue[str] = SimpleQueue()
+        self.refusals: deque[str] = deque(maxlen=_REFUSALS_SHOWN)
         self.main_menu = MainMenu(
             self.root,
             bank,
-            on_quit=self.root.destroy)
+            self.tasks,
+            on_quit=self.root.destroy,
+            events=events,
+            outbox=outbox)
         self.main_menu.pack(side='top', fill='both', expand=True)
 
+        self.status = StringVar()
+        ttk.Label(
+            self.root,
+            textvariable=self.status,
+            ).pack(side='bottom', fill='x')
+        self.refused = StringVar()
+        ttk.Label(
+            self.root,
+            textvariable=self.refused,
+            foreground='red',
+            ).pack(side='bottom', fill='x')
+
+        if warm_up:
+            self.status.set('connecting...')
+            self.tasks.submit(
+                warm_up,
+                lambda _: self.status.set('ready'),
+                lambda exc: self.status.set(f'ERROR {exc}'),
+                on_late=lambda _, exc: self.status.set(
+                    'ready' if exc is None else f'ERROR {exc}'))
+
+        if outbox:
+            self.root.after(_OUTBOX_POLL_INTERVAL_MS, self.show_outbox)
+
+    def on_refused(self, entry: OutboxEntry, reason: str):
+        '''called on the replayer's thread for each request the Bank refused'''
+        self.new_refusals.put(refused_message(entry, reason))
+
+    def show_outbox(self):
+        while not self.new_refusals.empty():
+            self.refusals.append(self.new_refusals.get())
+        self.refused.set('\n'.join(self.refusals))
+
+        metrics = self.outbox.metrics()
+        refused = f'; {metrics.refused} refused' if metrics.refused else ''
+        if metrics.depth:
+            self.status.set(
+                f'{metrics.depth} requests waiting for the database '
+                f'(oldest {metrics.replay_lag.total_seconds():.0f}s){refused}')
+        elif self.outbox_waiting:
+            self.status.set(f'ready{refused}')
+        self.outbox_waiting = metrics.depth > 0
+        self.root.after(_OUTBOX_POLL_INTERVAL_MS, self.show_outbox)
+
     def run(self):
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            self.tasks.shutdown()
@@ -0,0 +1,219 @@
+'''
+Credits a period's interest to every open account with a positive balance.
+
+    python src/interest.py 2026-10 --annual-rate 4.5
+
+Accounts are processed in chunks of `chunk_size` consecutive account IDs, by
+several worker threads at once.  Each chunk runs in one transaction: it
+locks and reads the chunk's balances, computes every account's interest in
+one pass over integer cents, then writes all of the new balances with a
+single UPDATE, a ledger row per account, and a row marking the chunk
+finished.  A run that stops part way is restarted by running it again with
+the same run ID and chunk size; finished chunks are skipped.
+
+Interest is `balance * rate_ppm / 1,000,000` cents, rounded half up to a
+whole cent, and never takes a balance above USD.MAX_CENTS.
+'''
+import argparse
+from decimal import ROUND_HALF_EVEN, Decimal
+from queue import Empty, Queue
+import sys
+from threading import Lock, Thread
+from typing import Callable
+
+from domain import USD, AccountId, BankDatabase, Clock, SystemClock
+from storage import AccrualDatabase, InterestCredit
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_WORKERS = 3
+
+_PPM = 1_000_000
+_PERIODS_PER_YEAR = 12
+
+def rate_ppm(annual_percent: Decimal | str) -> int:
+    '''the monthly rate, in millionths, of an annual percentage rate'''
+    monthly = Decimal(annual_percent) * (_PPM // 100) / _PERIODS_PER_YEAR
+    return int(monthly.quantize(Decimal(1), rounding=ROUND_HALF_EVEN))
+
+def interest_credits(
+        balances: list[tuple[AccountId, int]],
+        rate_ppm: int) -> list[InterestCredit]:
+    '''the interest earned by each `(ID, balance in cents)`'''
+    if rate_ppm < 0:
+        raise ValueError(f'rate_ppm may not be negative (it was {rate_ppm})')
+
+    half = _PPM // 2
+    return [
+        InterestCredit(
+            account_id,
+            cents,
+            min((cents * rate_ppm + half) // _PPM, USD.MAX_CENTS - cents))
+        for (account_id, cents) in balances
+        ]
+
+class AccrualResult:
+    '''what one run (or one restart of a run) did'''
+    def __init__(self):
+        self.chunks = 0
+        self.skipped_chunks = 0
+        self.accounts = 0
+        self.interest_cents = 0
+        self.failed_chunks: dict[AccountId, Exception] = {}
+
+    def __repr__(self):
+        return (
+            f'AccrualResult(chunks={self.chunks}, '
+            f'skipped_chunks={self.skipped_chunks}, '
+            f'accounts={self.accounts}, '
+            f'interest_cents={self.interest_cents}, '
+            f'failed_chunks={sorted(self.failed_chunks)})')
+
+class InterestAccrual:
+    def __init__(
+            self,
+            database_factory: Callable[[], BankDatabase],
+            clock: Clock,
+            run_id: str,
+            rate_ppm: int,
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+            workers: int = DEFAULT_WORKERS):
+        '''
+        `database_factory()` must return a BankDatabase that is also an
+        AccrualDatabase; each worker opens its own.
+        '''
+        if chunk_size <= 0 or workers <= 0:
+            raise ValueError('chunk_size and workers must be positive')
+        if rate_ppm < 0:
+            raise ValueError(f'rate_ppm may not be negative (it was {rate_ppm})')
+
+        self._database_factory = database_factory
+        self._clock = clock
+        self._run_id = run_id
+        self._rate_ppm = rate_ppm
+        self._chunk_size = chunk_size
+        self._workers = workers
+        self._result_lock = Lock()
+
+    def run(self) -> AccrualResult:
+        result = AccrualResult()
+        with self._database_factory() as db:
+            bounds = db.account_id_bounds()
+            finished = db.finished_chunks(self._run_id)
+        if bounds is None:
+            return result
+
+        ## boundaries are multiples of chunk_size, so that a restart with
+        ## the same chunk_size finds the same chunks
+        (low, high) = bounds
+        chunks = Queue()
+        for first_id in range(low - low % self._chunk_size, high + 1, self._chunk_size):
+            if first_id in finished:
+                result.skipped_chunks += 1
+            else:
+                chunks.put(first_id)
+
+        workers = [
+            Thread(target=self._work, args=(chunks, result), name=f'interest-{i}')
+            for i in range(self._workers)
+            ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return result
+
+    def _work(self, chunks: Queue, result: AccrualResult):
+        try:
+            db = self._database_factory().__enter__()
+        except Exception as exc:
+            ## fail what is left, rather than leave it undone unreported
+            while (first_id := _next_chunk(chunks)) is not None:
+                with self._result_lock:
+                    result.failed_chunks[first_id] = exc
+            return
+
+        try:
+            while (first_id := _next_chunk(chunks)) is not None:
+                try:
+                    credits = self._accrue(db, first_id)
+                except Exception as exc:
+                    with self._result_lock:
+                        result.failed_chunks[first_id] = exc
+                    continue
+
+                with self._result_lock:
+                    result.chunks += 1
+                    result.accounts += len(credits)
+                    result.interest_cents += sum(c.interest for c in credits)
+        finally:
+            db.__exit__(None, None, None)
+
+    def _accrue(self, db, first_id: AccountId) -> list[InterestCredit]:
+        end_id = first_id + self._chunk_size
+        db.start_serializable_transaction()
+        try:
+            credits = interest_credits(
+                db.select_interest_bearing(first_id, end_id),
+                self._rate_ppm)
+            db.credit_interest(
+                self._run_id,
+                first_id,
+                end_id,
+                self._rate_ppm,
+                credits,
+                self._clock.utcnow())
+            db.commit_transaction()
+            return credits
+        except:
+            db.rollback_transaction()
+            raise
+
+def _next_chunk(chunks: Queue) -> AccountId | None:
+    try:
+        return chunks.get_nowait()
+    except Empty:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='credit a month of interest to every open account')
+    parser.add_argument(
+        'run_id',
+        help="names the run, e.g. '2026-10'; repeat it to resume a run")
+    parser.add_argument(
+        '--annual-rate',
+        required=True,
+        help='annual percentage rate, e.g. 4.5')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument(
+        '--memory',
+        action='store_true',
+        help='use an empty in-process database instead of MySQL')
+    args = parser.parse_args()
+
+    if args.memory:
+        from memory import BankMemoryDatabase
+        shared = BankMemoryDatabase()
+        database_factory = lambda: shared
+    else:
+        from database import BankMySqlDatabase
+        database_factory = BankMySqlDatabase
+
+    result = InterestAccrual(
+        database_factory,
+        SystemClock(),
+        args.run_id,
+        rate_ppm(args.annual_rate),
+        args.chunk_size,
+        args.workers).run()
+
+    print(
+        f'credited {result.interest_cents} cents to {result.accounts} accounts '
+        f'in {result.chunks} chunks ({result.skipped_chunks} already finished)')
+    for (first_id, exc) in sorted(result.failed_chunks.items()):
+        print(f'chunk starting at {first_id} failed: {exc}', file=sys.stderr)
+    sys.exit(1 if result.failed_chunks else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+from decimal import Decimal
+from unittest.mock import patch
+import unittest
+
+from domain import *
+from memory import BankMemoryDatabase
+from interest import *
+
+class TestInterestCredits(unittest.TestCase):
+    def test_rounds_half_up(self):
+        ## Act
+        actual = interest_credits([(1, 10_00), (2, 50), (3, 49), (4, 150)], 10_000)
+
+        ## Assert
+        self.assertEqual([10, 1, 0, 2], [c.interest for c in actual])
+        self.assertEqual(10_10, actual[0].balance_after)
+
+    def test_never_exceeds_max_cents(self):
+        ## Act
+        (actual,) = interest_credits([(1, USD.MAX_CENTS - 5)], 10_000)
+
+        ## Assert
+        self.assertEqual(5, actual.interest)
+        self.assertEqual(USD.MAX_CENTS, actual.balance_after)
+
+    def test_rate_ppm(self):
+        self.assertEqual(3750, rate_ppm('4.5'))
+        self.assertEqual(833, rate_ppm(Decimal('1')))
+
+class TestInterestAccrual(unittest.TestCase):
+    def setUp(self):
+        self.db = BankMemoryDatabase()
+        self.bank = Bank(self.db, SystemClock())
+        self.accounts = self.bank.open_accounts([f'Frank {i}' for i in range(10)])
+        for a in self.accounts:
+            self.bank.deposit(a.id, USD(100_00))
+        self.bank.withdraw(self.accounts[3].id, USD(100_00))
+        self.bank.close_account(self.accounts[3].id)
+
+    def accrual(self, run_id='2026-10'):
+        return InterestAccrual(
+            lambda: self.db,
+            SystemClock(),
+            run_id,
+            rate_ppm=10_000,
+            chunk_size=3,
+            workers=2)
+
+    def test_credits_open_accounts(self):
+        ## Act
+        result = self.accrual().run()
+
+        ## Assert
+        self.assertEqual(4, result.chunks)
+        self.assertEqual(9, result.accounts)
+        self.assertEqual(9 * 1_00, result.interest_cents)
+        self.assertEqual(USD(101_00), self.db.select_by_id(self.accounts[0].id).balance)
+        self.assertEqual(USD.ZERO, self.db.select_by_id(self.accounts[3].id).balance)
+        self.assertEqual(9, len(self.db._interest_ledger))
+
+    def test_restart_skips_finished_chunks(self):
+        ## Arrange
+        self.accrual().run()
+
+        ## Act
+        result = self.accrual().run()
+
+        ## Assert
+        self.assertEqual(0, result.chunks)
+        self.assertEqual(4, result.skipped_chunks)
+        self.assertEqual(USD(101_00), self.db.select_by_id(self.accounts[0].id).balance)
+
+    def test_failed_chunk_rolls_back(self):
+        ## Arrange
+        original = self.db.credit_interest
+        def fail_first_chunk(run_id, first_id, *args):
+            original(run_id, first_id, *args)
+            if first_id == 0:
+                raise RuntimeError('fake error')
+
+        ## Act
+        with patch.object(self.db, 'credit_interest', fail_first_chunk):
+            failed = self.accrual().run()
+        retried = self.accrual().run()
+
+        ## Assert
+        self.assertEqual([0], list(failed.failed_chunks))
+        self.assertEqual(1, retried.chunks)
+        self.assertEqual(2, retried.accounts)
+        for a in self.accounts[:3]:
+            self.assertEqual(USD(101_00), self.db.select_by_id(a.id).balance)
+
+    def test_failed_open_fails_chunks(self):
+        ## Arrange
+        opened = []
+        def factory():
+            ## the run itself opens the first
+            opened.append(1)
+            if len(opened) > 1:
+                raise ConnectionError('database is down')
+            return self.db
+        accrual = InterestAccrual(
+            factory, SystemClock(), '2026-10', rate_ppm=10_000, chunk_size=3)
+
+        ## Act
+        result = accrual.run()
+
+        ## Assert
+        self.assertEqual([0, 3, 6, 9], sorted(result.failed_chunks))
+        self.assertEqual(0, result.chunks)
+        self.assertEqual(USD(100_00), self.db.select_by_id(self.accounts[0].id).balance)
+
+if __name__ == '__main__':
+    unittest.main()
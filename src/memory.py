@@ -0,0 +1,348 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from threading import RLock, get_ident
+from typing import Callable
+
+from domain import USD, Account, AccountId, BankDatabase, normalized_name
+from storage import (
+    AccrualDatabase,
+    AppliedRequestLog,
+    ArchiveDatabase,
+    InterestCredit,
+    RangeChecksum,
+    ReconcileDatabase,
+    Withdrawal,
+    WithdrawalLog,
+    checksum_of)
+
+
+class BankMemoryDatabase(
+        BankDatabase,
+        AccrualDatabase,
+        ArchiveDatabase,
+        ReconcileDatabase,
+        WithdrawalLog,
+        AppliedRequestLog):
+    '''
+    An in-process stand-in for BankMySqlDatabase, for tests and tools.
+
+    One instance may be shared by many threads.  A transaction holds a lock
+    from start to commit (or rollback), so transactions are serializable
+    simply by never overlapping.  Statements outside a transaction take
+    effect immediately.
+    '''
+
+    def __init__(self, id_offset: int = 1, id_increment: int = 1):
+        '''
+        New IDs are `id_offset`, `id_offset + id_increment`, and so on, like
+        MySQL's auto_increment_offset and auto_increment_increment.
+        '''
+        if id_offset <= 0 or id_increment <= 0:
+            raise ValueError('id_offset and id_increment must be positive')
+
+        self._lock = RLock()
+        self._accounts: dict[AccountId, Account] = {}
+        ## account IDs in ascending order, for pagination
+        self._ids: list[AccountId] = []
+        self._next_id = id_offset
+        self._id_increment = id_increment
+
+        ## the thread in a transaction, and how to undo its changes
+        self._transaction_thread: int | None = None
+        self._undo: list[Callable[[], None]] = []
+
+        ## interest accrual: ledger rows by (run ID, account ID), and
+        ## finished chunks by (run ID, first ID)
+        self._interest_ledger: dict[tuple[str, AccountId], tuple] = {}
+        self._interest_chunks: dict[tuple[str, AccountId], tuple] = {}
+
+        ## accounts moved out by archive_closed(), by ID
+        self._archive: dict[AccountId, Account] = {}
+
+        ## withdrawals logged by insert_withdrawals(), oldest first
+        self._withdrawals: list[Withdrawal] = []
+
+        ## (refused, applied_at) of each request, by request ID
+        self._applied_requests: dict[str, tuple[str | None, datetime]] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _exc_type, _exc_value, _traceback):
+        if self._in_transaction():
+            self.rollback_transaction()
+
+    def _in_transaction(self) -> bool:
+        return self._transaction_thread == get_ident()
+
+    def _replace(self, account_id: AccountId, after: Account | None):
+        if self._in_transaction():
+            before = self._accounts.get(account_id)
+            self._undo.append(lambda: self._replace(account_id, before))
+
+        if after is None:
+            del self._accounts[account_id]
+            self._ids.remove(account_id)
+        else:
+            if account_id not in self._accounts:
+                ## IDs are only ever allocated in ascending order
+                self._ids.insert(bisect_right(self._ids, account_id), account_id)
+            self._accounts[account_id] = after
+
+    def select_by_id(self, account_id: AccountId) -> Account:
+        with self._lock:
+            return self._accounts.get(account_id) or self._archive.get(account_id)
+
+    def select_page(
+            self,
+            after_id: AccountId,
+            limit: int,
+            is_open: bool | None = None) -> list[Account]:
+        with self._lock:
+            result = []
+            for i in range(bisect_right(self._ids, after_id), len(self._ids)):
+                account = self._accounts[self._ids[i]]
+                if is_open is None or account.is_open == is_open:
+                    result.append(account)
+                    if len(result) >= limit:
+                        break
+            return result
+
+    def select_by_name(self, query: str, limit: int) -> list[Account]:
+        '''prefix matches in name order, then names containing the query'''
+        normalized = normalized_name(query)
+        with self._lock:
+            named = [
+                (normalized_name(a.full_name), a.id, a)
+                for a in self._accounts.values()
+                ]
+        prefix = sorted(
+            (name, acct_id, a) for (name, acct_id, a) in named
+            if name.startswith(normalized))
+        contains = sorted(
+            (acct_id, a) for (name, acct_id, a) in named
+            if normalized in name and not name.startswith(normalized))
+        result = [a for (_, _, a) in prefix] + [a for (_, a) in contains]
+        return result[:limit]
+
+    def insert(self, a: Account) -> Account:
+        if a.id is not None:
+            raise ValueError(
+                f'cannot insert an Account with an ID (it was {a.id})')
+
+        with self._lock:
+            account_id = self._next_id
+            self._next_id += self._id_increment
+            inserted = Account(account_id, a.full_name, a.balance, a.closed_at)
+            self._replace(account_id, inserted)
+            return inserted
+
+    def insert_many(self, accounts: list[Account]) -> list[Account]:
+        with self._lock:
+            return [self.insert(a) for a in accounts]
+
+    def update_closed_at(self, account_id: AccountId, closed_at: datetime) -> None:
+        with self._lock:
+            a = self._accounts.get(account_id)
+            if a is not None:
+                self._replace(
+                    account_id,
+                    Account(a.id, a.full_name, a.balance, closed_at))
+
+    def update_name(self, account_id: AccountId, full_name: str) -> None:
+        with self._lock:
+            a = self._accounts.get(account_id)
+            if a is not None:
+                self._replace(
+                    account_id,
+                    Account(a.id, full_name, a.balance, a.closed_at))
+
+    def update_balance(self, account_id: AccountId, balance: USD) -> int:
+        with self._lock:
+            a = self._accounts.get(account_id)
+            if a is None:
+                return 0
+            self._replace(
+                account_id,
+                Account(a.id, a.full_name, balance, a.closed_at))
+            return 1
+
+    def account_id_bounds(self) -> tuple[AccountId, AccountId] | None:
+        with self._lock:
+            return (self._ids[0], self._ids[-1]) if self._ids else None
+
+    def select_interest_bearing(
+            self,
+            first_id: AccountId,
+            end_id: AccountId) -> list[tuple[AccountId, int]]:
+        with self._lock:
+            result = []
+            for i in range(bisect_left(self._ids, first_id), len(self._ids)):
+                a = self._accounts[self._ids[i]]
+                if a.id >= end_id:
+                    break
+                if a.is_open and a.balance.total_cents > 0:
+                    result.append((a.id, a.balance.total_cents))
+            return result
+
+    def credit_interest(
+            self,
+            run_id: str,
+            first_id: AccountId,
+            end_id: AccountId,
+            rate_ppm: int,
+            credits: list[InterestCredit],
+            credited_at: datetime) -> None:
+        with self._lock:
+            ## like the MySQL primary keys, refuse to credit anything twice
+            if (run_id, first_id) in self._interest_chunks:
+                raise ValueError(f'chunk {first_id} of {run_id} already finished')
+            for c in credits:
+                if (run_id, c.account_id) in self._interest_ledger:
+                    raise ValueError(
+                        f'account {c.account_id} already credited by {run_id}')
+
+            for c in credits:
+                if c.interest:
+                    self.update_balance(c.account_id, USD(c.balance_after))
+                self._record((run_id, c.account_id), self._interest_ledger, (
+                    rate_ppm, c.balance_before, c.interest, credited_at))
+            self._record((run_id, first_id), self._interest_chunks, (
+                end_id,
+                len(credits),
+                sum(c.interest for c in credits),
+                credited_at))
+
+    def _record(self, key, table: dict, row):
+        table[key] = row
+        if self._in_transaction():
+            self._undo.append(lambda: table.pop(key))
+
+    def archive_closed(
+            self,
+            after_id: AccountId,
+            closed_before: datetime,
+            limit: int,
+            archived_at: datetime) -> list[AccountId]:
+        with self._lock:
+            due = []
+            for i in range(bisect_right(self._ids, after_id), len(self._ids)):
+                a = self._accounts[self._ids[i]]
+                if not a.is_open and a.closed_at < closed_before:
+                    due.append(a)
+                    if len(due) >= limit:
+                        break
+
+            for a in due:
+                self._record(a.id, self._archive, a)
+                self._replace(a.id, None)
+            return [a.id for a in due]
+
+    def finished_chunks(self, run_id: str) -> set[AccountId]:
+        with self._lock:
+            return {
+                first_id for (run, first_id) in self._interest_chunks
+                if run == run_id
+                }
+
+    def range_checksum(self, first_id: AccountId, end_id: AccountId) -> RangeChecksum:
+        with self._lock:
+            return checksum_of([
+                self._accounts[account_id]
+                for account_id in self._ids[
+                    bisect_left(self._ids, first_id):bisect_left(self._ids, end_id)]
+                ])
+
+    def insert_withdrawals(self, withdrawals: list[Withdrawal]) -> None:
+        if not withdrawals:
+            return
+
+        with self._lock:
+            self._withdrawals.extend(withdrawals)
+            if self._in_transaction():
+                count = len(withdrawals)
+                def undo():
+                    del self._withdrawals[-count:]
+                self._undo.append(undo)
+
+    def select_withdrawals_since(self, since: datetime) -> list[Withdrawal]:
+        with self._lock:
+            return [w for w in self._withdrawals if w[2] >= since]
+
+    def purge_withdrawals_before(self, before: datetime, limit: int) -> int:
+        with self._lock:
+            due = sorted(
+                (i for (i, w) in enumerate(self._withdrawals) if w[2] < before),
+                key=lambda i: self._withdrawals[i][2])[:limit]
+            if not due:
+                return 0
+
+            kept = self._withdrawals
+            purged = set(due)
+            self._withdrawals = [w for (i, w) in enumerate(kept) if i not in purged]
+            if self._in_transaction():
+                def undo():
+                    self._withdrawals = kept
+                self._undo.append(undo)
+            return len(due)
+
+    def mark_applied(
+            self,
+            request_id: str,
+            refused: str | None,
+            applied_at: datetime) -> bool:
+        with self._lock:
+            if request_id in self._applied_requests:
+                return False
+            self._record(request_id, self._applied_requests, (refused, applied_at))
+            return True
+
+    def unmark_applied(self, request_id: str) -> None:
+        with self._lock:
+            row = self._applied_requests.pop(request_id, None)
+            if row is not None and self._in_transaction():
+                self._undo.append(
+                    lambda: self._applied_requests.__setitem__(request_id, row))
+
+    def purge_applied_before(self, before: datetime, limit: int) -> int:
+        with self._lock:
+            due = sorted(
+                (request_id
+                    for (request_id, (_, applied_at)) in self._applied_requests.items()
+                    if applied_at < before),
+                key=lambda request_id: self._applied_requests[request_id][1])[:limit]
+            for request_id in due:
+                row = self._applied_requests.pop(request_id)
+                if self._in_transaction():
+                    self._undo.append(
+                        lambda request_id=request_id, row=row:
+                            self._applied_requests.__setitem__(request_id, row))
+            return len(due)
+
+    def start_serializable_transaction(self) -> None:
+        if self._in_transaction():
+            raise RuntimeError('transaction already in progress')
+
+        self._lock.acquire()
+        self._transaction_thread = get_ident()
+        self._undo = []
+
+    def commit_transaction(self) -> None:
+        if not self._in_transaction():
+            return
+
+        self._undo = []
+        self._transaction_thread = None
+        self._lock.release()
+
+    def rollback_transaction(self) -> None:
+        if not self._in_transaction():
+            return
+
+        ## stop recording undo entries before replaying them
+        undo = self._undo
+        self._undo = []
+        self._transaction_thread = None
+        for undo_one in reversed(undo):
+            undo_one()
+        self._lock.release()
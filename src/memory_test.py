@@ -0,0 +1,149 @@
+from datetime import datetime, timezone
+from threading import Event, Thread
+import unittest
+
+from domain import *
+from memory import *
+
+class TestBankMemoryDatabase(unittest.TestCase):
+    def test_insert_with_id(self):
+        db = BankMemoryDatabase()
+
+        ## Act & Assert
+        with self.assertRaises(ValueError):
+            db.insert(Account(1, 'Frank the Cat', USD(123_45), None))
+
+    def test_insert_select_round_trip(self):
+        ## Arrange
+        db = BankMemoryDatabase()
+        now = datetime.now(timezone.utc)
+        expected = Account(None, 'Frank the Cat', USD(123_45), now)
+
+        ## Act
+        inserted = db.insert(expected)
+        selected = db.select_by_id(inserted.id)
+
+        ## Assert
+        self.assertEqual(inserted.id, selected.id)
+        for actual in [inserted, selected]:
+            self.assertEqual(expected.full_name, actual.full_name)
+            self.assertEqual(expected.balance,   actual.balance)
+            self.assertEqual(expected.closed_at, actual.closed_at)
+
+    def test_id_offset_and_increment(self):
+        db = BankMemoryDatabase(id_offset=3, id_increment=4)
+
+        ## Act
+        ids = [db.insert(Account.new('x')).id for _ in range(3)]
+
+        ## Assert
+        self.assertEqual([3, 7, 11], ids)
+
+    def test_insert_many(self):
+        db = BankMemoryDatabase()
+
+        ## Act
+        inserted = db.insert_many([Account.new('Frank'), Account.new('Felix')])
+
+        ## Assert
+        self.assertEqual([1, 2], [a.id for a in inserted])
+        self.assertEqual('Felix', db.select_by_id(2).full_name)
+
+    def test_updates(self):
+        ## Arrange
+        db = BankMemoryDatabase()
+        closed_at = datetime.now(timezone.utc)
+        frank = db.insert(Account(None, 'Frank the Cat', USD.ZERO, None))
+
+        ## Act
+        db.update_name(frank.id, 'Frank the AMAZING Cat')
+        db.update_balance(frank.id, USD(1_00))
+        db.update_closed_at(frank.id, closed_at)
+
+        ## Assert
+        actual = db.select_by_id(frank.id)
+        self.assertEqual('Frank the AMAZING Cat', actual.full_name)
+        self.assertEqual(USD(1_00), actual.balance)
+        self.assertEqual(closed_at, actual.closed_at)
+
+    def test_rollback(self):
+        ## Arrange
+        db = BankMemoryDatabase()
+        frank = db.insert(Account(None, 'Frank the Cat', USD.ZERO, None))
+
+        ## Act
+        db.start_serializable_transaction()
+        db.update_balance(frank.id, USD(1_00))
+        db.update_name(frank.id, 'Frank')
+        felix = db.insert(Account(None, 'Felix', USD.ZERO, None))
+        db.rollback_transaction()
+
+        ## Assert
+        actual = db.select_by_id(frank.id)
+        self.assertEqual(USD.ZERO, actual.balance)
+        self.assertEqual('Frank the Cat', actual.full_name)
+        self.assertIsNone(db.select_by_id(felix.id))
+        self.assertEqual([frank.id], [a.id for a in db.select_page(0, 10)])
+
+    def test_transactions_do_not_overlap(self):
+        ## Arrange
+        db = BankMemoryDatabase()
+        frank = db.insert(Account(None, 'Frank the Cat', USD(1_00), None))
+        started = Event()
+        seen = []
+
+        def other_branch():
+            started.set()
+            db.start_serializable_transaction()
+            seen.append(db.select_by_id(frank.id).balance)
+            db.commit_transaction()
+
+        ## Act
+        db.start_serializable_transaction()
+        thread = Thread(target=other_branch)
+        thread.start()
+        started.wait()
+        db.update_balance(frank.id, USD(1))
+        db.commit_transaction()
+        thread.join()
+
+        ## Assert
+        self.assertEqual([USD(1)], seen)
+
+    def test_select_page(self):
+        ## Arrange
+        db = BankMemoryDatabase()
+        now = datetime.now(timezone.utc)
+        first = db.insert(Account(None, 'page test 1', USD.ZERO, None))
+        second = db.insert(Account(None, 'page test 2', USD.ZERO, now))
+        third = db.insert(Account(None, 'page test 3', USD.ZERO, None))
+
+        ## Act & Assert
+        self.assertEqual(
+            [first.id, second.id],
+            [a.id for a in db.select_page(0, 2)])
+        self.assertEqual(
+            [first.id, third.id],
+            [a.id for a in db.select_page(0, 3, is_open=True)])
+        self.assertEqual(
+            [second.id],
+            [a.id for a in db.select_page(0, 3, is_open=False)])
+        self.assertEqual([third.id], [a.id for a in db.select_page(second.id, 3)])
+
+    def test_select_by_name(self):
+        ## Arrange
+        db = BankMemoryDatabase()
+        cat = db.insert(Account(None, 'Frank  the Cat', USD.ZERO, None))
+        dog = db.insert(Account(None, 'Frankie Dog', USD.ZERO, None))
+        other = db.insert(Account(None, 'Ole Frank', USD.ZERO, None))
+        db.insert(Account(None, 'Felix', USD.ZERO, None))
+
+        ## Act & Assert
+        self.assertEqual(
+            [cat.id, dog.id, other.id],
+            [a.id for a in db.select_by_name('FRANK', 10)])
+        self.assertEqual([cat.id], [a.id for a in db.select_by_name('frank the', 10)])
+        self.assertEqual([cat.id], [a.id for a in db.select_by_name('frank', 1)])
+
+if __name__ == '__main__':
+    unittest.main()
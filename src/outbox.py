@@ -0,0 +1,412 @@
+'''
+Accepts deposits and small withdrawals at once, even while the database is
+slow or down, and applies them to the Bank later, e.g.
+
+    outbox = Outbox('teller.outbox', clock)
+    replayer = Replayer(outbox, BankMySqlDatabase, clock)
+    entry = outbox.deposit(12, USD(10_00))    # durable when it returns
+    ...
+    replayer.close()
+    outbox.close()
+
+An accepted request is appended, as a line of JSON, to a local file, and
+is durable (fsync'ed) before `deposit()` or `withdraw()` returns.  Requests
+arriving together share one fsync: a background thread syncs whatever has
+been written every `flush_interval`.
+
+A request may instead be tried against the Bank first, and accepted only
+when the database does not answer, e.g.
+
+    entry = outbox.request(WITHDRAW, 12, USD(250_00))
+    try:
+        apply(bank, entry)
+    except ConnectionError:
+        outbox.accept(entry)
+
+Since the request keeps its ID, a call that did commit after all, e.g. one
+that timed out, is not applied again when the request is replayed.
+
+Withdrawals are accepted only while the account's waiting withdrawals stay
+within `offline_limit`, since the balance cannot be checked until the
+request is applied.
+
+A Replayer applies the waiting requests to a Bank one at a time, in the
+order they were accepted.  Each is applied exactly once: the request ID is
+recorded in the database (see AppliedRequestLog) in the same transaction
+as the deposit or withdrawal, and a request whose ID is already there is
+skipped.  A request the Bank refuses, e.g. a withdrawal of more than the
+balance, is recorded as refused and not tried again.  Any other error
+leaves the request waiting, to be tried again after `retry_interval`.
+'''
+from collections import deque
+from datetime import datetime, timedelta
+import json
+import os
+from threading import Condition, Event, Thread
+from time import sleep
+from typing import Callable
+from uuid import uuid4
+
+from domain import USD, AccountChange, AccountId, Bank, BankDatabase, Clock, EventPublisher
+from storage import AppliedRequestLog
+
+DEPOSIT = 'deposit'
+WITHDRAW = 'withdraw'
+
+DEFAULT_FLUSH_INTERVAL = timedelta(milliseconds=5)
+DEFAULT_OFFLINE_LIMIT = USD(200_00)
+DEFAULT_RETRY_INTERVAL = timedelta(seconds=2)
+
+## how long a Replayer waits for a request before checking whether it is closed
+_REPLAY_POLL_INTERVAL = timedelta(milliseconds=100)
+
+class OutboxEntry:
+    '''one accepted request'''
+    def __init__(
+            self,
+            request_id: str,
+            operation: str,
+            account_id: AccountId,
+            amount: USD,
+            accepted_at: datetime):
+        self.request_id = request_id
+        self.operation = operation
+        self.account_id = account_id
+        self.amount = amount
+        self.accepted_at = accepted_at
+
+    def to_json(self) -> dict:
+        return {
+            'request_id': self.request_id,
+            'operation': self.operation,
+            'account_id': self.account_id,
+            'amount_usd_cents': self.amount.total_cents,
+            'accepted_at_utc': self.accepted_at.isoformat(),
+            }
+
+    @staticmethod
+    def from_json(o: dict) -> 'OutboxEntry':
+        return OutboxEntry(
+            o['request_id'],
+            o['operation'],
+            o['account_id'],
+            USD(o['amount_usd_cents']),
+            datetime.fromisoformat(o['accepted_at_utc']))
+
+    def __repr__(self):
+        return (
+            f'OutboxEntry({self.request_id!r}, {self.operation!r}, '
+            f'{self.account_id}, {self.amount!r}, {self.accepted_at})')
+
+class OutboxMetrics:
+    '''a snapshot of an Outbox'''
+    def __init__(
+            self,
+            depth: int,
+            replay_lag: timedelta,
+            accepted: int,
+            applied: int,
+            refused: int):
+        ## requests waiting to be applied
+        self.depth = depth
+        ## how long the oldest waiting request has waited
+        self.replay_lag = replay_lag
+        ## since the outbox was opened
+        self.accepted = accepted
+        self.applied = applied
+        self.refused = refused
+
+    def __repr__(self):
+        return (
+            f'OutboxMetrics(depth={self.depth}, '
+            f'replay_lag={self.replay_lag}, '
+            f'accepted={self.accepted}, '
+            f'applied={self.applied}, '
+            f'refused={self.refused})')
+
+class Outbox:
+    def __init__(
+            self,
+            path: str,
+            clock: Clock,
+            offline_limit: USD = DEFAULT_OFFLINE_LIMIT,
+            flush_interval: timedelta = DEFAULT_FLUSH_INTERVAL):
+        '''
+        Open the outbox file at `path`, creating it if need be; requests
+        accepted but not yet applied when it was last closed are waiting
+        again.
+        '''
+        self._path = path
+        self._clock = clock
+        self._offline_limit = offline_limit
+        self._flush_interval = flush_interval.total_seconds()
+        self._condition = Condition()
+        ## (line, entry) of each waiting request, oldest first; a request
+        ## is not replayed until its line is on disk
+        _cut_torn_line(path)
+        self._pending: deque[tuple[int, OutboxEntry]] = deque(
+            (0, entry) for entry in self._load(path))
+        self._accepted = 0
+        self._applied = 0
+        self._refused = 0
+
+        ## lines written since opening, and lines known to be on disk
+        self._written = 0
+        self._synced = 0
+        self._closed = False
+
+        self._file = open(path, 'a', encoding='utf-8')
+        self._syncer = Thread(target=self._sync, name='outbox-sync', daemon=True)
+        self._syncer.start()
+
+    @staticmethod
+    def _load(path: str) -> list[OutboxEntry]:
+        if not os.path.exists(path):
+            return []
+
+        entries: dict[str, OutboxEntry] = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                o = json.loads(line)
+                if 'done' in o:
+                    entries.pop(o['done'], None)
+                else:
+                    entry = OutboxEntry.from_json(o)
+                    entries[entry.request_id] = entry
+        return list(entries.values())
+
+    def request(self, operation: str, account_id: AccountId, amount: USD) -> OutboxEntry:
+        '''
+        a new request, with an ID of its own, to try against the Bank at once
+        (see `apply()`) and `accept()` here if the database does not answer
+        '''
+        if operation not in (DEPOSIT, WITHDRAW):
+            raise ValueError(f'no such operation: {operation}')
+        if amount < USD(1):
+            raise ValueError('amount must be positive')
+        return OutboxEntry(uuid4().hex, operation, account_id, amount, self._clock.utcnow())
+
+    def deposit(self, account_id: AccountId, amount: USD) -> OutboxEntry:
+        return self.accept(self.request(DEPOSIT, account_id, amount))
+
+    def withdraw(self, account_id: AccountId, amount: USD) -> OutboxEntry:
+        '''
+        :raises ValueError: when the account's waiting withdrawals would
+        exceed the offline limit
+        '''
+        return self.accept(self.request(WITHDRAW, account_id, amount))
+
+    def accept(self, entry: OutboxEntry) -> OutboxEntry:
+        '''
+        Make the request wait here to be applied; durable when this returns.
+
+        :raises ValueError: when the request is a withdrawal that would take
+        the account's waiting withdrawals beyond the offline limit
+        '''
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('outbox is closed')
+            if entry.operation == WITHDRAW:
+                waiting = sum(
+                    (e.amount for (_, e) in self._pending
+                        if e.operation == WITHDRAW and e.account_id == entry.account_id),
+                    USD.ZERO)
+                if self._offline_limit < waiting + entry.amount:
+                    raise ValueError(
+                        f'cannot withdraw more than {self._offline_limit} '
+                        f'until the database answers')
+
+            self._write(entry.to_json())
+            line = self._written
+            self._pending.append((line, entry))
+            self._accepted += 1
+            self._condition.notify_all()
+            while self._synced < line:
+                self._condition.wait()
+        return entry
+
+    def _write(self, o: dict):
+        self._file.write(json.dumps(o) + '\n')
+        self._written += 1
+
+    def _sync(self):
+        '''fsync everything written, every flush interval, until closed'''
+        while True:
+            with self._condition:
+                while self._synced == self._written and not self._closed:
+                    self._condition.wait()
+                if self._synced == self._written:
+                    return
+            ## let more requests join this fsync
+            sleep(self._flush_interval)
+            with self._condition:
+                written = self._written
+                self._file.flush()
+                fileno = self._file.fileno()
+            os.fsync(fileno)
+            with self._condition:
+                self._synced = max(self._synced, written)
+                self._condition.notify_all()
+
+    def next_pending(self, timeout: timedelta | None = None) -> OutboxEntry | None:
+        '''the oldest waiting request, waiting up to `timeout` for one'''
+        with self._condition:
+            ready = lambda: self._pending and self._pending[0][0] <= self._synced
+            self._condition.wait_for(
+                lambda: ready() or self._closed,
+                None if timeout is None else timeout.total_seconds())
+            return self._pending[0][1] if ready() else None
+
+    def is_waiting(self, account_id: AccountId) -> bool:
+        '''whether any request for the account is waiting to be applied'''
+        with self._condition:
+            return any(e.account_id == account_id for (_, e) in self._pending)
+
+    def done(self, request_id: str, refused: str | None = None):
+        '''the request has been applied (or refused); stop it waiting'''
+        with self._condition:
+            self._pending = deque(
+                (line, e) for (line, e) in self._pending if e.request_id != request_id)
+            if refused is None:
+                self._applied += 1
+            else:
+                self._refused += 1
+
+            if self._pending:
+                ## synced with the next request; until then a crash only
+                ## means the request is skipped by the database next time
+                self._write({'done': request_id})
+            else:
+                ## nothing is waiting, so the file can start again
+                self._file.flush()
+                self._file.truncate(0)
+                os.fsync(self._file.fileno())
+
+    def metrics(self) -> OutboxMetrics:
+        with self._condition:
+            lag = timedelta(0)
+            if self._pending:
+                lag = self._clock.utcnow() - self._pending[0][1].accepted_at
+            return OutboxMetrics(
+                len(self._pending),
+                lag,
+                self._accepted,
+                self._applied,
+                self._refused)
+
+    def close(self):
+        '''sync and close the file; waiting requests stay for next time'''
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._syncer.join()
+        self._file.close()
+
+def _cut_torn_line(path: str):
+    '''
+    Drop a last line left unfinished by a crash mid-write, so that the next
+    line appended starts a line of its own; it was never acknowledged.
+    '''
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        content = f.read()
+        end = content.rfind(b'\n') + 1
+        if end == len(content):
+            return
+        f.truncate(end)
+        f.flush()
+        os.fsync(f.fileno())
+
+class Replayer:
+    '''applies an Outbox's requests to a Bank, on a thread of its own'''
+    def __init__(
+            self,
+            outbox: Outbox,
+            database_factory: Callable[[], BankDatabase],
+            clock: Clock,
+            events: EventPublisher | None = None,
+            retry_interval: timedelta = DEFAULT_RETRY_INTERVAL,
+            on_refused: Callable[[OutboxEntry, str], None] | None = None):
+        '''
+        `database_factory()` must return a BankDatabase that is also an
+        AppliedRequestLog; a new one is opened after any error.
+        `on_refused(entry, reason)` is called on the replayer's thread for
+        each request the Bank refuses.
+        '''
+        self._outbox = outbox
+        self._database_factory = database_factory
+        self._clock = clock
+        self._events = events
+        self._retry_interval = retry_interval.total_seconds()
+        self._on_refused = on_refused
+        self._stopping = Event()
+        self.last_error: Exception | None = None
+
+        self._thread = Thread(target=self._run, name='outbox-replay', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _exc_type, _exc_value, _traceback):
+        self.close()
+
+    def close(self):
+        '''stop after the request in progress, if any'''
+        self._stopping.set()
+        self._thread.join()
+
+    def _run(self):
+        db = None
+        while not self._stopping.is_set():
+            entry = self._outbox.next_pending(_REPLAY_POLL_INTERVAL)
+            if entry is None or self._stopping.is_set():
+                continue
+
+            try:
+                if db is None:
+                    db = self._database_factory().__enter__()
+                refused = replay(Bank(db, self._clock, self._events), entry)
+            except Exception as exc:
+                self.last_error = exc
+                if db is not None:
+                    db.__exit__(type(exc), exc, exc.__traceback__)
+                    db = None
+                self._stopping.wait(self._retry_interval)
+                continue
+
+            self.last_error = None
+            self._outbox.done(entry.request_id, refused)
+            if refused is not None and self._on_refused:
+                self._on_refused(entry, refused)
+
+        if db is not None:
+            db.__exit__(None, None, None)
+
+def apply(bank: Bank, entry: OutboxEntry) -> AccountChange | None:
+    '''
+    Apply the request once, however often this is called, with its ID in the
+    same transaction; None when it already was applied.
+
+    :raises ValueError: when the Bank refuses it, recording nothing
+    '''
+    with bank.session() as s:
+        if s.mark_applied(entry.request_id):
+            return getattr(s, entry.operation)(entry.account_id, entry.amount)
+    return None
+
+def replay(bank: Bank, entry: OutboxEntry) -> str | None:
+    '''
+    Apply the request once, or record that the Bank refused it, so that it
+    is not tried again; returns why it was refused, or None.
+    '''
+    try:
+        apply(bank, entry)
+        return None
+    except ValueError as exc:
+        with bank.session() as s:
+            s.mark_applied(entry.request_id, str(exc))
+        return str(exc)
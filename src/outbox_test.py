@@ -0,0 +1,277 @@
+from datetime import datetime, timedelta, timezone
+import os
+from tempfile import TemporaryDirectory
+import time
+import unittest
+
+from domain import *
+from memory import BankMemoryDatabase
+from outbox import *
+
+class FakeClock(Clock):
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def utcnow(self) -> datetime:
+        return self.now
+
+NOON = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+
+class FailingDatabase(BankMemoryDatabase):
+    '''refuses to start a transaction while `failing` is set'''
+    def __init__(self):
+        super().__init__()
+        self.failing = False
+
+    def start_serializable_transaction(self) -> None:
+        if self.failing:
+            raise ConnectionError('database is down')
+        super().start_serializable_transaction()
+
+def wait_until(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.005)
+
+class TestOutbox(unittest.TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'teller.outbox')
+        self.clock = FakeClock(NOON)
+        self.outbox = Outbox(self.path, self.clock)
+
+    def tearDown(self):
+        self.outbox.close()
+        self.directory.cleanup()
+
+    def test_deposit_survives_reopening(self):
+        ## Arrange
+        entry = self.outbox.deposit(12, USD(10_00))
+        self.outbox.close()
+
+        ## Act
+        self.outbox = Outbox(self.path, self.clock)
+
+        ## Assert
+        pending = self.outbox.next_pending(timedelta(0))
+        self.assertEqual(entry.request_id, pending.request_id)
+        self.assertEqual((DEPOSIT, 12, USD(10_00), NOON), (
+            pending.operation,
+            pending.account_id,
+            pending.amount,
+            pending.accepted_at))
+
+    def test_done_not_reloaded(self):
+        ## Arrange
+        first = self.outbox.deposit(12, USD(10_00))
+        second = self.outbox.deposit(13, USD(20_00))
+        self.outbox.done(first.request_id)
+        self.outbox.close()
+
+        ## Act
+        self.outbox = Outbox(self.path, self.clock)
+
+        ## Assert
+        self.assertEqual(second.request_id, self.outbox.next_pending(timedelta(0)).request_id)
+        self.assertEqual(1, self.outbox.metrics().depth)
+
+    def test_done_truncates_when_nothing_waits(self):
+        ## Arrange
+        entry = self.outbox.deposit(12, USD(10_00))
+
+        ## Act
+        self.outbox.done(entry.request_id)
+
+        ## Assert
+        self.assertEqual(0, os.path.getsize(self.path))
+        self.assertIsNone(self.outbox.next_pending(timedelta(0)))
+
+    def test_torn_last_line_ignored(self):
+        ## Arrange
+        first = self.outbox.deposit(12, USD(10_00))
+        self.outbox.close()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('{"request_id": "tor')
+        self.outbox = Outbox(self.path, self.clock)
+        second = self.outbox.deposit(13, USD(20_00))
+        self.outbox.close()
+
+        ## Act
+        self.outbox = Outbox(self.path, self.clock)
+
+        ## Assert
+        self.assertEqual(2, self.outbox.metrics().depth)
+        self.assertEqual(first.request_id, self.outbox.next_pending(timedelta(0)).request_id)
+        self.outbox.done(first.request_id)
+        self.assertEqual(second.request_id, self.outbox.next_pending(timedelta(0)).request_id)
+
+    def test_amount_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            self.outbox.deposit(12, USD.ZERO)
+        with self.assertRaises(ValueError):
+            self.outbox.withdraw(12, USD(-1_00))
+
+    def test_withdraw_beyond_offline_limit(self):
+        ## Arrange
+        self.outbox.withdraw(12, USD(150_00))
+        self.outbox.withdraw(13, USD(150_00))
+
+        ## Act & Assert
+        with self.assertRaises(ValueError):
+            self.outbox.withdraw(12, USD(50_01))
+        self.outbox.withdraw(12, USD(50_00))
+        self.assertEqual(3, self.outbox.metrics().depth)
+
+    def test_request_accepted_later(self):
+        ## Arrange
+        entry = self.outbox.request(WITHDRAW, 12, USD(150_00))
+        self.assertEqual(0, self.outbox.metrics().depth)
+
+        ## Act
+        self.outbox.accept(entry)
+
+        ## Assert
+        self.assertEqual(entry.request_id, self.outbox.next_pending(timedelta(0)).request_id)
+        with self.assertRaises(ValueError):
+            self.outbox.accept(self.outbox.request(WITHDRAW, 12, USD(50_01)))
+
+    def test_is_waiting(self):
+        ## Arrange
+        entry = self.outbox.deposit(12, USD(10_00))
+
+        ## Act & Assert
+        self.assertTrue(self.outbox.is_waiting(12))
+        self.assertFalse(self.outbox.is_waiting(13))
+        self.outbox.done(entry.request_id)
+        self.assertFalse(self.outbox.is_waiting(12))
+
+    def test_metrics(self):
+        ## Arrange
+        self.outbox.deposit(12, USD(10_00))
+        self.clock.now = NOON + timedelta(seconds=30)
+        self.outbox.deposit(13, USD(10_00))
+
+        ## Act
+        metrics = self.outbox.metrics()
+
+        ## Assert
+        self.assertEqual(2, metrics.depth)
+        self.assertEqual(timedelta(seconds=30), metrics.replay_lag)
+        self.assertEqual(2, metrics.accepted)
+
+class TestApply(unittest.TestCase):
+    def setUp(self):
+        self.db = BankMemoryDatabase()
+        self.clock = FakeClock(NOON)
+        self.bank = Bank(self.db, self.clock)
+        self.frank = self.bank.open_account('Frank the Cat')
+
+    def test_applied_once(self):
+        ## Arrange
+        entry = OutboxEntry('r1', DEPOSIT, self.frank.id, USD(10_00), NOON)
+
+        ## Act
+        first = apply(self.bank, entry)
+        second = apply(self.bank, entry)
+
+        ## Assert
+        self.assertEqual(USD(10_00), first.after.balance)
+        self.assertIsNone(second)
+        self.assertEqual(USD(10_00), self.bank.load(self.frank.id).balance)
+
+    def test_refused_records_nothing(self):
+        ## Arrange
+        entry = OutboxEntry('r1', WITHDRAW, self.frank.id, USD(10_00), NOON)
+
+        ## Act & Assert
+        with self.assertRaises(ValueError):
+            apply(self.bank, entry)
+        self.bank.deposit(self.frank.id, USD(50_00))
+        self.assertEqual(USD(40_00), apply(self.bank, entry).after.balance)
+
+    def test_replay_records_refusal(self):
+        ## Arrange
+        entry = OutboxEntry('r1', WITHDRAW, self.frank.id, USD(10_00), NOON)
+
+        ## Act
+        refused = replay(self.bank, entry)
+
+        ## Assert
+        self.assertIsNotNone(refused)
+        self.assertEqual(USD.ZERO, self.bank.load(self.frank.id).balance)
+        self.bank.deposit(self.frank.id, USD(50_00))
+        self.assertIsNone(replay(self.bank, entry))
+        self.assertEqual(USD(50_00), self.bank.load(self.frank.id).balance)
+
+    def test_mark_applied_rolled_back_with_transaction(self):
+        ## Arrange
+        self.db.start_serializable_transaction()
+        self.assertTrue(self.db.mark_applied('r1', None, NOON))
+
+        ## Act
+        self.db.rollback_transaction()
+
+        ## Assert
+        self.assertTrue(self.db.mark_applied('r1', None, NOON))
+        self.assertFalse(self.db.mark_applied('r1', None, NOON))
+
+class TestReplayer(unittest.TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.clock = FakeClock(NOON)
+        self.outbox = Outbox(os.path.join(self.directory.name, 'teller.outbox'), self.clock)
+        self.db = FailingDatabase()
+        self.bank = Bank(self.db, self.clock)
+        self.frank = self.bank.open_account('Frank the Cat')
+
+    def tearDown(self):
+        self.outbox.close()
+        self.directory.cleanup()
+
+    def test_drains_in_order(self):
+        ## Arrange
+        self.outbox.deposit(self.frank.id, USD(30_00))
+        self.outbox.withdraw(self.frank.id, USD(20_00))
+        self.outbox.withdraw(self.frank.id, USD(20_00))
+        refusals = []
+
+        ## Act
+        with Replayer(
+                self.outbox,
+                lambda: self.db,
+                self.clock,
+                on_refused=lambda entry, reason: refusals.append(entry.amount)):
+            wait_until(lambda: self.outbox.metrics().depth == 0)
+
+        ## Assert
+        self.assertEqual(USD(10_00), self.bank.load(self.frank.id).balance)
+        self.assertEqual([USD(20_00)], refusals)
+        metrics = self.outbox.metrics()
+        self.assertEqual((3, 2, 1), (metrics.accepted, metrics.applied, metrics.refused))
+
+    def test_waits_for_database(self):
+        ## Arrange
+        self.db.failing = True
+        self.outbox.deposit(self.frank.id, USD(30_00))
+        self.clock.now = NOON + timedelta(seconds=5)
+
+        ## Act
+        with Replayer(
+                self.outbox,
+                lambda: self.db,
+                self.clock,
+                retry_interval=timedelta(milliseconds=10)) as replayer:
+            wait_until(lambda: replayer.last_error is not None)
+            metrics = self.outbox.metrics()
+            self.db.failing = False
+            wait_until(lambda: self.outbox.metrics().depth == 0)
+
+        ## Assert
+        self.assertEqual(1, metrics.depth)
+        self.assertEqual(timedelta(seconds=5), metrics.replay_lag)
+        self.assertEqual(USD(30_00), self.bank.load(self.frank.id).balance)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+'''
+Deletes the rows of the withdrawal log and the applied request log that are
+no longer needed, e.g.
+
+    python src/purge.py --withdrawal-retention-days 2 --request-retention-days 30
+
+A withdrawal is needed only while it may still count against a limit, so
+the withdrawal retention must be at least the longest window of any
+VelocityLimit (velocity.py).  An applied request is needed only while an
+outbox (outbox.py) may still replay it, so the request retention must be
+longer than any teller stays offline; a request replayed after its row is
+gone would be applied twice.
+
+Rows are deleted a small batch at a time, each batch in its own short
+transaction with a pause after it, like archive.py.  The job can be stopped
+and run again at any time.
+'''
+import argparse
+from datetime import datetime, timedelta
+from time import sleep
+from typing import Callable
+
+from domain import BankDatabase, Clock, SystemClock
+
+DEFAULT_WITHDRAWAL_RETENTION = timedelta(days=2)
+DEFAULT_REQUEST_RETENTION = timedelta(days=30)
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_PAUSE = timedelta(milliseconds=50)
+
+class Purger:
+    def __init__(
+            self,
+            database_factory: Callable[[], BankDatabase],
+            clock: Clock,
+            withdrawal_retention: timedelta = DEFAULT_WITHDRAWAL_RETENTION,
+            request_retention: timedelta = DEFAULT_REQUEST_RETENTION,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            pause: timedelta = DEFAULT_PAUSE):
+        '''
+        `database_factory()` must return a BankDatabase that is also a
+        WithdrawalLog and an AppliedRequestLog.
+        '''
+        if batch_size <= 0:
+            raise ValueError(f'batch_size must be positive (it was {batch_size})')
+
+        self._database_factory = database_factory
+        self._clock = clock
+        self._withdrawal_retention = withdrawal_retention
+        self._request_retention = request_retention
+        self._batch_size = batch_size
+        self._pause = pause.total_seconds()
+
+    def run(self) -> tuple[int, int]:
+        '''purge every row due; returns how many withdrawals and requests'''
+        now = self._clock.utcnow()
+        with self._database_factory() as db:
+            withdrawals = self._purge(
+                db,
+                db.purge_withdrawals_before,
+                now - self._withdrawal_retention)
+            requests = self._purge(
+                db,
+                db.purge_applied_before,
+                now - self._request_retention)
+        return (withdrawals, requests)
+
+    def _purge(
+            self,
+            db: BankDatabase,
+            purge: Callable[[datetime, int], int],
+            before: datetime) -> int:
+        '''call `purge(before, batch_size)` until it deletes a short batch'''
+        purged = 0
+        while True:
+            db.start_serializable_transaction()
+            try:
+                count = purge(before, self._batch_size)
+                db.commit_transaction()
+            except:
+                db.rollback_transaction()
+                raise
+
+            purged += count
+            if count < self._batch_size:
+                return purged
+            ## let other transactions at the table in between batches
+            sleep(self._pause)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='delete withdrawal and applied request log rows no longer needed')
+    parser.add_argument(
+        '--withdrawal-retention-days',
+        type=int,
+        default=DEFAULT_WITHDRAWAL_RETENTION.days,
+        help='keep withdrawals logged within this many days')
+    parser.add_argument(
+        '--request-retention-days',
+        type=int,
+        default=DEFAULT_REQUEST_RETENTION.days,
+        help='keep requests applied within this many days')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        '--memory',
+        action='store_true',
+        help='use an empty in-process database instead of MySQL')
+    args = parser.parse_args()
+
+    if args.memory:
+        from memory import BankMemoryDatabase
+        database_factory = BankMemoryDatabase
+    else:
+        from database import BankMySqlDatabase
+        database_factory = BankMySqlDatabase
+
+    (withdrawals, requests) = Purger(
+        database_factory,
+        SystemClock(),
+        timedelta(days=args.withdrawal_retention_days),
+        timedelta(days=args.request_retention_days),
+        args.batch_size).run()
+    print(f'{withdrawals} withdrawals and {requests} applied requests purged')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+import unittest
+
+from domain import *
+from memory import BankMemoryDatabase
+from purge import *
+
+class FakeClock(Clock):
+    def __init__(self, value: datetime):
+        self.value = value
+
+    def utcnow(self):
+        return self.value
+
+class TestPurger(unittest.TestCase):
+    def setUp(self):
+        self.now = datetime(2026, 10, 1, tzinfo=timezone.utc)
+        self.db = BankMemoryDatabase()
+        self.recent = self.now - timedelta(hours=1)
+        self.db.insert_withdrawals([
+            (1, USD(1_00), self.now - timedelta(days=5)),
+            (2, USD(2_00), self.now - timedelta(days=3)),
+            (3, USD(3_00), self.now - timedelta(days=3)),
+            (1, USD(4_00), self.recent),
+            ])
+        for (request_id, days_ago) in [('r1', 40), ('r2', 31), ('r3', 1)]:
+            self.db.mark_applied(request_id, None, self.now - timedelta(days=days_ago))
+
+    def purger(self) -> Purger:
+        return Purger(
+            lambda: self.db,
+            FakeClock(self.now),
+            timedelta(days=2),
+            timedelta(days=30),
+            batch_size=2,
+            pause=timedelta(0))
+
+    def test_purges_old_rows(self):
+        ## Act
+        purged = self.purger().run()
+
+        ## Assert
+        self.assertEqual((3, 2), purged)
+        self.assertEqual(
+            [(1, USD(4_00), self.recent)],
+            self.db.select_withdrawals_since(self.now - timedelta(days=10)))
+        self.assertTrue(self.db.mark_applied('r1', None, self.now))
+        self.assertFalse(self.db.mark_applied('r3', None, self.now))
+
+    def test_run_again_purges_nothing(self):
+        ## Arrange
+        self.purger().run()
+
+        ## Act & Assert
+        self.assertEqual((0, 0), self.purger().run())
+
+    def test_rollback_restores_rows(self):
+        ## Act
+        self.db.start_serializable_transaction()
+        self.db.purge_withdrawals_before(self.now, 10)
+        self.db.purge_applied_before(self.now, 10)
+        self.db.rollback_transaction()
+
+        ## Assert
+        self.assertEqual(4, len(self.db.select_withdrawals_since(self.now - timedelta(days=10))))
+        self.assertFalse(self.db.mark_applied('r1', None, self.now))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,335 @@
+'''
+Checks stored accounts, looking again only at what changed since last time.
+
+    python src/reconcile.py --snapshot reconcile.json
+    python src/reconcile.py --compare-replica 127.0.0.1:3307
+
+Accounts are divided into ranges of `range_size` consecutive IDs.  Each
+range's checksum is the number of accounts in it and the sum of a CRC-32 of
+each account's `id|balance_usd_cents|closed_at_utc` (closed_at_utc in
+microseconds since 1970, or empty while open).  The database computes these
+itself, one range per short read-only transaction, several at once.  The
+checksums are the leaves of a Merkle tree.
+
+With a snapshot, every range whose checksum differs from the snapshot's is
+verified, account by account: no balance may be negative, and a closed
+account must have a zero balance.  Then the snapshot is replaced.
+
+Comparing two databases (a primary and its replica, or copies from before
+and after a migration) walks down their trees to the ranges that differ,
+then compares those ranges account by account.
+'''
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+import json
+import os
+import sys
+from threading import local
+from typing import Callable
+
+from domain import USD, Account, AccountId, BankDatabase
+from storage import RangeChecksum, ReconcileDatabase, account_crc, checksum_of
+
+DEFAULT_RANGE_SIZE = 1000
+## one worker per connection in the BankMySqlDatabase connection pool
+DEFAULT_WORKERS = 3
+
+class MerkleTree:
+    '''a hash tree over a list of range checksums'''
+    def __init__(self, leaves: list[RangeChecksum]):
+        self.leaves = leaves
+        level = [
+            sha256(f'{i}|{count}|{crcs}'.encode('utf-8')).digest()
+            for (i, (count, crcs)) in enumerate(leaves)
+            ] or [sha256(b'').digest()]
+        ## levels[0] holds the leaves' hashes, levels[-1] the root alone
+        self.levels = [level]
+        while len(level) > 1:
+            if len(level) % 2:
+                level = level + [level[-1]]
+            level = [
+                sha256(level[i] + level[i + 1]).digest()
+                for i in range(0, len(level), 2)
+                ]
+            self.levels.append(level)
+
+    @property
+    def root(self) -> str:
+        return self.levels[-1][0].hex()
+
+    def differing_leaves(self, other: 'MerkleTree') -> list[int]:
+        '''
+        indexes of the leaves that differ from `other`'s, found by descending
+        only into subtrees whose hashes differ
+        '''
+        if len(self.leaves) != len(other.leaves) or len(self.levels) != len(other.levels):
+            ## differently shaped trees share no subtrees; compare every leaf
+            n = max(len(self.leaves), len(other.leaves))
+            return [
+                i for i in range(n)
+                if _leaf(self.leaves, i) != _leaf(other.leaves, i)
+                ]
+
+        suspects = [0]
+        for depth in range(len(self.levels) - 1, -1, -1):
+            mine = self.levels[depth]
+            theirs = other.levels[depth]
+            differing = [i for i in suspects if i < len(mine) and mine[i] != theirs[i]]
+            if depth == 0:
+                return [i for i in differing if i < len(self.leaves)]
+            suspects = [child for i in differing for child in (2 * i, 2 * i + 1)]
+        return []
+
+def _leaf(leaves: list[RangeChecksum], i: int) -> RangeChecksum:
+    return leaves[i] if i < len(leaves) else (0, 0)
+
+class Mismatch:
+    '''a problem with one account'''
+    def __init__(self, account_id: AccountId, problem: str):
+        self.account_id = account_id
+        self.problem = problem
+
+    def __repr__(self):
+        return f'Mismatch({self.account_id}, {self.problem!r})'
+
+    def __str__(self):
+        return f'account {self.account_id}: {self.problem}'
+
+def account_problems(account: Account) -> list[str]:
+    '''the rules a stored account breaks'''
+    problems = []
+    if account.balance < USD.ZERO:
+        problems.append(f'negative balance {account.balance}')
+    if not account.is_open and account.balance != USD.ZERO:
+        problems.append(f'closed with balance {account.balance}')
+    return problems
+
+class ReconcileReport:
+    def __init__(
+            self,
+            root: str,
+            ranges: int,
+            verified_ranges: list[int],
+            mismatches: list[Mismatch]):
+        self.root = root
+        self.ranges = ranges
+        self.verified_ranges = verified_ranges
+        self.mismatches = mismatches
+
+    def __repr__(self):
+        return (
+            f'ReconcileReport(root={self.root!r}, ranges={self.ranges}, '
+            f'verified_ranges={len(self.verified_ranges)}, '
+            f'mismatches={self.mismatches})')
+
+class Reconciler:
+    def __init__(
+            self,
+            database_factory: Callable[[], BankDatabase],
+            range_size: int = DEFAULT_RANGE_SIZE,
+            workers: int = DEFAULT_WORKERS):
+        '''
+        `database_factory()` must return a BankDatabase that is also a
+        ReconcileDatabase; each worker opens its own.
+        '''
+        if range_size <= 0 or workers <= 0:
+            raise ValueError('range_size and workers must be positive')
+
+        self._database_factory = database_factory
+        self._range_size = range_size
+        self._workers = workers
+
+    def tree(self) -> MerkleTree:
+        '''checksum every range, from ID 0 to the largest account ID'''
+        with self._database_factory() as db:
+            bounds = db.account_id_bounds()
+        if bounds is None:
+            return MerkleTree([])
+
+        ranges = range(bounds[1] // self._range_size + 1)
+        return MerkleTree(self._in_parallel(self._checksum, ranges))
+
+    def _checksum(self, db, i: int) -> RangeChecksum:
+        first_id = i * self._range_size
+        return _read_only(db, lambda: db.range_checksum(first_id, first_id + self._range_size))
+
+    def _accounts(self, db, i: int) -> list[Account]:
+        first_id = i * self._range_size
+        end_id = first_id + self._range_size
+        page = _read_only(db, lambda: db.select_page(first_id - 1, self._range_size))
+        return [a for a in page if a.id < end_id]
+
+    def verify(self, ranges: list[int]) -> list[Mismatch]:
+        '''every account in the given ranges that breaks a rule'''
+        mismatches = []
+        for accounts in self._in_parallel(self._accounts, ranges):
+            for a in accounts:
+                mismatches.extend(Mismatch(a.id, p) for p in account_problems(a))
+        return mismatches
+
+    def run(self, snapshot_path: str | None = None) -> ReconcileReport:
+        '''
+        Verify every range that changed since the snapshot (or every range,
+        without one), then save a new snapshot.
+        '''
+        tree = self.tree()
+        previous = _load_snapshot(snapshot_path, self._range_size)
+        if previous is None:
+            changed = list(range(len(tree.leaves)))
+        else:
+            changed = tree.differing_leaves(previous)
+            changed = [i for i in changed if i < len(tree.leaves)]
+
+        mismatches = self.verify(changed)
+        if snapshot_path:
+            _save_snapshot(snapshot_path, self._range_size, tree)
+        return ReconcileReport(tree.root, len(tree.leaves), changed, mismatches)
+
+    def compare(self, other: 'Reconciler') -> list[Mismatch]:
+        '''every account that differs between this database and `other`'s'''
+        if other._range_size != self._range_size:
+            raise ValueError('both databases must be checksummed with one range_size')
+
+        with ThreadPoolExecutor(2) as both:
+            (mine, theirs) = both.map(lambda r: r.tree(), [self, other])
+        differing = mine.differing_leaves(theirs)
+
+        mismatches = []
+        pairs = zip(
+            self._in_parallel(self._accounts, differing),
+            other._in_parallel(other._accounts, differing))
+        for (my_accounts, their_accounts) in pairs:
+            mine_by_id = {a.id: a for a in my_accounts}
+            theirs_by_id = {a.id: a for a in their_accounts}
+            for account_id in sorted(mine_by_id.keys() | theirs_by_id.keys()):
+                problem = _difference(
+                    mine_by_id.get(account_id),
+                    theirs_by_id.get(account_id))
+                if problem:
+                    mismatches.append(Mismatch(account_id, problem))
+        return mismatches
+
+    def _in_parallel(self, work: Callable, items) -> list:
+        '''`work(db, item)` for each item, by workers each with their own db'''
+        opened = []
+        per_thread = local()
+
+        def run(item):
+            if not hasattr(per_thread, 'db'):
+                per_thread.db = self._database_factory().__enter__()
+                opened.append(per_thread.db)
+            return work(per_thread.db, item)
+
+        try:
+            with ThreadPoolExecutor(self._workers) as pool:
+                return list(pool.map(run, items))
+        finally:
+            for db in opened:
+                db.__exit__(None, None, None)
+
+def _read_only(db: BankDatabase, work: Callable):
+    db.start_read_only_transaction()
+    try:
+        result = work()
+        db.commit_transaction()
+        return result
+    except:
+        db.rollback_transaction()
+        raise
+
+def _difference(mine: Account | None, theirs: Account | None) -> str | None:
+    if theirs is None:
+        return 'missing from the other database'
+    if mine is None:
+        return 'missing from this database'
+
+    differences = [
+        f'{field} {getattr(mine, field)} != {getattr(theirs, field)}'
+        for field in ['full_name', 'balance', 'closed_at']
+        if getattr(mine, field) != getattr(theirs, field)
+        ]
+    return '; '.join(differences) or None
+
+def _load_snapshot(path: str | None, range_size: int) -> MerkleTree | None:
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        saved = json.load(f)
+    if saved['range_size'] != range_size:
+        return None
+    return MerkleTree([tuple(leaf) for leaf in saved['leaves']])
+
+def _save_snapshot(path: str, range_size: int, tree: MerkleTree):
+    temporary = path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(
+            {
+                'range_size': range_size,
+                'root': tree.root,
+                'leaves': tree.leaves,
+            },
+            f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='verify stored accounts, or compare two databases')
+    parser.add_argument(
+        '--snapshot',
+        help='checksums from the last run; only ranges changed since are verified')
+    parser.add_argument(
+        '--compare-replica',
+        metavar='HOST:PORT',
+        help='instead, compare the database with a copy at HOST:PORT; '
+            'exits 2 if either cannot be read')
+    parser.add_argument('--range-size', type=int, default=DEFAULT_RANGE_SIZE)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument(
+        '--memory',
+        action='store_true',
+        help='use an empty in-process database instead of MySQL')
+    args = parser.parse_args()
+
+    if args.memory:
+        from memory import BankMemoryDatabase
+        shared = BankMemoryDatabase()
+        database_factory = lambda: shared
+    else:
+        from database import POOL_SIZE, BankMySqlDatabase
+        if args.workers > POOL_SIZE:
+            parser.error(
+                f'--workers cannot exceed the {POOL_SIZE} connections '
+                f'in the database connection pool')
+        database_factory = BankMySqlDatabase
+    reconciler = Reconciler(database_factory, args.range_size, args.workers)
+
+    if args.compare_replica:
+        from database import BankMySqlDatabase
+        (host, port) = args.compare_replica.rsplit(':', 1)
+        ## connected to directly, not as a replica, which reads would bypass
+        ## (for the primary) whenever it lags or cannot be reached
+        other = Reconciler(
+            lambda: BankMySqlDatabase(host=host, port=int(port)),
+            args.range_size,
+            args.workers)
+        try:
+            mismatches = reconciler.compare(other)
+        except Exception as exc:
+            print(f'ERROR cannot compare with {args.compare_replica}: {exc}', file=sys.stderr)
+            sys.exit(2)
+    else:
+        report = reconciler.run(args.snapshot)
+        print(
+            f'{report.ranges} ranges, {len(report.verified_ranges)} verified, '
+            f'root {report.root}')
+        mismatches = report.mismatches
+
+    for mismatch in mismatches:
+        print(mismatch)
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import os
+from tempfile import TemporaryDirectory
+import unittest
+
+from domain import *
+from memory import BankMemoryDatabase
+from reconcile import *
+
+class TestMerkleTree(unittest.TestCase):
+    def test_equal_trees_have_equal_roots(self):
+        leaves = [(i, i * 7) for i in range(5)]
+        self.assertEqual(MerkleTree(leaves).root, MerkleTree(list(leaves)).root)
+        self.assertEqual([], MerkleTree(leaves).differing_leaves(MerkleTree(leaves)))
+
+    def test_differing_leaves(self):
+        ## Arrange
+        leaves = [(i, i * 7) for i in range(13)]
+        changed = list(leaves)
+        changed[2] = (2, 15)
+        changed[12] = (0, 0)
+
+        ## Act
+        actual = MerkleTree(leaves).differing_leaves(MerkleTree(changed))
+
+        ## Assert
+        self.assertEqual([2, 12], actual)
+        self.assertNotEqual(MerkleTree(leaves).root, MerkleTree(changed).root)
+
+    def test_differing_leaves_of_different_sizes(self):
+        ## Act
+        actual = MerkleTree([(1, 1), (1, 2)]).differing_leaves(
+            MerkleTree([(1, 1), (1, 3), (1, 4)]))
+
+        ## Assert
+        self.assertEqual([1, 2], actual)
+
+class TestReconciler(unittest.TestCase):
+    def setUp(self):
+        self.db = BankMemoryDatabase()
+        self.bank = Bank(self.db, SystemClock())
+        self.accounts = self.bank.open_accounts([f'Frank {i}' for i in range(25)])
+        for a in self.accounts:
+            self.bank.deposit(a.id, USD(10_00))
+        self.directory = TemporaryDirectory()
+        self.snapshot = os.path.join(self.directory.name, 'reconcile.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def reconciler(self, db=None):
+        db = db or self.db
+        return Reconciler(lambda: db, range_size=10, workers=2)
+
+    def test_range_checksum(self):
+        ## Arrange
+        first_id = self.accounts[0].id
+
+        ## Act
+        actual = self.db.range_checksum(first_id, first_id + 3)
+
+        ## Assert
+        self.assertEqual(checksum_of([self.bank.load(first_id + i) for i in range(3)]), actual)
+
+    def test_checksum_includes_closed_at(self):
+        a = self.accounts[0]
+        closed = Account(a.id, a.full_name, a.balance, SystemClock().utcnow())
+        self.assertNotEqual(account_crc(a), account_crc(closed))
+
+    def test_clean_database(self):
+        ## Act
+        report = self.reconciler().run(self.snapshot)
+
+        ## Assert
+        self.assertEqual([], report.mismatches)
+        self.assertEqual(report.ranges, len(report.verified_ranges))
+        self.assertTrue(os.path.exists(self.snapshot))
+
+    def test_only_changed_ranges_verified(self):
+        ## Arrange
+        self.reconciler().run(self.snapshot)
+        frank = self.accounts[12]
+        self.bank.deposit(frank.id, USD(1))
+
+        ## Act
+        report = self.reconciler().run(self.snapshot)
+
+        ## Assert
+        self.assertEqual([frank.id // 10], report.verified_ranges)
+        self.assertEqual([], report.mismatches)
+
+    def test_finds_broken_accounts(self):
+        ## Arrange
+        negative = self.accounts[4]
+        closed = self.accounts[17]
+        self.db.update_balance(negative.id, USD(-1_00))
+        self.db.update_closed_at(closed.id, SystemClock().utcnow())
+
+        ## Act
+        report = self.reconciler().run()
+
+        ## Assert
+        self.assertEqual(
+            [negative.id, closed.id],
+            [m.account_id for m in report.mismatches])
+
+    def copy(self) -> BankMemoryDatabase:
+        copy = BankMemoryDatabase()
+        copy.insert_many([
+            Account(None, a.full_name, a.balance, a.closed_at)
+            for a in self.db.select_page(0, len(self.accounts))
+            ])
+        return copy
+
+    def test_compare(self):
+        ## Arrange
+        copy = self.copy()
+        frank = self.accounts[21]
+        copy.update_balance(frank.id, USD.ZERO)
+        copy.update_closed_at(frank.id, SystemClock().utcnow())
+        copy.update_balance(self.accounts[2].id, USD(9_99))
+
+        ## Act
+        actual = self.reconciler().compare(self.reconciler(copy))
+
+        ## Assert
+        self.assertEqual(
+            [self.accounts[2].id, frank.id],
+            [m.account_id for m in actual])
+        self.assertIn('balance', actual[0].problem)
+        self.assertIn('closed_at', actual[1].problem)
+
+    def test_compare_identical(self):
+        copy = self.copy()
+        self.assertEqual([], self.reconciler().compare(self.reconciler(copy)))
+
+if __name__ == '__main__':
+    unittest.main()
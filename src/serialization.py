@@ -0,0 +1,44 @@
+'''
+The JSON form of accounts, changes and amounts, shared by the HTTP API
+(server.py) and the batch job (batch.py).  Money is always an integer
+number of cents.
+'''
+from datetime import datetime
+
+from domain import USD, Account, AccountChange
+
+def account_json(account: Account | None) -> dict | None:
+    if account is None:
+        return None
+    return {
+        'id': account.id,
+        'full_name': account.full_name,
+        'balance_usd_cents': account.balance.total_cents,
+        'closed_at_utc': iso(account.closed_at),
+        'is_open': account.is_open,
+        }
+
+def iso(when: datetime | None) -> str | None:
+    return None if when is None else when.isoformat()
+
+def change_json(change: AccountChange) -> dict:
+    return {
+        'before': account_json(change.before),
+        'after': account_json(change.after),
+        }
+
+def result_json(result: Account | AccountChange) -> dict:
+    if isinstance(result, AccountChange):
+        return change_json(result)
+    return account_json(result)
+
+def amount_from_json(cents: object) -> USD:
+    '''
+    :raises ValueError: unless `cents` is a positive whole number (and not
+    a bool, which Python counts as one)
+    '''
+    if not isinstance(cents, int) or isinstance(cents, bool) or cents <= 0:
+        raise ValueError(
+            f'amount_usd_cents must be a positive whole number of cents '
+            f'(it was {cents!r})')
+    return USD(cents)
@@ -0,0 +1,269 @@
+'''
+A local HTTP/JSON API for the Bank.
+
+Every operation is a POST of a JSON object to `/<operation>`, e.g.
+
+    POST /deposit   {"account_id": 12, "amount_usd_cents": 1000}
+
+and answers with JSON: an account for `open_account` and `load`, or
+`{"before": account, "after": account}` for the other operations.  Money is
+always an integer number of cents.  `POST /batch` takes
+`{"operations": [{"op": "deposit", ...}, ...]}` and answers with one result
+per operation, run in order by a single worker.
+
+HTTP connections are handled by their own (cheap) threads and kept alive
+between requests, while Bank calls run on a bounded pool of workers, each
+with its own database connection.  When every worker is busy and the queue
+in front of them is full, requests are refused at once with 503.
+'''
+import argparse
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from threading import BoundedSemaphore, Lock, local
+from typing import Any, Callable
+
+from domain import USD, Bank, BankDatabase, Clock, SystemClock
+from serialization import account_json, amount_from_json, change_json
+from velocity import VelocityLimit, VelocityTracker
+
+## one worker per connection in the BankMySqlDatabase connection pool
+DEFAULT_WORKERS = 3
+
+## requests allowed to wait for a worker before the server answers 503
+DEFAULT_QUEUE_LIMIT = 32
+
+## the largest request body accepted, in bytes
+_MAX_BODY = 1 << 20
+
+class Saturated(Exception):
+    '''every worker is busy and the queue in front of them is full'''
+
+class BankWorkers:
+    '''
+    A bounded pool of threads, each holding its own database connection and
+    Bank.  At most `workers + queue_limit` calls are accepted at a time.
+    '''
+    def __init__(
+            self,
+            database_factory: Callable[[], BankDatabase],
+            clock: Clock,
+            workers: int = DEFAULT_WORKERS,
+            queue_limit: int = DEFAULT_QUEUE_LIMIT,
+            velocity: VelocityTracker | None = None):
+        self._database_factory = database_factory
+        self._clock = clock
+        self._velocity = velocity
+        self._local = local()
+        self._opened: list[BankDatabase] = []
+        self._opened_lock = Lock()
+        self._slots = BoundedSemaphore(workers + queue_limit)
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix='bank-worker')
+
+    def _bank(self) -> Bank:
+        '''
+        the worker thread's Bank, opening its database on first use; an open
+        that fails fails only the call, and the next call tries again
+        '''
+        bank = getattr(self._local, 'bank', None)
+        if bank is None:
+            db = self._database_factory().__enter__()
+            with self._opened_lock:
+                self._opened.append(db)
+            bank = self._local.bank = Bank(db, self._clock, velocity=self._velocity)
+        return bank
+
+    def submit(self, work: Callable[[Bank], Any]) -> Future:
+        '''
+        Run `work(bank)` on a worker.
+
+        :raises Saturated: instead of waiting, when the pool is full
+        '''
+        if not self._slots.acquire(blocking=False):
+            raise Saturated()
+
+        try:
+            future = self._executor.submit(lambda: work(self._bank()))
+        except:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        with self._opened_lock:
+            for db in self._opened:
+                db.__exit__(None, None, None)
+            self._opened.clear()
+
+class NotFound(Exception):
+    '''the requested operation or account does not exist'''
+
+def _load(bank: Bank, args: dict) -> dict:
+    account = bank.load(args['account_id'])
+    if account is None:
+        raise NotFound(f'no account {args["account_id"]}')
+    return account_json(account)
+
+## operation name -> (Bank, JSON arguments) -> JSON result
+OPERATIONS: dict[str, Callable[[Bank, dict], Any]] = {
+    'open_account': lambda bank, args:
+        account_json(bank.open_account(args['full_name'])),
+    'load': _load,
+    'deposit': lambda bank, args:
+        change_json(bank.deposit(
+            args['account_id'],
+            amount_from_json(args['amount_usd_cents']))),
+    'withdraw': lambda bank, args:
+        change_json(bank.withdraw(
+            args['account_id'],
+            amount_from_json(args['amount_usd_cents']))),
+    'close_account': lambda bank, args:
+        change_json(bank.close_account(args['account_id'])),
+    'alter_name': lambda bank, args:
+        change_json(bank.alter_name(args['account_id'], args['full_name'])),
+    }
+
+def perform(bank: Bank, operation: str, args: dict) -> Any:
+    if operation not in OPERATIONS:
+        raise NotFound(f'no such operation: {operation}')
+    return OPERATIONS[operation](bank, args)
+
+def perform_batch(bank: Bank, operations: list[dict]) -> list[dict]:
+    '''run each operation in turn; one failing does not stop the rest'''
+    results = []
+    for args in operations:
+        try:
+            results.append({'result': perform(bank, args.get('op'), args)})
+        except (ValueError, KeyError, TypeError, NotFound) as exc:
+            results.append({'error': error_message(exc)})
+    return results
+
+def error_message(exc: Exception) -> str:
+    if isinstance(exc, KeyError):
+        return f'missing argument {exc}'
+    return str(exc)
+
+class BankRequestHandler(BaseHTTPRequestHandler):
+    ## HTTP/1.1 keeps connections alive unless the client asks otherwise
+    protocol_version = 'HTTP/1.1'
+    server: 'BankHTTPServer'
+
+    def do_POST(self):
+        operation = self.path.strip('/')
+        try:
+            args = self._read_json()
+            if operation == 'batch':
+                operations = args['operations']
+                future = self.server.workers.submit(
+                    lambda bank: perform_batch(bank, operations))
+            else:
+                if operation not in OPERATIONS:
+                    raise NotFound(f'no such operation: {operation}')
+                future = self.server.workers.submit(
+                    lambda bank: perform(bank, operation, args))
+            self._reply(200, future.result())
+        except Saturated:
+            self._reply(503, {'error': 'server busy'}, {'Retry-After': '1'})
+        except NotFound as exc:
+            self._reply(404, {'error': str(exc)})
+        except (ValueError, KeyError, TypeError) as exc:
+            ## includes malformed JSON (json.JSONDecodeError is a ValueError)
+            self._reply(400, {'error': error_message(exc)})
+        except Exception as exc:
+            self._reply(500, {'error': str(exc)})
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get('Content-Length', 0))
+        if length > _MAX_BODY:
+            raise ValueError(f'request body exceeds {_MAX_BODY} bytes')
+        args = json.loads(self.rfile.read(length) or b'{}')
+        if not isinstance(args, dict):
+            raise ValueError('request body must be a JSON object')
+        return args
+
+    def _reply(self, status: int, body: Any, headers: dict | None = None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for (name, value) in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class BankHTTPServer(ThreadingHTTPServer):
+    def __init__(
+            self,
+            address: tuple[str, int],
+            workers: BankWorkers,
+            verbose: bool = False):
+        super().__init__(address, BankRequestHandler)
+        self.workers = workers
+        self.verbose = verbose
+
+    def server_close(self):
+        super().server_close()
+        self.workers.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Bank HTTP/JSON API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8102)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--queue-limit', type=int, default=DEFAULT_QUEUE_LIMIT)
+    parser.add_argument(
+        '--daily-withdrawal-limit',
+        type=USD.parse,
+        metavar='AMOUNT',
+        help="the most that may be withdrawn from an account in 24 hours, e.g. '$500.00'")
+    parser.add_argument(
+        '--memory',
+        action='store_true',
+        help='use an empty in-process database instead of MySQL')
+    args = parser.parse_args()
+
+    if args.memory:
+        from memory import BankMemoryDatabase
+        shared = BankMemoryDatabase()
+        database_factory = lambda: shared
+    else:
+        from database import POOL_SIZE, BankMySqlDatabase
+        if args.workers > POOL_SIZE:
+            parser.error(
+                f'--workers cannot exceed the {POOL_SIZE} connections '
+                f'in the database connection pool')
+        database_factory = BankMySqlDatabase
+
+    clock = SystemClock()
+    velocity = None
+    if args.daily_withdrawal_limit is not None:
+        velocity = VelocityTracker([
+            VelocityLimit(args.daily_withdrawal_limit, timedelta(hours=24))])
+        with database_factory() as db:
+            velocity.rebuild(db.select_withdrawals_since(
+                clock.utcnow() - velocity.longest_window))
+
+    workers = BankWorkers(
+        database_factory,
+        clock,
+        args.workers,
+        args.queue_limit,
+        velocity)
+    with BankHTTPServer((args.host, args.port), workers, verbose=True) as server:
+        print(f'listening on http://{args.host}:{server.server_port}/')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+from http.client import HTTPConnection
+import json
+from threading import Event, Thread
+import unittest
+
+from domain import *
+from memory import BankMemoryDatabase
+from server import *
+
+class BlockingDatabase(BankMemoryDatabase):
+    '''holds every select_by_id until `release` is set'''
+    def __init__(self):
+        super().__init__()
+        self.entered = Event()
+        self.release = Event()
+
+    def select_by_id(self, account_id):
+        self.entered.set()
+        self.release.wait()
+        return super().select_by_id(account_id)
+
+class TestBankHTTPServer(unittest.TestCase):
+    def start(self, db, workers=2, queue_limit=4, database_factory=None):
+        workers = BankWorkers(
+            database_factory or (lambda: db), SystemClock(), workers, queue_limit)
+        server = BankHTTPServer(('127.0.0.1', 0), workers)
+        thread = Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        self.addCleanup(stop)
+        return HTTPConnection('127.0.0.1', server.server_port)
+
+    def post(self, connection, path, body):
+        connection.request(
+            'POST',
+            path,
+            body=json.dumps(body),
+            headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return (response.status, json.loads(response.read()))
+
+    def test_operations_over_one_connection(self):
+        ## Arrange
+        connection = self.start(BankMemoryDatabase())
+
+        ## Act
+        (status, opened) = self.post(connection, '/open_account', {
+            'full_name': 'Frank the Cat'})
+        account_id = opened['id']
+        deposited = self.post(connection, '/deposit', {
+            'account_id': account_id, 'amount_usd_cents': 5_00})
+        withdrawn = self.post(connection, '/withdraw', {
+            'account_id': account_id, 'amount_usd_cents': 2_00})
+        renamed = self.post(connection, '/alter_name', {
+            'account_id': account_id, 'full_name': 'Frank'})
+        loaded = self.post(connection, '/load', {'account_id': account_id})
+
+        ## Assert
+        self.assertEqual(200, status)
+        self.assertEqual(200, deposited[0])
+        self.assertEqual(0, deposited[1]['before']['balance_usd_cents'])
+        self.assertEqual(5_00, deposited[1]['after']['balance_usd_cents'])
+        self.assertEqual(3_00, withdrawn[1]['after']['balance_usd_cents'])
+        self.assertEqual('Frank', renamed[1]['after']['full_name'])
+        self.assertEqual(
+            (200, {
+                'id': account_id,
+                'full_name': 'Frank',
+                'balance_usd_cents': 3_00,
+                'closed_at_utc': None,
+                'is_open': True,
+            }),
+            loaded)
+
+    def test_errors(self):
+        ## Arrange
+        connection = self.start(BankMemoryDatabase())
+        (_, opened) = self.post(connection, '/open_account', {'full_name': 'x'})
+
+        ## Act & Assert
+        self.assertEqual(400, self.post(connection, '/withdraw', {
+            'account_id': opened['id'], 'amount_usd_cents': 1})[0])
+        self.assertEqual(400, self.post(connection, '/deposit', {
+            'account_id': opened['id']})[0])
+        self.assertEqual(404, self.post(connection, '/load', {
+            'account_id': opened['id'] + 1})[0])
+        self.assertEqual(404, self.post(connection, '/nonsense', {})[0])
+
+    def test_amount_must_be_positive_whole_cents(self):
+        ## Arrange
+        connection = self.start(BankMemoryDatabase())
+        (_, opened) = self.post(connection, '/open_account', {'full_name': 'x'})
+        self.post(connection, '/deposit', {
+            'account_id': opened['id'], 'amount_usd_cents': 10_00})
+
+        ## Act & Assert
+        for (path, cents) in [
+                ('/deposit', -5_00),
+                ('/deposit', 0),
+                ('/deposit', 1.5),
+                ('/deposit', '100'),
+                ('/deposit', True),
+                ('/withdraw', -7_00)]:
+            with self.subTest(path=path, cents=cents):
+                self.assertEqual(400, self.post(connection, path, {
+                    'account_id': opened['id'], 'amount_usd_cents': cents})[0])
+        loaded = self.post(connection, '/load', {'account_id': opened['id']})
+        self.assertEqual(10_00, loaded[1]['balance_usd_cents'])
+
+    def test_batch(self):
+        ## Arrange
+        connection = self.start(BankMemoryDatabase())
+        (_, opened) = self.post(connection, '/open_account', {'full_name': 'x'})
+        account_id = opened['id']
+
+        ## Act
+        (status, results) = self.post(connection, '/batch', {'operations': [
+            {'op': 'deposit', 'account_id': account_id, 'amount_usd_cents': 1_00},
+            {'op': 'withdraw', 'account_id': account_id, 'amount_usd_cents': 2_00},
+            {'op': 'withdraw', 'account_id': account_id, 'amount_usd_cents': 1_00},
+            ]})
+
+        ## Assert
+        self.assertEqual(200, status)
+        self.assertEqual(1_00, results[0]['result']['after']['balance_usd_cents'])
+        self.assertIn('error', results[1])
+        self.assertEqual(0, results[2]['result']['after']['balance_usd_cents'])
+
+    def test_saturated(self):
+        ## Arrange
+        db = BlockingDatabase()
+        account = db.insert(Account(None, 'x', USD.ZERO, None))
+        busy = self.start(db, workers=1, queue_limit=0)
+        other = HTTPConnection('127.0.0.1', busy.port)
+        results = []
+        thread = Thread(target=lambda: results.append(
+            self.post(busy, '/load', {'account_id': account.id})))
+        thread.start()
+        db.entered.wait()
+
+        ## Act
+        (status, _) = self.post(other, '/load', {'account_id': account.id})
+        db.release.set()
+        thread.join()
+
+        ## Assert
+        self.assertEqual(503, status)
+        self.assertEqual(200, results[0][0])
+
+    def test_failed_open_retried(self):
+        ## Arrange
+        db = BankMemoryDatabase()
+        opens = []
+        def factory():
+            opens.append(1)
+            if len(opens) == 1:
+                raise ConnectionError('database is down')
+            return db
+        connection = self.start(db, workers=1, database_factory=factory)
+
+        ## Act
+        (failed, _) = self.post(connection, '/open_account', {'full_name': 'x'})
+        (status, _) = self.post(connection, '/open_account', {'full_name': 'x'})
+
+        ## Assert
+        self.assertEqual(500, failed)
+        self.assertEqual(200, status)
+        self.assertEqual(2, len(opens))
+
+if __name__ == '__main__':
+    unittest.main()
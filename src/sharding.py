@@ -0,0 +1,221 @@
+from datetime import datetime
+from itertools import count
+
+from domain import USD, Account, AccountId, BankDatabase, normalized_name
+from storage import Withdrawal, WithdrawalLog
+
+
+class ShardedBankDatabase(BankDatabase, WithdrawalLog):
+    '''
+    Spreads accounts across several databases ("shards"), each a separate
+    schema or server.
+
+    Account IDs encode their shard: an account stored with ID `local` in
+    shard `s` of `N` has the global ID `local * N + s`, so IDs are globally
+    unique without coordination and every lookup goes straight to one shard.
+    The number of shards is therefore fixed once accounts exist.
+
+    A transaction starts on a shard only when a statement first touches it,
+    so a transaction confined to one shard (every Bank operation on a single
+    account) involves only that shard.  A transaction that touches several
+    shards commits them one after another, which is NOT atomic across them.
+
+    Each withdrawal is logged in its account's shard, so that logging it
+    touches no other shard; the shards must then be WithdrawalLogs too.
+    '''
+
+    def __init__(self, shards: list[BankDatabase]):
+        if not shards:
+            raise ValueError('at least one shard is required')
+
+        self._shards = shards
+        ## new accounts are spread across the shards in turn
+        self._next_insert = count()
+        self._in_transaction = False
+        self._read_only = False
+        self._touched: list[int] = []
+
+    def __enter__(self):
+        entered = []
+        try:
+            for shard in self._shards:
+                entered.append(shard.__enter__())
+        except:
+            for shard in reversed(entered):
+                shard.__exit__(None, None, None)
+            raise
+        self._shards = entered
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for shard in reversed(self._shards):
+            shard.__exit__(exc_type, exc_value, traceback)
+
+    def global_id(self, shard: int, local_id: AccountId) -> AccountId:
+        return local_id * len(self._shards) + shard
+
+    def locate(self, account_id: AccountId) -> tuple[int, AccountId]:
+        '''`(shard, local ID)` of a global account ID'''
+        (local_id, shard) = divmod(account_id, len(self._shards))
+        return (shard, local_id)
+
+    def _globalized(self, shard: int, a: Account | None) -> Account | None:
+        if a is None:
+            return None
+        return Account(self.global_id(shard, a.id), a.full_name, a.balance, a.closed_at)
+
+    def _on(self, shard: int) -> BankDatabase:
+        '''the shard's database, in the current transaction if there is one'''
+        db = self._shards[shard]
+        if self._in_transaction and shard not in self._touched:
+            if self._read_only:
+                db.start_read_only_transaction()
+            else:
+                db.start_serializable_transaction()
+            self._touched.append(shard)
+        return db
+
+    def select_by_id(self, account_id: AccountId) -> Account:
+        (shard, local_id) = self.locate(account_id)
+        return self._globalized(shard, self._on(shard).select_by_id(local_id))
+
+    def select_page(
+            self,
+            after_id: AccountId,
+            limit: int,
+            is_open: bool | None = None) -> list[Account]:
+        '''the first `limit` accounts after `after_id` from every shard, merged'''
+        n = len(self._shards)
+        merged = []
+        for shard in range(n):
+            ## the largest local ID whose global ID is at most after_id
+            local_after = (after_id - shard) // n
+            merged.extend(
+                self._globalized(shard, a)
+                for a in self._on(shard).select_page(local_after, limit, is_open))
+        merged.sort(key=lambda a: a.id)
+        return merged[:limit]
+
+    def select_by_name(self, query: str, limit: int) -> list[Account]:
+        '''
+        prefix matches from every shard in name order, then the rest, taken
+        from the shards in turn so that each shard's relevance order is kept
+        '''
+        normalized = normalized_name(query)
+        prefix = []
+        similar = []
+        for shard in range(len(self._shards)):
+            rest = 0
+            for a in self._on(shard).select_by_name(query, limit):
+                a = self._globalized(shard, a)
+                name = normalized_name(a.full_name)
+                if name.startswith(normalized):
+                    prefix.append(((name, a.id), a))
+                else:
+                    ## the shard's best match first, then its second, ...
+                    similar.append(((rest, a.id), a))
+                    rest += 1
+
+        prefix.sort(key=lambda ranked: ranked[0])
+        similar.sort(key=lambda ranked: ranked[0])
+        return [a for (_, a) in prefix + similar][:limit]
+
+    def account_id_bounds(self) -> tuple[AccountId, AccountId] | None:
+        bounds = []
+        for (shard, db) in enumerate(self._shards):
+            shard_bounds = db.account_id_bounds()
+            if shard_bounds is not None:
+                (low, high) = shard_bounds
+                bounds.append((self.global_id(shard, low), self.global_id(shard, high)))
+        if not bounds:
+            return None
+        return (min(low for (low, _) in bounds), max(high for (_, high) in bounds))
+
+    def insert(self, a: Account) -> Account:
+        shard = next(self._next_insert) % len(self._shards)
+        return self._globalized(shard, self._on(shard).insert(a))
+
+    def insert_many(self, accounts: list[Account]) -> list[Account]:
+        '''spread `accounts` across the shards, one multi-row insert each'''
+        n = len(self._shards)
+        by_shard: dict[int, list[int]] = {}
+        for i in range(len(accounts)):
+            by_shard.setdefault(next(self._next_insert) % n, []).append(i)
+
+        inserted: list[Account | None] = [None] * len(accounts)
+        for (shard, indexes) in by_shard.items():
+            rows = self._on(shard).insert_many([accounts[i] for i in indexes])
+            for (i, a) in zip(indexes, rows):
+                inserted[i] = self._globalized(shard, a)
+        return inserted
+
+    def update_closed_at(self, account_id: AccountId, closed_at: datetime) -> None:
+        (shard, local_id) = self.locate(account_id)
+        self._on(shard).update_closed_at(local_id, closed_at)
+
+    def update_name(self, account_id: AccountId, full_name: str) -> None:
+        (shard, local_id) = self.locate(account_id)
+        self._on(shard).update_name(local_id, full_name)
+
+    def update_balance(self, account_id: AccountId, balance: USD) -> int:
+        (shard, local_id) = self.locate(account_id)
+        return self._on(shard).update_balance(local_id, balance)
+
+    def insert_withdrawals(self, withdrawals: list[Withdrawal]) -> None:
+        by_shard: dict[int, list[Withdrawal]] = {}
+        for (account_id, amount, at) in withdrawals:
+            (shard, local_id) = self.locate(account_id)
+            by_shard.setdefault(shard, []).append((local_id, amount, at))
+        for (shard, local) in by_shard.items():
+            self._on(shard).insert_withdrawals(local)
+
+    def select_withdrawals_since(self, since: datetime) -> list[Withdrawal]:
+        '''every shard's withdrawals, merged oldest first'''
+        merged = []
+        for shard in range(len(self._shards)):
+            merged.extend(
+                (self.global_id(shard, local_id), amount, at)
+                for (local_id, amount, at)
+                in self._on(shard).select_withdrawals_since(since))
+        merged.sort(key=lambda w: w[2])
+        return merged
+
+    def purge_withdrawals_before(self, before: datetime, limit: int) -> int:
+        '''up to `limit` from each shard, so possibly more than `limit` in all'''
+        return sum(
+            self._on(shard).purge_withdrawals_before(before, limit)
+            for shard in range(len(self._shards)))
+
+    def start_serializable_transaction(self) -> None:
+        self._start(read_only=False)
+
+    def start_read_only_transaction(self) -> None:
+        self._start(read_only=True)
+
+    def _start(self, read_only: bool):
+        if self._in_transaction:
+            raise RuntimeError('transaction already in progress')
+        self._in_transaction = True
+        self._read_only = read_only
+        self._touched = []
+
+    def commit_transaction(self) -> None:
+        self._finish(lambda db: db.commit_transaction())
+
+    def rollback_transaction(self) -> None:
+        self._finish(lambda db: db.rollback_transaction())
+
+    def _finish(self, end):
+        touched = self._touched
+        self._in_transaction = False
+        self._touched = []
+
+        error = None
+        for shard in touched:
+            try:
+                end(self._shards[shard])
+            except Exception as exc:
+                ## still end the transaction on the other shards
+                error = error or exc
+        if error:
+            raise error
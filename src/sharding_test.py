@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, Mock
+import unittest
+
+from domain import *
+from memory import BankMemoryDatabase
+from sharding import *
+
+class TestShardedBankDatabase(unittest.TestCase):
+    def test_ids_encode_shard(self):
+        ## Arrange
+        shards = [BankMemoryDatabase() for _ in range(3)]
+        db = ShardedBankDatabase(shards)
+
+        ## Act
+        ids = [db.insert(Account.new(f'Frank {i}')).id for i in range(6)]
+
+        ## Assert
+        self.assertEqual([3, 4, 5, 6, 7, 8], ids)
+        self.assertEqual((2, 1), db.locate(5))
+        self.assertEqual('Frank 2', shards[2].select_by_id(1).full_name)
+        self.assertEqual('Frank 2', db.select_by_id(5).full_name)
+
+    def test_single_shard_transaction(self):
+        ## Arrange
+        shards = [MagicMock(BankDatabase) for _ in range(3)]
+        shards[1].select_by_id.return_value = Account(7, 'x', USD(1_00), None)
+        bank = Bank(ShardedBankDatabase(shards), Mock(Clock))
+
+        ## Act
+        change = bank.deposit(7 * 3 + 1, USD(1_00))
+
+        ## Assert
+        self.assertEqual(22, change.after.id)
+        shards[1].update_balance.assert_called_once_with(7, USD(2_00))
+        self.assertTrue(shards[1].commit_transaction.called)
+        for untouched in [shards[0], shards[2]]:
+            self.assertFalse(untouched.start_serializable_transaction.called)
+
+    def test_rollback_every_touched_shard(self):
+        ## Arrange
+        shards = [BankMemoryDatabase() for _ in range(2)]
+        db = ShardedBankDatabase(shards)
+        first = db.insert(Account.new('Frank'))
+        second = db.insert(Account.new('Felix'))
+
+        ## Act
+        db.start_serializable_transaction()
+        db.update_balance(first.id, USD(1))
+        db.update_balance(second.id, USD(2))
+        db.rollback_transaction()
+
+        ## Assert
+        self.assertEqual(USD.ZERO, db.select_by_id(first.id).balance)
+        self.assertEqual(USD.ZERO, db.select_by_id(second.id).balance)
+
+    def test_select_page_across_shards(self):
+        ## Arrange
+        db = ShardedBankDatabase([BankMemoryDatabase() for _ in range(3)])
+        bank = Bank(db, SystemClock())
+        ids = [bank.open_account(f'Frank {i}').id for i in range(10)]
+        bank.close_account(ids[4])
+
+        ## Act
+        pages = []
+        after_id = 0
+        while page := bank.list_accounts(after_id, limit=3):
+            pages.append([a.id for a in page])
+            after_id = page[-1].id
+        closed = bank.list_accounts(0, 10, is_open=False)
+
+        ## Assert
+        self.assertEqual(ids, [i for page in pages for i in page])
+        self.assertEqual([3, 3, 3, 1], [len(page) for page in pages])
+        self.assertEqual([ids[4]], [a.id for a in closed])
+
+    def test_select_by_name_across_shards(self):
+        ## Arrange
+        db = ShardedBankDatabase([BankMemoryDatabase() for _ in range(2)])
+        ole = db.insert(Account.new('Ole Frank'))
+        frankie = db.insert(Account.new('Frankie'))
+        frank = db.insert(Account.new('Frank'))
+
+        ## Act
+        actual = db.select_by_name('frank', 10)
+
+        ## Assert
+        self.assertEqual([frank.id, frankie.id, ole.id], [a.id for a in actual])
+
+    def test_select_by_name_keeps_shard_relevance(self):
+        ## Arrange
+        shards = [MagicMock(BankDatabase) for _ in range(2)]
+        shards[0].select_by_name.return_value = [
+            Account(9, 'Frankly Felix', USD.ZERO, None),
+            Account(1, 'Felix the Cat', USD.ZERO, None),
+            ]
+        shards[1].select_by_name.return_value = [
+            Account(4, 'Felix', USD.ZERO, None),
+            Account(2, 'Old Felix', USD.ZERO, None),
+            ]
+        db = ShardedBankDatabase(shards)
+
+        ## Act
+        actual = db.select_by_name('frank felix', 10)
+
+        ## Assert
+        ## each shard's best before either's second best, whatever the IDs
+        self.assertEqual([9, 18, 2, 5], [a.id for a in actual])
+
+    def test_insert_many_across_shards(self):
+        ## Arrange
+        shards = [BankMemoryDatabase() for _ in range(2)]
+        db = ShardedBankDatabase(shards)
+
+        ## Act
+        inserted = db.insert_many([Account.new(f'Frank {i}') for i in range(3)])
+
+        ## Assert
+        self.assertEqual([2, 3, 4], [a.id for a in inserted])
+        self.assertEqual(
+            ['Frank 0', 'Frank 1', 'Frank 2'],
+            [db.select_by_id(a.id).full_name for a in inserted])
+
+    def test_withdrawals_logged_in_account_shard(self):
+        ## Arrange
+        shards = [BankMemoryDatabase() for _ in range(2)]
+        db = ShardedBankDatabase(shards)
+        (frank, felix) = db.insert_many([Account.new('Frank'), Account.new('Felix')])
+        at = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+        ## Act
+        db.insert_withdrawals([
+            (felix.id, USD(2_00), at + timedelta(minutes=1)),
+            (frank.id, USD(1_00), at),
+            ])
+
+        ## Assert
+        (shard, local_id) = db.locate(frank.id)
+        self.assertEqual([(local_id, USD(1_00), at)], shards[shard].select_withdrawals_since(at))
+        self.assertEqual(
+            [(frank.id, USD(1_00), at), (felix.id, USD(2_00), at + timedelta(minutes=1))],
+            db.select_withdrawals_since(at))
+        self.assertEqual(2, db.purge_withdrawals_before(at + timedelta(hours=1), 10))
+        self.assertEqual([], db.select_withdrawals_since(at))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,251 @@
+'''
+Writes a statement file for every account, e.g.
+
+    python src/statements.py statements/2026-10 --html
+
+Accounts are read a page at a time in ID order.  Each page is rendered and
+written by a pool of worker processes while the next page is read.  Every
+file is written to a temporary name, fsync'ed and then renamed, so a
+statement is never seen half written.
+
+The directory's manifest records a fingerprint of what each statement
+shows.  A later run into the same directory skips accounts whose
+fingerprint has not changed and whose file is still there, so only new,
+changed and missing statements are written.
+'''
+import argparse
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from hashlib import blake2b
+import html
+import json
+import os
+from typing import Callable
+
+from domain import USD, AccountId, Account, Bank, BankDatabase, Clock, \
+    SystemClock
+
+DEFAULT_PAGE_SIZE = 500
+MANIFEST_NAME = 'manifest.json'
+
+## changing how statements look must change this, so that they are rewritten
+_LAYOUT_VERSION = 1
+
+## (id, full_name, balance_usd_cents, closed_at ISO 8601 or None)
+_StatementFields = tuple[AccountId, str, int, str | None]
+
+def _fields(account: Account) -> _StatementFields:
+    closed_at = account.closed_at.isoformat() if account.closed_at else None
+    return (account.id, account.full_name, account.balance.total_cents, closed_at)
+
+def fingerprint(fields: _StatementFields, html_format: bool) -> str:
+    '''identifies what a statement shows'''
+    digest = blake2b(digest_size=16)
+    digest.update(repr((_LAYOUT_VERSION, html_format, fields)).encode('utf-8'))
+    return digest.hexdigest()
+
+def file_name(account_id: AccountId, html_format: bool) -> str:
+    return f'account-{account_id:010d}.{"html" if html_format else "txt"}'
+
+def render_text(fields: _StatementFields) -> str:
+    (account_id, full_name, cents, closed_at) = fields
+    status = f'closed {closed_at}' if closed_at else 'open'
+    return (
+        f'Account statement\n'
+        f'\n'
+        f'Account:  {account_id}\n'
+        f'Holder:   {full_name}\n'
+        f'Status:   {status}\n'
+        f'Balance:  {USD(cents)}\n')
+
+def render_html(fields: _StatementFields) -> str:
+    (account_id, full_name, cents, closed_at) = fields
+    status = f'closed {closed_at}' if closed_at else 'open'
+    rows = ''.join(
+        f'<tr><th>{label}</th><td>{html.escape(str(value))}</td></tr>\n'
+        for (label, value) in [
+            ('Account', account_id),
+            ('Holder', full_name),
+            ('Status', status),
+            ('Balance', USD(cents)),
+            ])
+    return (
+        '<!DOCTYPE html>\n'
+        '<html><head><meta charset="utf-8">'
+        f'<title>Account {account_id} statement</title></head>\n'
+        '<body><h1>Account statement</h1>\n'
+        f'<table>\n{rows}</table>\n'
+        '</body></html>\n')
+
+def write_atomically(path: str, content: str):
+    '''
+    replace the file at `path` with one holding exactly `content`, durably
+    once its directory is synced too
+    '''
+    temporary = path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+def sync_directory(directory: str):
+    '''make the files renamed into `directory` durable'''
+    if os.name != 'posix':
+        ## other systems cannot open a directory to sync it
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _write_statements(
+        directory: str,
+        html_format: bool,
+        page: list[_StatementFields]) -> int:
+    '''render and write a page of statements; runs in a worker process'''
+    render = render_html if html_format else render_text
+    for fields in page:
+        write_atomically(
+            os.path.join(directory, file_name(fields[0], html_format)),
+            render(fields))
+    ## once per page rather than per file
+    sync_directory(directory)
+    return len(page)
+
+class StatementResult:
+    def __init__(self, written: int, unchanged: int):
+        self.written = written
+        self.unchanged = unchanged
+
+    def __repr__(self):
+        return f'StatementResult(written={self.written}, unchanged={self.unchanged})'
+
+class StatementGenerator:
+    def __init__(
+            self,
+            database_factory: Callable[[], BankDatabase],
+            directory: str,
+            html_format: bool = False,
+            processes: int | None = None,
+            page_size: int = DEFAULT_PAGE_SIZE,
+            clock: Clock | None = None):
+        if page_size <= 0:
+            raise ValueError(f'page_size must be positive (it was {page_size})')
+
+        self._database_factory = database_factory
+        self._directory = directory
+        self._html_format = html_format
+        self._processes = processes or os.cpu_count() or 1
+        self._page_size = page_size
+        self._clock = clock or SystemClock()
+
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self._directory, MANIFEST_NAME)
+
+    def _load_manifest(self) -> dict[str, str]:
+        '''fingerprints of the statements already written, by account ID'''
+        if not os.path.exists(self._manifest_path):
+            return {}
+        with open(self._manifest_path, encoding='utf-8') as f:
+            return json.load(f)['fingerprints']
+
+    def _save_manifest(self, fingerprints: dict[str, str], finished_at: datetime):
+        '''after every statement it vouches for is on disk'''
+        write_atomically(
+            self._manifest_path,
+            json.dumps({
+                'finished_at': finished_at.isoformat(),
+                'fingerprints': fingerprints,
+                }))
+        sync_directory(self._directory)
+
+    def run(self) -> StatementResult:
+        os.makedirs(self._directory, exist_ok=True)
+        previous = self._load_manifest()
+        fingerprints = {}
+        written = 0
+        unchanged = 0
+        pending: list[Future] = []
+
+        with self._database_factory() as db, \
+                ProcessPoolExecutor(self._processes) as pool:
+            bank = Bank(db, self._clock)
+            after_id = 0
+            while True:
+                accounts = bank.list_accounts(after_id, self._page_size)
+                if not accounts:
+                    break
+                after_id = accounts[-1].id
+
+                changed = []
+                for account in accounts:
+                    fields = _fields(account)
+                    key = str(account.id)
+                    fingerprints[key] = fingerprint(fields, self._html_format)
+                    path = os.path.join(
+                        self._directory,
+                        file_name(account.id, self._html_format))
+                    ## a statement deleted by hand is written again
+                    if previous.get(key) == fingerprints[key] and os.path.exists(path):
+                        unchanged += 1
+                    else:
+                        changed.append(fields)
+
+                if changed:
+                    pending.append(pool.submit(
+                        _write_statements,
+                        self._directory,
+                        self._html_format,
+                        changed))
+
+                ## read ahead of the workers by only a few pages
+                while len(pending) > 2 * self._processes:
+                    written += pending.pop(0).result()
+
+            for future in pending:
+                written += future.result()
+
+        self._save_manifest(fingerprints, self._clock.utcnow())
+        return StatementResult(written, unchanged)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='write a statement file for every account')
+    parser.add_argument(
+        'directory',
+        help='where to write statements; a later run there skips unchanged accounts')
+    parser.add_argument(
+        '--html',
+        action='store_true',
+        help='write HTML rather than plain text')
+    parser.add_argument(
+        '--processes',
+        type=int,
+        help='worker processes (default: one per CPU)')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument(
+        '--memory',
+        action='store_true',
+        help='use an empty in-process database instead of MySQL')
+    args = parser.parse_args()
+
+    if args.memory:
+        from memory import BankMemoryDatabase
+        database_factory = BankMemoryDatabase
+    else:
+        from database import BankMySqlDatabase
+        database_factory = BankMySqlDatabase
+
+    result = StatementGenerator(
+        database_factory,
+        args.directory,
+        args.html,
+        args.processes,
+        args.page_size).run()
+    print(f'{result.written} statements written, {result.unchanged} unchanged')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import os
+from tempfile import TemporaryDirectory
+import unittest
+
+from domain import *
+from memory import BankMemoryDatabase
+from statements import *
+
+class TestStatementGenerator(unittest.TestCase):
+    def setUp(self):
+        self.db = BankMemoryDatabase()
+        self.bank = Bank(self.db, SystemClock())
+        self.frank = self.bank.open_account('Frank <the Cat>')
+        self.felix = self.bank.open_account('Felix')
+        self.bank.deposit(self.frank.id, USD(1_234_56))
+        self.bank.close_account(self.felix.id)
+        self.directory = TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def generate(self, html_format=False) -> StatementResult:
+        return StatementGenerator(
+            lambda: self.db,
+            self.directory.name,
+            html_format,
+            processes=2,
+            page_size=1).run()
+
+    def read(self, account_id, html_format=False) -> str:
+        path = os.path.join(self.directory.name, file_name(account_id, html_format))
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+
+    def test_writes_every_account(self):
+        ## Act
+        result = self.generate()
+
+        ## Assert
+        self.assertEqual(2, result.written)
+        self.assertIn('Balance:  $1,234.56', self.read(self.frank.id))
+        self.assertIn('Frank <the Cat>', self.read(self.frank.id))
+        self.assertIn('Status:   closed', self.read(self.felix.id))
+        self.assertEqual(
+            ['account-0000000001.txt', 'account-0000000002.txt', MANIFEST_NAME],
+            sorted(os.listdir(self.directory.name)))
+
+    def test_html_escapes_names(self):
+        ## Act
+        self.generate(html_format=True)
+
+        ## Assert
+        self.assertIn('Frank &lt;the Cat&gt;', self.read(self.frank.id, True))
+
+    def test_skips_unchanged_accounts(self):
+        ## Arrange
+        self.generate()
+        self.bank.withdraw(self.frank.id, USD(56))
+
+        ## Act
+        result = self.generate()
+
+        ## Assert
+        self.assertEqual(1, result.written)
+        self.assertEqual(1, result.unchanged)
+        self.assertIn('Balance:  $1,234.00', self.read(self.frank.id))
+
+    def test_rewrites_deleted_statement(self):
+        ## Arrange
+        self.generate()
+        os.remove(os.path.join(self.directory.name, file_name(self.felix.id, False)))
+
+        ## Act
+        result = self.generate()
+
+        ## Assert
+        self.assertEqual(1, result.written)
+        self.assertEqual(1, result.unchanged)
+        self.assertIn('Status:   closed', self.read(self.felix.id))
+
+if __name__ == '__main__':
+    unittest.main()
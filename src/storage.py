@@ -0,0 +1,142 @@
+'''
+What the jobs and tools need of a database, besides BankDatabase.  The
+databases implement these here, so that they depend only on the domain and
+never on the jobs that use them.
+'''
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from zlib import crc32
+
+from domain import USD, Account, AccountId
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+class InterestCredit:
+    '''interest for one account, in whole cents'''
+    def __init__(self, account_id: AccountId, balance_before: int, interest: int):
+        self.account_id = account_id
+        self.balance_before = balance_before
+        self.interest = interest
+
+    @property
+    def balance_after(self) -> int:
+        return self.balance_before + self.interest
+
+    def __repr__(self):
+        return (
+            f'InterestCredit({self.account_id}, '
+            f'{self.balance_before}, {self.interest})')
+
+class AccrualDatabase(ABC):
+    '''what the accrual job (interest.py) needs of a database'''
+    @abstractmethod
+    def select_interest_bearing(
+            self,
+            first_id: AccountId,
+            end_id: AccountId) -> list[tuple[AccountId, int]]:
+        '''
+        `(ID, balance in cents)` of each open account with a positive balance
+        and `first_id <= ID < end_id`, locked until the transaction ends
+        '''
+        raise NotImplementedError()
+    @abstractmethod
+    def credit_interest(
+            self,
+            run_id: str,
+            first_id: AccountId,
+            end_id: AccountId,
+            rate_ppm: int,
+            credits: list[InterestCredit],
+            credited_at: datetime) -> None:
+        '''
+        set the new balances, write the ledger, and mark the chunk finished,
+        all in the current transaction
+        '''
+        raise NotImplementedError()
+    @abstractmethod
+    def finished_chunks(self, run_id: str) -> set[AccountId]:
+        '''the `first_id` of every chunk the run has finished'''
+        raise NotImplementedError()
+
+class ArchiveDatabase(ABC):
+    '''what the archival job (archive.py) needs of a database'''
+    @abstractmethod
+    def archive_closed(
+            self,
+            after_id: AccountId,
+            closed_before: datetime,
+            limit: int,
+            archived_at: datetime) -> list[AccountId]:
+        '''
+        Move up to `limit` accounts with IDs after `after_id`, closed before
+        `closed_before`, into the archive, in the current transaction;
+        returns their IDs in ascending order.
+        '''
+        raise NotImplementedError()
+
+## (number of accounts, sum of their CRC-32s)
+RangeChecksum = tuple[int, int]
+
+class ReconcileDatabase(ABC):
+    '''what reconciliation (reconcile.py) needs of a database'''
+    @abstractmethod
+    def range_checksum(self, first_id: AccountId, end_id: AccountId) -> RangeChecksum:
+        '''the checksum of the accounts with `first_id <= ID < end_id`'''
+        raise NotImplementedError()
+
+def account_crc(account: Account) -> int:
+    closed_us = ''
+    if account.closed_at is not None:
+        closed_us = (account.closed_at - _EPOCH) // timedelta(microseconds=1)
+    row = f'{account.id}|{account.balance.total_cents}|{closed_us}'
+    return crc32(row.encode('utf-8'))
+
+def checksum_of(accounts: list[Account]) -> RangeChecksum:
+    return (len(accounts), sum(account_crc(a) for a in accounts))
+
+## (account ID, amount, withdrawn at)
+Withdrawal = tuple[AccountId, USD, datetime]
+
+class WithdrawalLog(ABC):
+    '''what a Bank with a VelocityTracker (velocity.py) needs of a database'''
+    @abstractmethod
+    def insert_withdrawals(self, withdrawals: list[Withdrawal]) -> None:
+        '''log the withdrawals in the current transaction'''
+        raise NotImplementedError()
+    @abstractmethod
+    def select_withdrawals_since(self, since: datetime) -> list[Withdrawal]:
+        '''every withdrawal logged at or after `since`, oldest first'''
+        raise NotImplementedError()
+    @abstractmethod
+    def purge_withdrawals_before(self, before: datetime, limit: int) -> int:
+        '''
+        delete, in the current transaction, up to `limit` of the withdrawals
+        logged before `before`, oldest first; returns how many were deleted
+        '''
+        raise NotImplementedError()
+
+class AppliedRequestLog(ABC):
+    '''what a Replayer (outbox.py) needs of a database'''
+    @abstractmethod
+    def mark_applied(
+            self,
+            request_id: str,
+            refused: str | None,
+            applied_at: datetime) -> bool:
+        '''
+        record, in the current transaction, that the request was applied (or
+        refused, for the reason given); False, recording nothing, when it
+        already was
+        '''
+        raise NotImplementedError()
+    @abstractmethod
+    def unmark_applied(self, request_id: str) -> None:
+        '''undo, in the current transaction, `mark_applied` of the request'''
+        raise NotImplementedError()
+    @abstractmethod
+    def purge_applied_before(self, before: datetime, limit: int) -> int:
+        '''
+        delete, in the current transaction, up to `limit` of the requests
+        applied before `before`; returns how many were deleted
+        '''
+        raise NotImplementedError()
@@ -0,0 +1,186 @@
+'''
+Limits how much may be withdrawn from one account within a sliding window
+of time, e.g. no more than $500.00 in 24 hours:
+
+    velocity = VelocityTracker([VelocityLimit(USD(500_00), timedelta(hours=24))])
+    velocity.rebuild(db.select_withdrawals_since(clock.utcnow() - velocity.longest_window))
+    bank = Bank(db, clock, velocity=velocity)
+
+Each account's recent withdrawals are kept in memory, in a fixed ring of
+buckets per limit, so a check sums a fixed number of counters whatever the
+account's history.  The window is measured in whole buckets and rounded
+up, so a withdrawal counts for between `window` and `window + window /
+buckets`; a limit is never exceeded, but may end a little late.
+
+Accounts with nothing left in any window are forgotten, least recently
+used first, once more than `max_accounts` are tracked.  A Bank that uses a
+VelocityTracker logs every withdrawal, so that a new process can rebuild
+the tracker from the log at startup.
+'''
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+from typing import Iterable
+
+from domain import USD, AccountId
+from storage import Withdrawal, WithdrawalLog
+
+DEFAULT_BUCKETS = 24
+DEFAULT_MAX_ACCOUNTS = 100_000
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+class VelocityLimit:
+    def __init__(self, amount: USD, window: timedelta, buckets: int = DEFAULT_BUCKETS):
+        '''no more than `amount` withdrawn in any `window`'''
+        if window <= timedelta(0) or buckets <= 0:
+            raise ValueError('window and buckets must be positive')
+        if amount < USD.ZERO:
+            raise ValueError(f'amount may not be negative (it was {amount})')
+
+        self.amount = amount
+        self.window = window
+        self.buckets = buckets
+        self.bucket_width = window / buckets
+
+    def __repr__(self):
+        return f'VelocityLimit({self.amount!r}, {self.window!r}, {self.buckets})'
+
+class _Ring:
+    '''one account's withdrawals under one limit, in cents per bucket'''
+    __slots__ = ('epochs', 'cents')
+
+    def __init__(self, size: int):
+        ## the bucket number each slot last counted, and its total
+        self.epochs = [-1] * size
+        self.cents = [0] * size
+
+class VelocityTracker:
+    '''
+    The withdrawals of the recently active accounts, checked against every
+    limit.  One tracker may be shared by the Banks of many threads.
+    '''
+    def __init__(
+            self,
+            limits: list[VelocityLimit],
+            max_accounts: int = DEFAULT_MAX_ACCOUNTS):
+        if not limits:
+            raise ValueError('at least one limit is required')
+        if max_accounts <= 0:
+            raise ValueError(f'max_accounts must be positive (it was {max_accounts})')
+
+        self._limits = limits
+        self._max_accounts = max_accounts
+        self._lock = Lock()
+        ## least recently used first
+        self._accounts: OrderedDict[AccountId, list[_Ring]] = OrderedDict()
+
+    @property
+    def longest_window(self) -> timedelta:
+        '''how far back the log must be read to rebuild the tracker'''
+        return max(l.window + l.bucket_width for l in self._limits)
+
+    def __len__(self) -> int:
+        '''the number of accounts tracked'''
+        with self._lock:
+            return len(self._accounts)
+
+    def withdrawn(self, account_id: AccountId, at: datetime) -> list[USD]:
+        '''the amount withdrawn within each limit's window, ending at `at`'''
+        with self._lock:
+            rings = self._accounts.get(account_id)
+            if rings is None:
+                return [USD.ZERO for _ in self._limits]
+            return [
+                USD(self._sum(limit, ring, _epoch(limit, at)))
+                for (limit, ring) in zip(self._limits, rings)
+                ]
+
+    def reserve(self, account_id: AccountId, amount: USD, at: datetime) -> None:
+        '''
+        Count a withdrawal of `amount` at `at`; `release()` it if the
+        withdrawal does not happen after all.
+
+        :raises ValueError: instead, when it would exceed a limit
+        '''
+        with self._lock:
+            rings = self._rings(account_id, at)
+            epochs = [_epoch(limit, at) for limit in self._limits]
+            for (limit, ring, epoch) in zip(self._limits, rings, epochs):
+                withdrawn = self._sum(limit, ring, epoch)
+                if withdrawn + amount.total_cents > limit.amount.total_cents:
+                    raise ValueError(
+                        f'cannot withdraw more than {limit.amount} in '
+                        f'{limit.window} (already withdrawn {USD(withdrawn)})')
+
+            for (ring, epoch) in zip(rings, epochs):
+                _add(ring, epoch, amount.total_cents)
+
+    def release(self, account_id: AccountId, amount: USD, at: datetime) -> None:
+        '''undo `reserve(account_id, amount, at)`'''
+        with self._lock:
+            rings = self._accounts.get(account_id)
+            if rings is None:
+                return
+            for (limit, ring) in zip(self._limits, rings):
+                epoch = _epoch(limit, at)
+                slot = epoch % len(ring.epochs)
+                if ring.epochs[slot] == epoch:
+                    ring.cents[slot] -= amount.total_cents
+
+    def rebuild(self, withdrawals: Iterable[Withdrawal]) -> None:
+        '''count past withdrawals, e.g. from WithdrawalLog.select_withdrawals_since'''
+        with self._lock:
+            for (account_id, amount, at) in withdrawals:
+                rings = self._rings(account_id, at)
+                for (limit, ring) in zip(self._limits, rings):
+                    _add(ring, _epoch(limit, at), amount.total_cents)
+
+    def _rings(self, account_id: AccountId, now: datetime) -> list[_Ring]:
+        '''the account's rings, tracking it if it is not already'''
+        rings = self._accounts.get(account_id)
+        if rings is not None:
+            self._accounts.move_to_end(account_id)
+            return rings
+
+        self._evict_idle(now)
+        rings = [_Ring(limit.buckets + 1) for limit in self._limits]
+        self._accounts[account_id] = rings
+        return rings
+
+    def _evict_idle(self, now: datetime):
+        '''
+        forget least recently used accounts with nothing left in any window,
+        while there are too many
+        '''
+        while len(self._accounts) >= self._max_accounts:
+            (account_id, rings) = next(iter(self._accounts.items()))
+            ## an account used less recently than one still active may be
+            ## active itself, until its windows pass
+            if any(
+                    self._sum(limit, ring, _epoch(limit, now))
+                    for (limit, ring) in zip(self._limits, rings)):
+                return
+            del self._accounts[account_id]
+
+    @staticmethod
+    def _sum(limit: VelocityLimit, ring: _Ring, epoch: int) -> int:
+        '''cents withdrawn in the buckets of the window ending in bucket `epoch`'''
+        oldest = epoch - limit.buckets
+        return sum(
+            cents for (e, cents) in zip(ring.epochs, ring.cents)
+            if oldest <= e <= epoch)
+
+def _epoch(limit: VelocityLimit, at: datetime) -> int:
+    '''the number of the limit's bucket that `at` falls in'''
+    return (at - _EPOCH) // limit.bucket_width
+
+def _add(ring: _Ring, epoch: int, cents: int):
+    slot = epoch % len(ring.epochs)
+    if ring.epochs[slot] != epoch:
+        if ring.epochs[slot] > epoch:
+            ## older than anything the ring still holds
+            return
+        ring.epochs[slot] = epoch
+        ring.cents[slot] = 0
+    ring.cents[slot] += cents
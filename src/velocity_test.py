@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta, timezone
+import unittest
+
+from domain import *
+from memory import BankMemoryDatabase
+from velocity import *
+
+class FakeClock(Clock):
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def utcnow(self) -> datetime:
+        return self.now
+
+NOON = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+
+def daily(amount: USD) -> VelocityLimit:
+    return VelocityLimit(amount, timedelta(hours=24))
+
+class TestVelocityTracker(unittest.TestCase):
+    def test_reserve_within_limit(self):
+        ## Arrange
+        tracker = VelocityTracker([daily(USD(100_00))])
+
+        ## Act
+        tracker.reserve(1, USD(60_00), NOON)
+        tracker.reserve(1, USD(40_00), NOON + timedelta(hours=1))
+
+        ## Assert
+        self.assertEqual([USD(100_00)], tracker.withdrawn(1, NOON + timedelta(hours=1)))
+        self.assertEqual([USD.ZERO], tracker.withdrawn(2, NOON))
+
+    def test_reserve_beyond_limit(self):
+        ## Arrange
+        tracker = VelocityTracker([daily(USD(100_00))])
+        tracker.reserve(1, USD(60_00), NOON)
+
+        ## Act & Assert
+        with self.assertRaises(ValueError):
+            tracker.reserve(1, USD(40_01), NOON + timedelta(hours=23))
+        self.assertEqual([USD(60_00)], tracker.withdrawn(1, NOON + timedelta(hours=23)))
+
+    def test_window_slides(self):
+        ## Arrange
+        tracker = VelocityTracker([daily(USD(100_00))])
+        tracker.reserve(1, USD(100_00), NOON)
+
+        ## Act & Assert
+        with self.assertRaises(ValueError):
+            tracker.reserve(1, USD(1), NOON + timedelta(hours=24))
+        tracker.reserve(1, USD(100_00), NOON + timedelta(hours=25))
+
+    def test_several_limits(self):
+        ## Arrange
+        hourly = VelocityLimit(USD(10_00), timedelta(hours=1), buckets=6)
+        tracker = VelocityTracker([hourly, daily(USD(25_00))])
+        tracker.reserve(1, USD(10_00), NOON)
+
+        ## Act & Assert
+        with self.assertRaises(ValueError):
+            tracker.reserve(1, USD(1), NOON + timedelta(minutes=30))
+        tracker.reserve(1, USD(10_00), NOON + timedelta(hours=2))
+        with self.assertRaises(ValueError):
+            tracker.reserve(1, USD(5_01), NOON + timedelta(hours=4))
+
+    def test_release(self):
+        ## Arrange
+        tracker = VelocityTracker([daily(USD(100_00))])
+        tracker.reserve(1, USD(100_00), NOON)
+
+        ## Act
+        tracker.release(1, USD(100_00), NOON)
+
+        ## Assert
+        tracker.reserve(1, USD(100_00), NOON)
+
+    def test_rebuild(self):
+        ## Arrange
+        tracker = VelocityTracker([daily(USD(100_00))])
+
+        ## Act
+        tracker.rebuild([
+            (1, USD(30_00), NOON - timedelta(hours=30)),
+            (1, USD(70_00), NOON - timedelta(hours=2)),
+            (2, USD(1_00), NOON - timedelta(hours=2)),
+            ])
+
+        ## Assert
+        self.assertEqual([USD(70_00)], tracker.withdrawn(1, NOON))
+        self.assertEqual([USD(1_00)], tracker.withdrawn(2, NOON))
+
+    def test_evicts_only_idle_accounts(self):
+        ## Arrange
+        tracker = VelocityTracker([daily(USD(100_00))], max_accounts=2)
+        tracker.reserve(1, USD(1_00), NOON - timedelta(days=2))
+        tracker.reserve(2, USD(1_00), NOON)
+
+        ## Act
+        tracker.reserve(3, USD(1_00), NOON)
+        tracker.reserve(4, USD(1_00), NOON)
+
+        ## Assert
+        self.assertEqual(3, len(tracker))
+        self.assertEqual([USD(1_00)], tracker.withdrawn(2, NOON))
+
+class TestBankVelocity(unittest.TestCase):
+    def setUp(self):
+        self.db = BankMemoryDatabase()
+        self.clock = FakeClock(NOON)
+        self.velocity = VelocityTracker([daily(USD(100_00))])
+        self.bank = Bank(self.db, self.clock, velocity=self.velocity)
+        self.frank = self.bank.open_account('Frank the Cat')
+        self.bank.deposit(self.frank.id, USD(500_00))
+
+    def test_withdraw_beyond_limit(self):
+        ## Arrange
+        self.bank.withdraw(self.frank.id, USD(80_00))
+
+        ## Act & Assert
+        with self.assertRaises(ValueError):
+            self.bank.withdraw(self.frank.id, USD(20_01))
+        self.assertEqual(USD(420_00), self.bank.load(self.frank.id).balance)
+
+    def test_withdrawals_logged(self):
+        ## Act
+        self.bank.withdraw(self.frank.id, USD(80_00))
+
+        ## Assert
+        self.assertEqual(
+            [(self.frank.id, USD(80_00), NOON)],
+            self.db.select_withdrawals_since(NOON - timedelta(days=1)))
+
+    def test_rollback_releases(self):
+        ## Act
+        with self.assertRaises(RuntimeError):
+            with self.bank.session() as s:
+                s.withdraw(self.frank.id, USD(100_00))
+                raise RuntimeError('something else failed')
+
+        ## Assert
+        self.assertEqual([USD.ZERO], self.velocity.withdrawn(self.frank.id, NOON))
+        self.assertEqual([], self.db.select_withdrawals_since(NOON - timedelta(days=1)))
+        self.bank.withdraw(self.frank.id, USD(100_00))
+
+    def test_batch_withdrawal_beyond_limit_fails_alone(self):
+        ## Act
+        results = self.bank.apply_batch([
+            ('withdraw', (self.frank.id, USD(60_00))),
+            ('withdraw', (self.frank.id, USD(60_00))),
+            ('deposit', (self.frank.id, USD(1_00))),
+            ])
+
+        ## Assert
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(USD(441_00), self.bank.load(self.frank.id).balance)
+
+    def test_rebuilt_from_log(self):
+        ## Arrange
+        self.bank.withdraw(self.frank.id, USD(90_00))
+        self.clock.now = NOON + timedelta(hours=1)
+        restarted = VelocityTracker([daily(USD(100_00))])
+
+        ## Act
+        restarted.rebuild(self.db.select_withdrawals_since(
+            self.clock.now - restarted.longest_window))
+        bank = Bank(self.db, self.clock, velocity=restarted)
+
+        ## Assert
+        with self.assertRaises(ValueError):
+            bank.withdraw(self.frank.id, USD(10_01))
+        bank.withdraw(self.frank.id, USD(10_00))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,10 @@
+-- supports keyset pagination of accounts, optionally filtered by open/closed
+-- status, e.g.
+--
+--     where is_open = 1 and id > ? order by id limit ?
+--
+-- a virtual column costs no storage in the table itself; only the index holds
+-- its values
+alter table account
+    add column is_open boolean as (closed_at_utc is null) virtual,
+    add index account_is_open_id (is_open, id);
@@ -0,0 +1,29 @@
+-- supports searching for accounts by the account holder's name
+--
+-- full_name_normalized holds the name with runs of whitespace collapsed to a
+-- single space, in lower case, truncated to 255 characters; the application
+-- keeps it in sync with full_name (see domain.normalized_name()).  Its
+-- accent- and case-insensitive collation lets one index serve both prefix
+-- lookups, e.g.
+--
+--     where full_name_normalized like 'frank t%'
+--
+-- and, through the ngram FULLTEXT index, fuzzy "contains something like"
+-- lookups, e.g.
+--
+--     where match(full_name_normalized) against ('frnk' in natural language mode)
+alter table account
+    add column full_name_normalized varchar(255)
+        character set utf8mb4 collate utf8mb4_0900_ai_ci
+        not null default '';
+
+update account set
+    full_name_normalized =
+        left(lower(trim(regexp_replace(full_name, '[[:space:]]+', ' '))), 255);
+
+alter table account
+    add index account_full_name_normalized (full_name_normalized);
+
+alter table account
+    add fulltext index account_full_name_ngram (full_name_normalized)
+        with parser ngram;
@@ -0,0 +1,22 @@
+-- hands out account IDs in blocks ("hi-lo" allocation)
+--
+-- Rather than each insert taking the next auto_increment value, every
+-- database connection reserves a block of IDs at once, in a short
+-- transaction of its own, e.g.
+--
+--     update id_sequence
+--         set next_value = last_insert_id(next_value + 100)
+--         where name = 'account'
+--
+-- and assigns IDs from it locally, so many accounts can be inserted in one
+-- multi-row statement and concurrent inserts do not contend on the
+-- auto_increment lock.  IDs reserved but never used are simply skipped.
+create table if not exists id_sequence (
+    name varchar(64) primary key,
+
+    -- the first ID of the next block to be reserved
+    next_value int not null
+    );
+
+insert into id_sequence (name, next_value)
+    select 'account', coalesce(max(id), 0) + 1 from account;
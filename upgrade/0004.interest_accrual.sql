@@ -0,0 +1,42 @@
+-- supports the interest accrual job (see src/interest.py)
+--
+-- Each run has an ID (e.g. the month, '2026-10') and credits interest to
+-- accounts in chunks of consecutive account IDs.  A chunk's balance updates,
+-- its ledger rows and its interest_run_chunk row commit together, so a run
+-- that stops part way can be restarted, and skips every chunk with a row
+-- here.  The ledger's primary key means no account is ever credited twice
+-- in one run.
+
+-- one row per account examined by a run
+create table if not exists interest_ledger (
+    run_id varchar(64) not null,
+    account_id int not null,
+
+    -- interest rate for the run's period, in millionths
+    rate_ppm int not null,
+
+    balance_before_usd_cents int not null,
+
+    -- may be less than the rate implies, when the balance would otherwise
+    -- exceed the largest balance an account can hold
+    interest_usd_cents int not null,
+
+    credited_at_utc timestamp(6) not null,
+
+    primary key (run_id, account_id)
+    );
+
+-- one row per finished chunk of a run
+create table if not exists interest_run_chunk (
+    run_id varchar(64) not null,
+
+    -- the chunk holds accounts with first_id <= id < end_id
+    first_id int not null,
+    end_id int not null,
+
+    account_count int not null,
+    interest_usd_cents bigint not null,
+    finished_at_utc timestamp(6) not null,
+
+    primary key (run_id, first_id)
+    );
@@ -0,0 +1,23 @@
+-- cold storage for accounts closed long ago (see src/archive.py)
+--
+-- The archival job moves such accounts out of the account table, a small
+-- batch per transaction, keeping their IDs, so that the account table and
+-- its indexes hold only the accounts still in use.  Looking an account up by
+-- ID falls back to this table, e.g.
+--
+--     select ... from account where id = ?
+--     union all
+--     select ... from account_archive where id = ?
+--
+-- A separate table, rather than partitions of the account table, because
+-- MySQL does not allow a FULLTEXT index on a partitioned table.
+create table if not exists account_archive (
+    id int primary key,
+    full_name varchar(1024) character set utf8mb4 not null,
+    full_name_normalized varchar(255)
+        character set utf8mb4 collate utf8mb4_0900_ai_ci
+        not null default '',
+    balance_usd_cents int not null,
+    closed_at_utc timestamp(6) not null,
+    archived_at_utc timestamp(6) not null
+    );
@@ -0,0 +1,15 @@
+-- every withdrawal made by a Bank with withdrawal limits (see src/velocity.py)
+--
+-- The limits are enforced from counters kept in memory; this log lets a new
+-- process rebuild them at startup by reading only the last day or so, e.g.
+--
+--     select ... from account_withdrawal where withdrawn_at_utc >= ?
+--
+-- Rows older than the longest limit's window are no longer needed.
+create table if not exists account_withdrawal (
+    id bigint primary key auto_increment,
+    account_id int not null,
+    amount_usd_cents int not null,
+    withdrawn_at_utc timestamp(6) not null,
+    index account_withdrawal_at (withdrawn_at_utc)
+    );
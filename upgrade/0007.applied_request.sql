@@ -0,0 +1,11 @@
+-- every outbox request applied to the Bank (see src/outbox.py)
+--
+-- A request's row is inserted in the same transaction as its deposit or
+-- withdrawal, so a request replayed twice, e.g. after a crash, finds its ID
+-- here and is skipped.  A request the Bank refused is recorded too, with
+-- the reason, so that it is not tried again.
+create table if not exists applied_request (
+    request_id varchar(64) character set ascii primary key,
+    refused varchar(1024) character set utf8mb4,
+    applied_at_utc timestamp(6) not null
+    );
@@ -0,0 +1,6 @@
+-- supports deleting the applied requests no outbox can still replay (see
+-- src/purge.py), oldest first, e.g.
+--
+--     delete from applied_request where applied_at_utc < ? limit ?
+alter table applied_request
+    add index applied_request_at (applied_at_utc);